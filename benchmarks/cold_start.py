@@ -0,0 +1,195 @@
+"""
+Cold-start benchmark: how long a cron run takes when there is nothing new.
+
+    python -m benchmarks.cold_start
+    python -m benchmarks.cold_start --runs 10 --save cold_start.json
+    python -m benchmarks.cold_start --compare benchmarks/cold_start_baseline.json
+
+Measures, each in a fresh interpreter:
+  import        `import main` (from -X importtime, best of --runs)
+  idle_not_due  `python main.py` after a seeding run, no feed due yet
+  idle_polled   `python main.py` with the feed polled but unchanged
+and lists which heavy modules (Scrapy, Twisted, Pillow, aiohttp, requests,
+feedparser) each one loaded, plus any WordPress request an idle run made.
+The fake services from benchmarks/fake_services.py stay in this process.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ('scrapy', 'twisted', 'PIL', 'aiohttp', 'requests', 'feedparser')
+
+
+def parse_importtime(stderr):
+    """Returns ({top-level module: cumulative us}, set of heavy modules) from -X importtime output."""
+    cumulative = {}
+    loaded = set()
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        parts = line[len('import time:'):].split('|')
+        if not parts[1].strip().isdigit():
+            continue
+        name = parts[2].strip()
+        cumulative[name] = int(parts[1])
+        root = name.split('.')[0]
+        if root in HEAVY_MODULES:
+            loaded.add(root)
+    return cumulative, loaded
+
+
+def run(command, env=None, cwd=ROOT):
+    """Runs one fresh interpreter with -X importtime in `cwd`. Returns (seconds, stderr)."""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime'] + command,
+        cwd=cwd, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+    )
+    seconds = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"{' '.join(command)} exited with {result.returncode}:\n{result.stderr[-2000:]}")
+    return seconds, result.stderr
+
+
+def pipeline_env(base_url, workdir, articles, feed_interval):
+    """Environment for `python main.py` against the fake services (overrides any .env)."""
+    env = dict(os.environ)
+    env.update({
+        'PYTHONPATH': ROOT,
+        'RSS_FEED_URLS': f"{base_url}/feed.xml?n={articles}",
+        'WORDPRESS_URL': base_url,
+        'WORDPRESS_USERNAME': 'bench',
+        'WORDPRESS_PASSWORD': 'bench',
+        'WP_CATEGORY_SLUG': 'news',
+        'WP_TARGETS': '',
+        'MAX_LINKS': str(articles),
+        'POSTS_PER_MINUTE': '0',
+        'REGISTRY_DB': os.path.join(workdir, 'registry.db'),
+        'SPOOL_PATH': os.path.join(workdir, 'spool.jsonl'),
+        'MEDIA_CACHE_DB': os.path.join(workdir, 'media_cache.db'),
+        'FEED_MIN_INTERVAL': str(feed_interval),
+        'FEED_MAX_INTERVAL': str(feed_interval),
+        'METRICS_PORT': '0',
+        'METRICS_DIR': '',
+        'IMAGE_PROCESSES': '0',
+        'REFRESH_INTERVAL': '0',
+    })
+    return env
+
+
+def measure_idle(services, name, env, workdir, runs):
+    """Best-of-`runs` wall time of an idle `python main.py`, with what it loaded and requested."""
+    samples = []
+    loaded = set()
+    before = dict(services.hits)
+    for _ in range(runs):
+        seconds, stderr = run([os.path.join(ROOT, 'main.py')], env, workdir)
+        samples.append(seconds)
+        loaded |= parse_importtime(stderr)[1]
+    requests = {route: n - before.get(route, 0) for route, n in services.hits.items() if n - before.get(route, 0)}
+    return {
+        'name': name,
+        'best_ms': round(min(samples) * 1000, 1),
+        'median_ms': round(sorted(samples)[len(samples) // 2] * 1000, 1),
+        'heavy_modules': sorted(loaded),
+        'requests': requests,
+    }
+
+
+def measure_import(runs):
+    samples = []
+    loaded = set()
+    for _ in range(runs):
+        _, stderr = run(['-c', 'import main'])
+        cumulative, heavy = parse_importtime(stderr)
+        samples.append(cumulative.get('main', 0) / 1e6)
+        loaded |= heavy
+    return {
+        'name': 'import',
+        'best_ms': round(min(samples) * 1000, 1),
+        'median_ms': round(sorted(samples)[len(samples) // 2] * 1000, 1),
+        'heavy_modules': sorted(loaded),
+        'requests': {},
+    }
+
+
+def print_report(result):
+    heavy = ", ".join(result['heavy_modules']) or "none"
+    print(f"   {result['name']:<14}{result['best_ms']:>9} ms best{result['median_ms']:>9} ms median   heavy modules: {heavy}")
+    if result['requests']:
+        print("   " + " " * 14 + "requests: " + ", ".join(f"{route}={n}" for route, n in sorted(result['requests'].items())))
+
+
+def compare(results, baseline_path, tolerance):
+    """Flags measurements whose best time grew by more than `tolerance`, or that now load a heavy module."""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {item['name']: item for item in json.load(f)['results']}
+
+    regressions = 0
+    print(f"\n🔎 Compared with {baseline_path} (tolerance {tolerance:.0%}):")
+    for result in results:
+        old = baseline.get(result['name'])
+        if not old:
+            continue
+        change = (result['best_ms'] - old['best_ms']) / old['best_ms'] if old['best_ms'] else 0
+        new_modules = sorted(set(result['heavy_modules']) - set(old['heavy_modules']))
+        regressed = change > tolerance or bool(new_modules)
+        regressions += regressed
+        extra = f", now loads {', '.join(new_modules)}" if new_modules else ""
+        print(f"   {'⚠️' if regressed else '✅'} {result['name']}: {old['best_ms']} -> {result['best_ms']} ms ({change:+.1%}){extra}")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Cold-start benchmark for idle cron runs")
+    parser.add_argument('--runs', type=int, default=5, help="fresh interpreters per measurement")
+    parser.add_argument('--articles', type=int, default=5, help="articles published by the seeding run")
+    parser.add_argument('--save', help="write the results to this JSON file")
+    parser.add_argument('--compare', help="baseline JSON from --save to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sys.path.insert(0, ROOT)
+    from benchmarks.fake_services import FakeServices
+
+    results = [measure_import(args.runs)]
+    with FakeServices() as services, tempfile.TemporaryDirectory(prefix='bench-') as workdir:
+        print(f"🧪 Fake services on {services.base_url}")
+        print(f"🌱 Seeding with {args.articles} articles...")
+        # Interval 0 keeps the feed due on every run
+        polled = pipeline_env(services.base_url, workdir, args.articles, 0)
+        run([os.path.join(ROOT, 'main.py')], polled, workdir)
+        results.append(measure_idle(services, 'idle_polled', polled, workdir, args.runs))
+        # One poll with a long interval pushes the next check past the measured runs
+        not_due = pipeline_env(services.base_url, workdir, args.articles, 3600)
+        run([os.path.join(ROOT, 'main.py')], not_due, workdir)
+        results.append(measure_idle(services, 'idle_not_due', not_due, workdir, args.runs))
+
+    print("\n📊 Cold start:")
+    for result in results:
+        print_report(result)
+    wordpress = sum(n for result in results for route, n in result['requests'].items() if route.startswith('wp_'))
+    if wordpress:
+        print(f"⚠️ Idle runs made {wordpress} WordPress requests")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'settings': {'runs': args.runs, 'articles': args.articles}, 'results': results}, f, indent=2)
+        print(f"\n💾 Saved results to {args.save}")
+
+    if args.compare and compare(results, args.compare, args.tolerance):
+        return 1
+    return 1 if wordpress else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
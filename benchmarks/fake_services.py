@@ -0,0 +1,264 @@
+"""
+Local stand-ins for everything the pipeline talks to, on one HTTP server:
+
+    /feed.xml?n=N             RSS feed with N articles
+    /news/<id>                article page (title, og:image, paragraphs), with ETag / 304
+    /img/<id>.jpg             large JPEG (a few pre-rendered variants)
+    /wp-json/wp/v2/...        users/me, categories, media (+ sideload, post-process), posts
+    /wp-json/batch/v1         REST batch endpoint
+
+Every request waits `latency` seconds (+/- jitter); article, image and
+WordPress write requests fail with HTTP 500 at `error_rate`.
+"""
+import re
+import json
+import time
+import random
+import threading
+from io import BytesIO
+from itertools import count
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from PIL import Image
+
+WORDS = (
+    'خبر گزارش بازار ارز سکه طلا دلار تهران امروز دولت مجلس وزیر اقتصاد بانک مرکزی '
+    'قیمت افزایش کاهش شاخص بورس معاملات سرمایه صنعت تولید صادرات واردات نفت گاز برق '
+    'آب هوا ترافیک شهر استان ورزش فوتبال لیگ تیم بازیکن مربی جام فرهنگ سینما کتاب'
+).split()
+
+IMAGE_VARIANTS = 8
+
+
+def _render_images(width=1600, height=1200):
+    images = []
+    across = Image.linear_gradient('L').rotate(90).resize((width, height))
+    down = Image.linear_gradient('L').resize((width, height))
+    for variant in range(IMAGE_VARIANTS):
+        # Gradients + noise: cheap to build, not trivially compressible
+        noise = Image.effect_noise((width, height), 40 + variant * 5)
+        tinted = across.point(lambda v, shift=variant * 29: (v + shift) % 256)
+        img = Image.merge('RGB', (tinted, down, noise))
+        out = BytesIO()
+        img.save(out, 'JPEG', quality=90)
+        images.append(out.getvalue())
+    return images
+
+
+def article_words(article_id, n=250):
+    rng = random.Random(article_id)
+    return [rng.choice(WORDS) for _ in range(n)]
+
+
+class FakeServices:
+    """
+    Starts the fake news site + WordPress on 127.0.0.1 in a background thread.
+    Counts requests per route in `hits`. sideload=False answers the media
+    sideload endpoint with 404, like WordPress versions without it.
+    edit(article_id) changes an article page, as a source correction would.
+    """
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, port=0, seed=1, sideload=True):
+        self.latency = latency
+        self.sideload = sideload
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.images = _render_images()
+        self.hits = {}
+        self.lock = threading.Lock()
+        self._ids = count(1000)
+        self.revisions = {}
+
+        services = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                services.handle(self, 'GET')
+
+            def do_POST(self):
+                services.handle(self, 'POST')
+
+            def do_PUT(self):
+                services.handle(self, 'PUT')
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def feed_url(self, n):
+        return f"{self.base_url}/feed.xml?n={n}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name='fake-services', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # --- request handling -------------------------------------------------
+
+    def edit(self, article_id):
+        with self.lock:
+            self.revisions[article_id] = self.revisions.get(article_id, 0) + 1
+
+    def _next_id(self):
+        with self.lock:
+            return next(self._ids)
+
+    def _count(self, route):
+        with self.lock:
+            self.hits[route] = self.hits.get(route, 0) + 1
+
+    def _fail(self):
+        with self.lock:
+            return self.rng.random() < self.error_rate
+
+    def handle(self, handler, method):
+        url = urlparse(handler.path)
+        body = b''
+        length = int(handler.headers.get('Content-Length') or 0)
+        if length:
+            body = handler.rfile.read(length)
+
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter)))
+
+        route, flaky, response = self.route(method, url, body, handler.headers)
+        self._count(route)
+        if flaky and self._fail():
+            response = (500, 'application/json', json.dumps({'message': 'Injected failure'}).encode(), {})
+        status, content_type, payload, headers = response
+
+        handler.send_response(status)
+        handler.send_header('Content-Type', content_type)
+        handler.send_header('Content-Length', str(len(payload)))
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+    def route(self, method, url, body, headers=None):
+        """Returns (route name, may fail, (status, content type, payload, headers))."""
+        path = url.path
+        if path == '/feed.xml':
+            n = int(parse_qs(url.query).get('n', ['10'])[0])
+            return 'feed', False, (200, 'application/rss+xml; charset=utf-8', self.feed(n), {})
+
+        match = re.fullmatch(r'/news/(\d+)', path)
+        if match:
+            article_id = int(match.group(1))
+            etag = f'"{article_id}-{self.revisions.get(article_id, 0)}"'
+            if headers and headers.get('If-None-Match') == etag:
+                return 'article_304', False, (304, 'text/html; charset=utf-8', b'', {'ETag': etag})
+            return 'article', True, (200, 'text/html; charset=utf-8', self.article(article_id), {'ETag': etag})
+
+        match = re.fullmatch(r'/img/(\d+)\.jpg', path)
+        if match:
+            data = self.images[int(match.group(1)) % IMAGE_VARIANTS]
+            return 'image', True, (200, 'image/jpeg', data, {})
+
+        if path == '/wp-json/wp/v2/users/me':
+            return 'wp_login', False, self._json(200, {'id': 1, 'name': 'bench'})
+        if path == '/wp-json/wp/v2/categories':
+            return 'wp_category', False, self._json(200, [{'id': 7, 'slug': 'news'}])
+        if path == '/wp-json/wp/v2/media' and method == 'POST':
+            return 'wp_media', True, self._json(201, {'id': self._next_id()})
+        match = re.fullmatch(r'/wp-json/wp/v2/media/(\d+)/(sideload|post-process)', path)
+        if match and method == 'POST':
+            if match.group(2) == 'post-process':
+                return 'wp_post_process', False, self._json(200, {'id': int(match.group(1))})
+            if not self.sideload:
+                return 'not_found', False, self._json(404, {'code': 'rest_no_route'})
+            return 'wp_sideload', True, self._json(201, {'id': int(match.group(1))})
+        match = re.fullmatch(r'/wp-json/wp/v2/posts/(\d+)', path)
+        if match and method == 'PUT':
+            return 'wp_update', True, self._json(200, {'id': int(match.group(1))})
+        if path == '/wp-json/wp/v2/posts' and method == 'POST':
+            return 'wp_post', True, self._json(201, self._created(json.loads(body or b'{}')))
+        if path == '/wp-json/wp/v2/posts':
+            # Mirror sync: an empty site
+            return 'wp_list', False, self._json(200, [], {'X-WP-Total': '0', 'X-WP-TotalPages': '1'})
+        if path == '/wp-json/batch/v1' and method == 'POST':
+            requests = json.loads(body or b'{}').get('requests', [])
+            responses = [{'status': 201, 'body': self._created(item.get('body', {}))} for item in requests]
+            return 'wp_batch', True, self._json(207, {'responses': responses})
+
+        return 'not_found', False, self._json(404, {'code': 'rest_no_route'})
+
+    def _json(self, status, data, headers=None):
+        return status, 'application/json', json.dumps(data, ensure_ascii=False).encode('utf-8'), headers or {}
+
+    def _created(self, post):
+        return {'id': self._next_id(), 'status': post.get('status', 'publish'), 'meta': post.get('meta', {})}
+
+    # --- content ----------------------------------------------------------
+
+    def feed(self, n):
+        items = []
+        for i in range(n):
+            article_id = 1000000 + i
+            title = ' '.join(article_words(article_id, 8))
+            items.append(
+                f"<item><title>{title} {article_id}</title>"
+                f"<link>{self.base_url}/news/{article_id}</link>"
+                f"<guid>{article_id}</guid></item>"
+            )
+        # Newest first, like a real feed
+        items.reverse()
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel>'
+            f'<title>Bench feed</title><link>{self.base_url}</link>'
+            + ''.join(items) + '</channel></rss>'
+        ).encode('utf-8')
+
+    def article(self, article_id):
+        words = article_words(article_id)
+        revision = self.revisions.get(article_id, 0)
+        if revision:
+            words = words + [f"(اصلاحیه {revision})"]
+        paragraphs = ''.join(
+            f"<p>{' '.join(words[i:i + 50])}</p>" for i in range(0, len(words), 50)
+        )
+        return (
+            '<!DOCTYPE html><html lang="fa"><head><meta charset="utf-8">'
+            f'<title>{" ".join(words[:8])} {article_id}</title>'
+            f'<meta property="og:image" content="{self.base_url}/img/{article_id}.jpg">'
+            '<style>body{font-family:sans-serif}</style></head><body>'
+            '<nav><a href="/">خانه</a><a href="/news">اخبار</a></nav>'
+            f'<article><h1>{" ".join(words[:8])}</h1>{paragraphs}</article>'
+            '<footer>© bench</footer></body></html>'
+        ).encode('utf-8')
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Serve the fake news site and WordPress")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    services = FakeServices(args.latency, error_rate=args.error_rate, port=args.port).start()
+    print(f"🧪 Fake services on {services.base_url} (feed: {services.feed_url(10)})")
+    try:
+        services._thread.join()
+    except KeyboardInterrupt:
+        services.stop()
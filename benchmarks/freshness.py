@@ -0,0 +1,111 @@
+"""
+Selection-order simulation: feed publish -> WordPress latency of new
+stories when a backlog competes for the MAX_LINKS slots of each cycle,
+oldest-first (the old order) versus the FreshnessScheduler.
+
+    python -m benchmarks.freshness
+    python -m benchmarks.freshness --rates 2 4 6 --max-links 5 --backlog 500 --target 900
+
+No network and no crawler: each simulated cycle (every --interval seconds)
+adds `rate` stories published during that interval to a real registry,
+picks MAX_LINKS of the pending items in the chosen order and marks them
+published at the cycle's time. Reported per rate: p50/p95 latency of the
+new stories, the share that made --target, and how many were dropped as
+stale or still pending at the end.
+"""
+import os
+import sys
+import random
+import argparse
+import tempfile
+import contextlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, -(-len(ordered) * pct // 100) - 1)]
+
+
+def simulate(order, rate, args):
+    """Runs one simulation. order: 'fifo' or 'freshness'. Returns a result dict."""
+    from utils.registry import Registry
+    from utils.scheduler import FreshnessScheduler
+
+    rng = random.Random(args.seed)
+    scheduler = FreshnessScheduler(args.target, args.stale_hours * 3600)
+    with tempfile.TemporaryDirectory(prefix='bench-') as workdir, open(os.devnull, 'w') as devnull, \
+            contextlib.redirect_stdout(devnull):
+        registry = Registry(os.path.join(workdir, 'registry.db'))
+        start = 1_000_000_000.0
+        # Stories queued before the run (e.g. after an outage): published over the previous hours
+        registry.add_entries([
+            {'title': f'backlog {i}', 'link': f'https://example.com/news/{i}',
+             'published': start - rng.uniform(600, args.stale_hours * 3600 * 0.9)}
+            for i in range(args.backlog)
+        ])
+
+        published = {}
+        new_links = set()
+        for cycle in range(1, args.cycles + 1):
+            now = start + cycle * args.interval
+            arrivals = [
+                {'title': f'new {cycle}-{i}', 'link': f'https://example.com/news/{cycle}-{i}',
+                 'published': now - rng.uniform(0, args.interval)}
+                for i in range(rate)
+            ]
+            registry.add_entries(arrivals)
+            new_links.update(entry['link'] for entry in arrivals)
+
+            pending = registry.pending()
+            items = scheduler.order(pending, registry, now) if order == 'freshness' else iter(pending)
+            for item, _ in zip(items, range(args.max_links)):
+                registry.mark_uploaded(item['id'], 1)
+                published[item['link']] = now - item['published_at']
+
+        latencies = [published[link] for link in new_links if link in published]
+        registry.close()
+
+    return {
+        'order': order,
+        'rate': rate,
+        'p50_s': round(percentile(latencies, 50) or 0),
+        'p95_s': round(percentile(latencies, 95) or 0),
+        'on_target': round(sum(1 for latency in latencies if latency <= args.target) / max(1, len(new_links)), 3),
+        # Dropped as stale, or still pending when the run ended
+        'not_published': len(new_links) - len(latencies),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Freshness scheduler simulation")
+    parser.add_argument('--rates', type=int, nargs='+', default=[2, 4, 5], help="new stories per cycle")
+    parser.add_argument('--max-links', type=int, default=5)
+    parser.add_argument('--interval', type=int, default=300, help="seconds between cycles")
+    parser.add_argument('--cycles', type=int, default=96)
+    parser.add_argument('--backlog', type=int, default=300, help="stories pending at the start")
+    parser.add_argument('--target', type=int, default=900, help="PUBLISH_LATENCY_TARGET in seconds")
+    parser.add_argument('--stale-hours', type=float, default=6)
+    parser.add_argument('--seed', type=int, default=1)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sys.path.insert(0, ROOT)
+    print(f"🧪 {args.cycles} cycles of {args.interval}s, MAX_LINKS={args.max_links}, backlog {args.backlog}, "
+          f"target {args.target}s, stale after {args.stale_hours:g}h")
+    print(f"   {'order':<11}{'rate':>6}{'p50 s':>9}{'p95 s':>9}{'on target':>11}{'unpublished':>13}")
+    for rate in args.rates:
+        for order in ('fifo', 'freshness'):
+            result = simulate(order, rate, args)
+            print(f"   {result['order']:<11}{result['rate']:>6}{result['p50_s']:>9}{result['p95_s']:>9}"
+                  f"{result['on_target']:>11.1%}{result['not_published']:>13}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
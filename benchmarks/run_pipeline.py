@@ -0,0 +1,302 @@
+"""
+Offline end-to-end benchmark: runs one full pipeline cycle (feed poll ->
+crawl -> image -> WordPress) against benchmarks/fake_services.py at several
+article counts and reports throughput, per-stage latency percentiles and
+peak memory.
+
+    python -m benchmarks.run_pipeline
+    python -m benchmarks.run_pipeline --sizes 10 1000 --latency 0.05 --error-rate 0.02
+    python -m benchmarks.run_pipeline --save baseline.json
+    python -m benchmarks.run_pipeline --compare baseline.json
+
+Each size runs in a fresh child process (the crawler reactor cannot be
+restarted, and peak RSS is per process). The fake services stay in this
+process so their CPU and memory are not counted against the pipeline.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import resource
+import subprocess
+import contextlib
+
+STAGES = ('feed', 'crawl', 'image', 'media_upload', 'sideload', 'post', 'batch')
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an unsorted list (None when empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+class StageTimer:
+    """Wraps pipeline functions in place and records how long each call took."""
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGES}
+        self._patched = []
+
+    def wrap(self, owner, name, stage):
+        original = getattr(owner, name)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.samples[stage].append(time.perf_counter() - start)
+
+        setattr(owner, name, timed)
+        self._patched.append((owner, name, original))
+
+    def wrap_async(self, owner, name, stage):
+        original = getattr(owner, name)
+
+        async def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await original(*args, **kwargs)
+            finally:
+                self.samples[stage].append(time.perf_counter() - start)
+
+        setattr(owner, name, timed)
+        self._patched.append((owner, name, original))
+
+    def wrap_stream(self, owner, name, stage):
+        """For generators: records the wait before each yielded item."""
+        original = getattr(owner, name)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            for item in original(*args, **kwargs):
+                now = time.perf_counter()
+                self.samples[stage].append(now - start)
+                yield item
+                start = time.perf_counter()
+
+        setattr(owner, name, timed)
+        self._patched.append((owner, name, original))
+
+    def restore(self):
+        for owner, name, original in reversed(self._patched):
+            setattr(owner, name, original)
+        self._patched = []
+
+    def summary(self):
+        return {
+            stage: {
+                'count': len(values),
+                'p50_ms': round(percentile(values, 50) * 1000, 2),
+                'p95_ms': round(percentile(values, 95) * 1000, 2),
+                'p99_ms': round(percentile(values, 99) * 1000, 2),
+                'max_ms': round(max(values) * 1000, 2),
+            }
+            for stage, values in self.samples.items() if values
+        }
+
+
+def run_child(args):
+    """Runs one pipeline cycle for args.size articles and prints a JSON result."""
+    import main as pipeline
+    import utils.readrss
+    import utils.publisher
+    from utils.wordpress_api import WordPressAuth
+    from utils.wordpress_async import AsyncWordPressAuth
+    from utils.image_service import ImageService
+    from scrapers.news_spider import CrawlerService, crawler_settings
+
+    workdir = tempfile.mkdtemp(prefix='bench-')
+    config = pipeline.load_config()
+    config.update({
+        "RSS_URLS": [f"{args.base_url}/feed.xml?n={args.size}"],
+        "WP_URL": args.base_url,
+        "WP_USER": "bench",
+        "WP_PWD": "bench",
+        "WP_CAT_SLUG": "news",
+        "MAX_LINKS": args.size,
+        "POSTS_PER_MINUTE": 0,
+        "MEDIA_WORKERS": args.media_workers,
+        "POST_BATCH_SIZE": args.batch_size,
+        "DATA_JSON": os.path.join(workdir, "data.json"),
+        "REGISTRY_DB": os.path.join(workdir, "registry.db"),
+        "MAX_REGISTRY_SIZE": 0,
+        "SPOOL_PATH": os.path.join(workdir, "spool.jsonl") if args.spool else "",
+        "MEDIA_CACHE_DB": os.path.join(workdir, "media_cache.db") if args.media_cache else "",
+        "NEAR_DUP_ENABLED": args.dedup,
+        "IMAGE_PROCESSES": args.image_processes,
+    })
+    settings = crawler_settings(
+        concurrency=args.crawl_concurrency,
+        per_domain=args.crawl_concurrency,
+        autothrottle=args.autothrottle,
+        start_delay=0,
+        cache_dir=args.http_cache,
+        LOG_LEVEL='WARNING',
+    )
+
+    timer = StageTimer()
+    timer.wrap(utils.readrss, 'fetch_feed', 'feed')
+    timer.wrap(utils.publisher, 'fetch_and_encode_image', 'image')
+    timer.wrap(ImageService, 'fetch_and_encode', 'image')
+    timer.wrap(WordPressAuth, 'upload_image_bytes', 'media_upload')
+    timer.wrap(WordPressAuth, '_sideload', 'sideload')
+    timer.wrap(WordPressAuth, 'create_post', 'post')
+    timer.wrap(WordPressAuth, '_send_batch', 'batch')
+    # WP_ASYNC=true runs the publish phase on the async client
+    timer.wrap_async(AsyncWordPressAuth, 'upload_image_bytes', 'media_upload')
+    timer.wrap_async(AsyncWordPressAuth, '_sideload', 'sideload')
+    timer.wrap_async(AsyncWordPressAuth, 'create_post', 'post')
+    timer.wrap_stream(CrawlerService, 'stream', 'crawl')
+
+    log = sys.stdout if args.verbose else open(os.devnull, 'w')
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(log):
+        wp = pipeline.connect_wordpress(config)
+        services = pipeline.open_services(config)
+        crawler = CrawlerService(settings)
+        try:
+            published = pipeline.run_cycle(config, wp, crawler, services)
+        finally:
+            crawler.stop()
+            wp.logout()
+            pipeline.close_services(services)
+    elapsed = time.perf_counter() - start
+    timer.restore()
+
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_mb = peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    print(json.dumps({
+        'size': args.size,
+        'published': published,
+        'seconds': round(elapsed, 3),
+        'articles_per_sec': round(published / elapsed, 2) if elapsed else None,
+        'peak_rss_mb': round(peak_mb, 1),
+        'stages': timer.summary(),
+    }))
+
+
+def run_size(size, base_url, args):
+    command = [
+        sys.executable, '-m', 'benchmarks.run_pipeline', '--child',
+        '--size', str(size), '--base-url', base_url,
+        '--media-workers', str(args.media_workers),
+        '--batch-size', str(args.batch_size),
+        '--crawl-concurrency', str(args.crawl_concurrency),
+        '--image-processes', str(args.image_processes),
+    ]
+    if args.http_cache:
+        command += ['--http-cache', args.http_cache]
+    for flag in ('spool', 'media_cache', 'dedup', 'autothrottle', 'verbose'):
+        if getattr(args, flag):
+            command.append('--' + flag.replace('_', '-'))
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run(command, cwd=root, stdout=subprocess.PIPE, text=True)
+    if args.verbose:
+        print(result.stdout)
+    if result.returncode != 0:
+        print(f"❌ Benchmark for {size} articles failed (exit {result.returncode})")
+        return None
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def print_report(result):
+    print(f"\n📊 {result['size']} articles: {result['published']} published in {result['seconds']}s "
+          f"({result['articles_per_sec']} articles/s), peak RSS {result['peak_rss_mb']} MB")
+    print(f"   {'stage':<13}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for stage, stats in result['stages'].items():
+        print(f"   {stage:<13}{stats['count']:>7}{stats['p50_ms']:>10}{stats['p95_ms']:>10}"
+              f"{stats['p99_ms']:>10}{stats['max_ms']:>10}")
+    hits = result.get('requests') or {}
+    if hits:
+        print("   requests: " + ", ".join(f"{route}={n}" for route, n in sorted(hits.items())))
+
+
+def compare(results, baseline_path, tolerance):
+    """Flags sizes whose throughput dropped or memory grew by more than `tolerance`."""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {item['size']: item for item in json.load(f)['results']}
+
+    regressions = 0
+    print(f"\n🔎 Compared with {baseline_path} (tolerance {tolerance:.0%}):")
+    for result in results:
+        old = baseline.get(result['size'])
+        if not old:
+            continue
+        for key, worse_when_lower in (('articles_per_sec', True), ('peak_rss_mb', False)):
+            before, after = old.get(key), result.get(key)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            regressed = change < -tolerance if worse_when_lower else change > tolerance
+            regressions += regressed
+            print(f"   {'⚠️' if regressed else '✅'} {result['size']} articles {key}: {before} -> {after} ({change:+.1%})")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline end-to-end pipeline benchmark")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 10000])
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every fake request")
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of article/image/WordPress requests answered with HTTP 500")
+    parser.add_argument('--media-workers', type=int, default=2)
+    parser.add_argument('--batch-size', type=int, default=1)
+    parser.add_argument('--crawl-concurrency', type=int, default=16)
+    parser.add_argument('--image-processes', type=int, default=0, help="resize in this many worker processes (0 = media threads)")
+    parser.add_argument('--spool', action='store_true', help="enable the crash-recovery spool")
+    parser.add_argument('--media-cache', action='store_true', help="enable the media cache (fake images repeat)")
+    parser.add_argument('--dedup', action='store_true', help="enable near-duplicate detection")
+    parser.add_argument('--autothrottle', action='store_true', help="adaptive per-domain crawl delay (starts at 0)")
+    parser.add_argument('--http-cache', help="crawl through an on-disk HTTP cache in this folder (reused across runs)")
+    parser.add_argument('--save', help="write the results to this JSON file")
+    parser.add_argument('--compare', help="baseline JSON from --save to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--verbose', action='store_true', help="show the pipeline's own output")
+    # Internal: one size inside a child process
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--base-url', help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.child:
+        run_child(args)
+        return 0
+
+    from benchmarks.fake_services import FakeServices
+
+    results = []
+    with FakeServices(args.latency, args.jitter, args.error_rate) as services:
+        print(f"🧪 Fake services on {services.base_url}")
+        for size in args.sizes:
+            print(f"⏱️ Running {size} articles...")
+            before = dict(services.hits)
+            result = run_size(size, services.base_url, args)
+            if not result:
+                continue
+            result['requests'] = {route: n - before.get(route, 0) for route, n in services.hits.items() if n - before.get(route, 0)}
+            results.append(result)
+            print_report(result)
+
+    if args.save:
+        settings = {key: getattr(args, key) for key in ('latency', 'jitter', 'error_rate', 'media_workers', 'batch_size', 'crawl_concurrency', 'image_processes')}
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'settings': settings, 'results': results}, f, indent=2)
+        print(f"\n💾 Saved results to {args.save}")
+
+    if args.compare and compare(results, args.compare, args.tolerance):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,194 +1,929 @@
 import os
-import json
+import sys
 import time
+import argparse
+import asyncio
+import itertools
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from utils.wordpress_api import WordPressAuth
-from utils.file_manager import empty_news_folder, ensure_data_dirs
-from utils.readrss import save_rss_as_json
-from scrapers.news_spider import run_crawler
-from utils.image_processor import download_and_resize_image
-from urllib.parse import unquote
-from utils.file_manager import all_json_uploaded
-
-import re
-def extract_id(url):
-    """
-    Extracts the numeric ID (5+ digits) from URLs.
-    Handles: 
-    - /12345-slug-text (Mid-URL ID)
-    - /12345 (End-URL ID)
-    """
-    # 1. Clean the URL (remove trailing slashes and spaces)
-    clean_url = url.strip('/ ')
-    
-    # 2. Look for 5 or more digits immediately after a slash
-    # This is the most reliable for site: bartarinha.ir
-    match = re.search(r'/(\d{5,})', clean_url)
-    if match:
-        return match.group(1)
-    
-    # 3. Fallback: Just find the last sequence of digits in the URL
-    match_fallback = re.findall(r'(\d+)', clean_url)
-    return match_fallback[-1] if match_fallback else url
+from utils.file_manager import ensure_data_dirs
+from utils.readrss import poll_feeds
+from utils.registry import Registry, extract_id
+from utils.wp_mirror import PostMirror
+from utils.targets import Target, load_targets
+from utils.rate_limiter import bucket_from_env, TokenBucket
+from utils.spool import ArticleSpool
+from utils.media_cache import MediaCache
+from utils.dedup import NearDuplicateIndex, drop_near_duplicate_bodies
+from utils.metrics import metrics
+from utils.scheduler import FreshnessScheduler, parse_feed_weights
+# Scrapy/Twisted, Pillow, requests and aiohttp are imported inside the
+# functions that need them, so a run with nothing new never loads them.
 
 
-def main():
+def parse_feed_urls(value):
+    return [url.strip() for url in (value or "").replace("\n", ",").split(",") if url.strip()]
+
+
+def parse_image_variants(value, default_mode):
+    """
+    "thumbnail:150x150:crop,medium:300x300" -> (("thumbnail", 150, 150, "crop"), ("medium", 300, 300, default_mode)).
+    Names should match the image sizes registered by the WordPress theme.
+    """
+    variants = []
+    for spec in (value or "").split(","):
+        if not spec.strip():
+            continue
+        parts = spec.strip().split(":")
+        width, height = (int(n) for n in parts[1].lower().split("x"))
+        variants.append((parts[0], width, height, parts[2] if len(parts) > 2 else default_mode))
+    return tuple(variants)
+
+
+def parse_workers(value):
+    """Worker count from .env: a number, or "auto" for one per CPU core."""
+    if value.strip().lower() == "auto":
+        return os.cpu_count() or 1
+    return int(value)
+
+
+def load_config():
     load_dotenv()
-    RSS_URL = os.getenv("RSS_FEED_URL")
-    WP_URL = os.getenv("WORDPRESS_URL")
-    WP_USER = os.getenv("WORDPRESS_USERNAME")
-    WP_PWD = os.getenv("WORDPRESS_PASSWORD")
-    WP_CAT_SLUG = os.getenv("WP_CATEGORY_SLUG")
-    MAX_LINKS = int(os.getenv("MAX_LINKS", 5))
-    POST_DELAY = int(os.getenv("POST_DELAY", 60))
-    DATA_JSON = "data/data.json"
-    RAW_NEWS_DIR = "data/raw_news"
-    
-    # Image settings from .env
-    IMG_W = int(os.getenv("IMG_WIDTH", 800))
-    IMG_H = int(os.getenv("IMG_HEIGHT", 600))
+    config = {
+        # Comma-separated list of feeds; RSS_FEED_URL still works for a single feed
+        "RSS_URLS": parse_feed_urls(os.getenv("RSS_FEED_URLS") or os.getenv("RSS_FEED_URL")),
+        "FEED_WORKERS": int(os.getenv("FEED_WORKERS", 8)),
+        # Adaptive per-feed poll interval bounds (seconds)
+        "FEED_MIN_INTERVAL": int(os.getenv("FEED_MIN_INTERVAL", os.getenv("POLL_INTERVAL", 60))),
+        "FEED_MAX_INTERVAL": int(os.getenv("FEED_MAX_INTERVAL", 900)),
+        "WP_URL": os.getenv("WORDPRESS_URL"),
+        "WP_USER": os.getenv("WORDPRESS_USERNAME"),
+        "WP_PWD": os.getenv("WORDPRESS_PASSWORD"),
+        "WP_CAT_SLUG": os.getenv("WP_CATEGORY_SLUG"),
+        # WordPress HTTP transport: keep-alive pool, default timeout, retries and circuit breaker
+        "HTTP_POOL_SIZE": int(os.getenv("HTTP_POOL_SIZE", 10)),
+        "HTTP_TIMEOUT": float(os.getenv("HTTP_TIMEOUT", 15)),
+        "HTTP_MAX_RETRIES": int(os.getenv("HTTP_MAX_RETRIES", 3)),
+        "WP_BREAKER_THRESHOLD": int(os.getenv("WP_BREAKER_THRESHOLD", 5)),
+        "WP_BREAKER_COOLDOWN": int(os.getenv("WP_BREAKER_COOLDOWN", 30)),
+        # Select and publish with the asyncio client, WP_CONCURRENCY requests in flight
+        "WP_ASYNC": os.getenv("WP_ASYNC", "false").lower() in ("1", "true", "yes"),
+        "WP_CONCURRENCY": int(os.getenv("WP_CONCURRENCY", 8)),
+        "MAX_LINKS": int(os.getenv("MAX_LINKS", 5)),
+        "POST_DELAY": int(os.getenv("POST_DELAY", 60)),
+        # Token bucket for post creation; falls back to POST_DELAY when unset
+        "POSTS_PER_MINUTE": float(os.environ["POSTS_PER_MINUTE"]) if os.getenv("POSTS_PER_MINUTE") else None,
+        "POST_BURST": int(os.getenv("POST_BURST", 1)),
+        # Threads fetching/resizing/uploading images ahead of post creation
+        "MEDIA_WORKERS": int(os.getenv("MEDIA_WORKERS", 2)),
+        # >1 sends posts through the REST batch endpoint (max 25 per request)
+        "POST_BATCH_SIZE": int(os.getenv("POST_BATCH_SIZE", 1)),
+        # Seconds between RSS polls in daemon mode
+        "POLL_INTERVAL": int(os.getenv("POLL_INTERVAL", 60)),
+        "DATA_JSON": "data/data.json",
+        "REGISTRY_DB": os.getenv("REGISTRY_DB", "data/registry.db"),
+        # 0 keeps every article; set a number to restore the rolling window
+        "MAX_REGISTRY_SIZE": int(os.getenv("MAX_REGISTRY_SIZE", 0)),
+        # A known title only blocks new feed entries for this long (0 = forever); links always do
+        "TITLE_DEDUP_HOURS": float(os.getenv("TITLE_DEDUP_HOURS", 12)),
+        # Append-only JSONL of scraped articles for crash recovery (empty = disabled)
+        "SPOOL_PATH": os.getenv("SPOOL_PATH", "data/spool.jsonl"),
+        # Image settings from .env
+        "IMG_W": int(os.getenv("IMG_WIDTH", 800)),
+        "IMG_H": int(os.getenv("IMG_HEIGHT", 600)),
+        # stretch (old behavior), fit (keep aspect, whole image) or crop (fill and trim edges)
+        "IMG_FIT_MODE": os.getenv("IMG_FIT_MODE", "stretch"),
+        "IMG_QUALITY": int(os.getenv("IMG_QUALITY", 85)),
+        # Extra sizes rendered from the same decode and sideloaded, so WordPress skips its own resizing
+        "IMAGE_VARIANTS": parse_image_variants(os.getenv("IMAGE_VARIANTS"), os.getenv("IMG_FIT_MODE", "stretch")),
+        "IMAGE_VARIANT_FORMAT": os.getenv("IMAGE_VARIANT_FORMAT", "webp").lower(),
+        # Downloads larger than this are aborted mid-stream
+        "MAX_IMAGE_BYTES": int(os.getenv("MAX_IMAGE_BYTES", 15 * 1024 * 1024)),
+        # Resize images in this many worker processes ("auto" = one per CPU core, 0 = in the media threads)
+        "IMAGE_PROCESSES": parse_workers(os.getenv("IMAGE_PROCESSES", "0")),
+        # Reuse already-uploaded media for repeated images (empty = disabled)
+        "MEDIA_CACHE_DB": os.getenv("MEDIA_CACHE_DB", "data/media_cache.db"),
+        "MEDIA_CACHE_MAX_ENTRIES": int(os.getenv("MEDIA_CACHE_MAX_ENTRIES", 5000)),
+        "MEDIA_CACHE_MAX_AGE_DAYS": int(os.getenv("MEDIA_CACHE_MAX_AGE_DAYS", 90)),
+        # SimHash near-duplicate detection across feeds (max differing bits out of 64)
+        "NEAR_DUP_ENABLED": os.getenv("NEAR_DUP_ENABLED", "true").lower() in ("1", "true", "yes"),
+        "NEAR_DUP_TITLE_DISTANCE": int(os.getenv("NEAR_DUP_TITLE_DISTANCE", 3)),
+        "NEAR_DUP_BODY_DISTANCE": int(os.getenv("NEAR_DUP_BODY_DISTANCE", 3)),
+        # Stories older than this no longer count as the original of a new one (0 = forever)
+        "NEAR_DUP_MAX_AGE_HOURS": float(os.getenv("NEAR_DUP_MAX_AGE_HOURS", 72)),
+        # Local Prometheus-style /metrics endpoint (0 = disabled)
+        "METRICS_PORT": int(os.getenv("METRICS_PORT", 0)),
+        # Folder for one JSON timing report per cycle (empty = disabled)
+        "METRICS_DIR": os.getenv("METRICS_DIR", ""),
+        # Backfill mode (python main.py backfill ...): archive import at full speed
+        "BACKFILL_CHUNK": int(os.getenv("BACKFILL_CHUNK", 500)),
+        "BACKFILL_CONCURRENCY": int(os.getenv("BACKFILL_CONCURRENCY", 32)),
+        "BACKFILL_IMAGE_WORKERS": parse_workers(os.getenv("BACKFILL_IMAGE_WORKERS", "auto")),
+        "BACKFILL_POST_WORKERS": int(os.getenv("BACKFILL_POST_WORKERS", 4)),
+        "BACKFILL_BATCH_SIZE": int(os.getenv("BACKFILL_BATCH_SIZE", 25)),
+        # 0 = no pacing; otherwise /batch/v1 requests per minute
+        "BACKFILL_BATCHES_PER_MINUTE": float(os.getenv("BACKFILL_BATCHES_PER_MINUTE", 0)),
+        "BACKFILL_MAX_ATTEMPTS": int(os.getenv("BACKFILL_MAX_ATTEMPTS", 3)),
+        # Refresh mode: re-check articles published in the last REFRESH_MAX_AGE_HOURS for source edits
+        "REFRESH_MAX_AGE_HOURS": float(os.getenv("REFRESH_MAX_AGE_HOURS", 48)),
+        "REFRESH_LIMIT": int(os.getenv("REFRESH_LIMIT", 100)),
+        # Daemon: seconds between refresh passes (0 = only via `python main.py refresh`)
+        "REFRESH_INTERVAL": int(os.getenv("REFRESH_INTERVAL", 0)),
+        # Article crawl: parallel requests overall and per site; with CRAWL_AUTOTHROTTLE each site's
+        # delay starts at CRAWL_START_DELAY and follows its latency and errors within [MIN, MAX]
+        "CRAWL_CONCURRENCY": int(os.getenv("CRAWL_CONCURRENCY", 16)),
+        "CRAWL_CONCURRENCY_PER_DOMAIN": int(os.getenv("CRAWL_CONCURRENCY_PER_DOMAIN", 4)),
+        "CRAWL_AUTOTHROTTLE": os.getenv("CRAWL_AUTOTHROTTLE", "true").lower() in ("1", "true", "yes"),
+        "CRAWL_MIN_DELAY": float(os.getenv("CRAWL_MIN_DELAY", 0)),
+        "CRAWL_START_DELAY": float(os.getenv("CRAWL_START_DELAY", 1)),
+        "CRAWL_MAX_DELAY": float(os.getenv("CRAWL_MAX_DELAY", 30)),
+        "CRAWL_TARGET_CONCURRENCY": float(os.getenv("CRAWL_TARGET_CONCURRENCY", 2)),
+        # On-disk cache of article pages (empty = disabled), its TTL and size limit
+        "CRAWL_CACHE_DIR": os.getenv("CRAWL_CACHE_DIR", "data/http_cache"),
+        "CRAWL_CACHE_TTL": int(os.getenv("CRAWL_CACHE_TTL", 86400)),
+        "CRAWL_CACHE_MAX_MB": int(os.getenv("CRAWL_CACHE_MAX_MB", 200)),
+        # Selection order: seconds from feed publish to WordPress post that fresh items are scheduled
+        # to meet, items older than STALE_AFTER_HOURS dropped (0 = never), per-feed (URL or host) weights
+        "PUBLISH_LATENCY_TARGET": int(os.getenv("PUBLISH_LATENCY_TARGET", 900)),
+        "STALE_AFTER_HOURS": float(os.getenv("STALE_AFTER_HOURS", 0)),
+        "FEED_WEIGHTS": parse_feed_weights(os.getenv("FEED_WEIGHTS")),
+        # Worker mode (python main.py worker): stages this process runs, jobs per claim, lease length
+        "WORKER_STAGES": os.getenv("WORKER_STAGES", "discover,crawl,media,publish"),
+        "WORKER_BATCH": int(os.getenv("WORKER_BATCH", 10)),
+        "WORKER_LEASE_SECONDS": int(os.getenv("WORKER_LEASE_SECONDS", 300)),
+        "WORKER_MAX_ATTEMPTS": int(os.getenv("WORKER_MAX_ATTEMPTS", 3)),
+        "WORKER_IDLE_SLEEP": float(os.getenv("WORKER_IDLE_SLEEP", 10)),
+        # Seconds between WordPress mirror syncs in publishing workers
+        "WORKER_MIRROR_SYNC": int(os.getenv("WORKER_MIRROR_SYNC", 300)),
+    }
+    # Several WordPress sites fed by one crawl (empty = the single WORDPRESS_URL site)
+    config["WP_TARGETS"] = load_targets(config)
+    return config
 
-    # Initialize environment
-    ensure_data_dirs(['data', RAW_NEWS_DIR])
-    empty_news_folder(RAW_NEWS_DIR)
-    if all_json_uploaded("data/data.json"):
-        if os.path.exists("data/data.json"):
-            os.remove("data/data.json")
-            print("🗑️ data.json deleted.")
-    
-    # Update local registry with latest RSS entries
-    save_rss_as_json(RSS_URL, DATA_JSON)
-
-    # 1. Load Registry and Find TRULY new items
+
+def http_options(config):
+    return {
+        # Media workers and the post stage share the pool
+        "pool_size": max(config["HTTP_POOL_SIZE"], config["MEDIA_WORKERS"] + 1),
+        "timeout": config["HTTP_TIMEOUT"],
+        "max_retries": config["HTTP_MAX_RETRIES"],
+        "breaker_threshold": config["WP_BREAKER_THRESHOLD"],
+        "breaker_timeout": config["WP_BREAKER_COOLDOWN"],
+    }
+
+
+def open_crawler(config, **overrides):
+    """CrawlerService with the CRAWL_* concurrency, throttling and HTTP cache settings."""
+    from scrapers.news_spider import CrawlerService, crawler_settings
+    options = dict(
+        concurrency=config["CRAWL_CONCURRENCY"],
+        per_domain=config["CRAWL_CONCURRENCY_PER_DOMAIN"],
+        autothrottle=config["CRAWL_AUTOTHROTTLE"],
+        min_delay=config["CRAWL_MIN_DELAY"],
+        start_delay=config["CRAWL_START_DELAY"],
+        max_delay=config["CRAWL_MAX_DELAY"],
+        target_concurrency=config["CRAWL_TARGET_CONCURRENCY"],
+        cache_dir=config["CRAWL_CACHE_DIR"],
+        cache_ttl=config["CRAWL_CACHE_TTL"],
+        cache_max_bytes=config["CRAWL_CACHE_MAX_MB"] * 1024 * 1024,
+    )
+    options.update(overrides)
+    return CrawlerService(crawler_settings(**options))
+
+
+def connect_wordpress(config):
+    from utils.wordpress_api import WordPressAuth
+    wp = WordPressAuth(config["WP_URL"], **http_options(config))
+    if not wp.login(config["WP_USER"], config["WP_PWD"]):
+        print("❌ WordPress Login Failed. Check your .env credentials.")
+        return None
+    return wp
+
+
+def make_post_bucket(config):
+    return bucket_from_env(config["POSTS_PER_MINUTE"], config["POST_BURST"], config["POST_DELAY"])
+
+
+def image_settings(config):
+    return {
+        "width": config["IMG_W"],
+        "height": config["IMG_H"],
+        "mode": config["IMG_FIT_MODE"],
+        "max_bytes": config["MAX_IMAGE_BYTES"],
+        "quality": config["IMG_QUALITY"],
+        "variants": config["IMAGE_VARIANTS"],
+        "variant_format": config["IMAGE_VARIANT_FORMAT"],
+    }
+
+
+def open_registry(config):
+    registry = Registry(config["REGISTRY_DB"], title_window=config["TITLE_DEDUP_HOURS"] * 3600)
+    # One-shot migration from the legacy JSON registry
+    registry.import_json(config["DATA_JSON"])
+    return registry
+
+
+def open_media_cache(config, namespace=None):
+    if not config["MEDIA_CACHE_DB"]:
+        return None
+    return MediaCache(
+        config["MEDIA_CACHE_DB"],
+        max_entries=config["MEDIA_CACHE_MAX_ENTRIES"],
+        max_age_days=config["MEDIA_CACHE_MAX_AGE_DAYS"],
+        namespace=namespace
+    )
+
+
+def open_targets(config):
+    """One Target per WP_TARGETS entry, each with its own mirror tables and media cache namespace."""
+    return [
+        Target(
+            settings,
+            mirror=PostMirror(config["REGISTRY_DB"], site=settings["name"]),
+            media_cache=open_media_cache(config, namespace=settings["name"]),
+            http_options=http_options(config)
+        )
+        for settings in config["WP_TARGETS"]
+    ]
+
+
+def open_dedup(config):
+    if not config["NEAR_DUP_ENABLED"]:
+        return None
+    return NearDuplicateIndex(
+        config["REGISTRY_DB"],
+        title_distance=config["NEAR_DUP_TITLE_DISTANCE"],
+        body_distance=config["NEAR_DUP_BODY_DISTANCE"],
+        max_age=config["NEAR_DUP_MAX_AGE_HOURS"] * 3600
+    )
+
+
+def open_spool(config):
+    return ArticleSpool(config["SPOOL_PATH"]) if config["SPOOL_PATH"] else None
+
+
+def open_image_service(config):
+    if not config["IMAGE_PROCESSES"]:
+        return None
+    from utils.image_service import ImageService
+    return ImageService(config["IMAGE_PROCESSES"])
+
+
+def open_services(config):
+    """Opens the state that lives across cycles (see close_services)."""
+    return {
+        "registry": open_registry(config),
+        "mirror": PostMirror(config["REGISTRY_DB"]),
+        # Shared across cycles so the post rate holds over the whole run
+        "bucket": make_post_bucket(config),
+        "spool": open_spool(config),
+        # With WP_TARGETS every target has its own namespace instead (see open_targets)
+        "media_cache": None if config["WP_TARGETS"] else open_media_cache(config),
+        "dedup": open_dedup(config),
+        "metrics_server": metrics.serve(config["METRICS_PORT"]) if config["METRICS_PORT"] else None,
+        "targets": open_targets(config),
+        "images": open_image_service(config),
+        "scheduler": FreshnessScheduler(
+            target_latency=config["PUBLISH_LATENCY_TARGET"],
+            stale_after=config["STALE_AFTER_HOURS"] * 3600,
+            weights=config["FEED_WEIGHTS"]
+        ),
+    }
+
+
+def close_services(services):
+    for target in services.get("targets") or []:
+        target.close()
+    for name in ("images", "dedup", "media_cache", "mirror", "registry"):
+        if services.get(name):
+            services[name].close()
+    if services.get("metrics_server"):
+        services["metrics_server"].shutdown()
+
+
+def run_cycle(config, wp, crawler, services, recovered=None):
+    """
+    One pipeline cycle (see _run_cycle), timed as a whole. With METRICS_DIR
+    set, the cycle's counters and stage timings are written there as JSON.
+    `recovered` is passed when discover() already ran for this cycle.
+    """
+    if recovered is None:
+        metrics.start_cycle()
     try:
-        with open(DATA_JSON, "r", encoding="utf-8") as f:
-            registry = json.load(f)
-        
-        items_to_process = []
-        potential_items = [item for item in registry if not item.get('uploaded')]
+        with metrics.timed('cycle'):
+            return _run_cycle(config, wp, crawler, services, recovered)
+    finally:
+        if config["METRICS_DIR"]:
+            path = metrics.dump_cycle(config["METRICS_DIR"])
+            print(f"📈 Cycle metrics written to {path}")
 
-        print(f"🔍 Scanning registry for {MAX_LINKS} new articles...")
+
+def discover(config, services):
+    """
+    The cheap first half of a cycle: recover spooled articles and poll the
+    feeds that are due. Needs neither WordPress nor the crawler.
+    Returns the recovered articles.
+    """
+    registry = services["registry"]
+    spool = services["spool"]
+
+    # Initialize environment
+    ensure_data_dirs(['data'])
+
+    # Articles scraped before a crash but never handled
+    recovered = []
+    if spool:
+        spool.compact()
+        for article in spool.pending():
+            item = registry.find_by_url(article['link'])
+            if item and not item['uploaded']:
+                recovered.append(article)
+            else:
+                spool.mark_done(article['link'])
+        if recovered:
+            print(f"♻️ Recovered {len(recovered)} scraped articles from {spool.path}")
+
+    poll(config, services)
+    return recovered
+
+
+def poll(config, services):
+    """Updates the local registry with the latest RSS entries (only feeds that are due)."""
+    return poll_feeds(
+        config["RSS_URLS"], services["registry"],
+        max_size=config["MAX_REGISTRY_SIZE"],
+        workers=config["FEED_WORKERS"],
+        min_interval=config["FEED_MIN_INTERVAL"],
+        max_interval=config["FEED_MAX_INTERVAL"],
+        dedup=services["dedup"]
+    )
+
+
+def is_idle(services, recovered):
+    """True when there is nothing to recover and no pending registry item."""
+    return not recovered and not services["registry"].pending(limit=1)
+
+
+def pending_items(registry, scheduler):
+    """Pending registry items, most urgent first with a FreshnessScheduler (else oldest first)."""
+    items = registry.pending()
+    return scheduler.order(items, registry) if scheduler else items
+
+
+def select_links(registry, mirror, max_links, recovered, scheduler=None):
+    """
+    Picks up to max_links pending registry items that are not on WordPress
+    yet (checked against the synced mirror), in scheduler order.
+    Returns the links to crawl.
+    """
+    items_to_process = []
+    potential_items = pending_items(registry, scheduler)
+    print(f"🔍 Scanning registry for {max_links} new articles...")
+
+    for item in potential_items:
+        if len(items_to_process) >= max_links:
+            break
         
-        wp = WordPressAuth(WP_URL)
-        if not wp.login(WP_USER, WP_PWD):
-            print("❌ WordPress Login Failed. Check your .env credentials.")
-            return
+        # Extract the numeric ID from the link
+        article_id = extract_id(item['link'])
+        existing_id = mirror.lookup(article_id)
 
-        for item in potential_items:
-            if len(items_to_process) >= MAX_LINKS:
-                break
-            
-            # Extract the numeric ID from the link
-            article_id = extract_id(item['link'])
-            existing_id = wp.post_exists_by_id(article_id)  # You would need to create this method in wordpress_api.py
+        if existing_id:
+            # Remember the duplicate so it is never checked again
+            metrics.inc('duplicates_skipped_total', kind='wordpress')
+            registry.mark_uploaded(item['id'], existing_id)
+        else:
+            items_to_process.append(item)
 
+    recovered_links = {article['link'] for article in recovered}
+    return [item['link'] for item in items_to_process if item['link'] not in recovered_links]
+
+
+def article_stream(crawler, links, recovered, services):
+    """Recovered articles first, then the live crawl (spooled, near-duplicates dropped)."""
+    from utils.refresh import record_content
+    print(f"📡 Scraping {len(links)} new articles...")
+    # Content hash + ETag/Last-Modified per article, for refresh mode
+    scraped = record_content(crawler.stream(links), services["registry"])
+    if services["spool"]:
+        scraped = services["spool"].tee(scraped)
+    articles = itertools.chain(recovered, scraped)
+    if services["dedup"]:
+        # Same story, different wording: caught on the body before image and post work
+        articles = drop_near_duplicate_bodies(articles, services["dedup"], services["registry"], services["spool"])
+    return articles
+
+
+def select_for_targets(registry, targets, all_targets, max_links, recovered, scheduler=None):
+    """
+    select_links for fan-out: an item is picked while at least one connected
+    target still lacks it. Posts a target already has (per its mirror) are
+    recorded in the registry's publications table instead of re-posted.
+    """
+    items_to_process = []
+    print(f"🔍 Scanning registry for {max_links} new articles for {len(targets)} site(s)...")
+
+    for item in pending_items(registry, scheduler):
+        if len(items_to_process) >= max_links:
+            break
+
+        article_id = extract_id(item['link'])
+        done = registry.published_targets(item['id'])
+        missing = False
+        for target in targets:
+            if target.name in done:
+                continue
+            existing_id = target.mirror.lookup(article_id)
             if existing_id:
-                item['uploaded'] = True
-                item['wp_id'] = existing_id
+                metrics.inc('duplicates_skipped_total', kind='wordpress')
+                registry.mark_published(item['id'], target.name, existing_id)
             else:
-                items_to_process.append(item)
+                missing = True
 
-        # Save registry to remember duplicates found
-        with open(DATA_JSON, "w", encoding="utf-8") as f:
-            json.dump(registry, f, ensure_ascii=False, indent=4)
+        if missing:
+            items_to_process.append(item)
+        else:
+            registry.complete_if_published(item['id'], all_targets)
 
-        links_to_scrape = [item['link'] for item in items_to_process]
-        
-        if not links_to_scrape:
+    recovered_links = {article['link'] for article in recovered}
+    return [item['link'] for item in items_to_process if item['link'] not in recovered_links]
+
+
+def _fan_out(config, crawler, services, recovered):
+    """Select -> crawl once -> publish to every WP_TARGETS site."""
+    from utils.publisher import publish_to_targets
+    registry = services["registry"]
+    all_targets = [target.name for target in services["targets"]]
+    # A site that is down this cycle is skipped; its articles stay pending for it
+    targets = [target for target in services["targets"] if target.connect()]
+    if not targets:
+        print("❌ No WordPress target is reachable. Skipping this cycle.")
+        return 0
+
+    try:
+        selection_started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(targets)) as pool:
+            list(pool.map(lambda target: target.mirror.sync(target.wp), targets))
+        links_to_scrape = select_for_targets(registry, targets, all_targets, config["MAX_LINKS"], recovered, services["scheduler"])
+        metrics.observe('pipeline_stage_seconds', time.perf_counter() - selection_started, stage='duplicate_check')
+        if not links_to_scrape and not recovered:
             print("☕ No new articles found. Everything is up to date.")
-            wp.logout()
-            time.sleep(60)  # wait a bit before restarting
-            main()  # restart the whole process
-            return
-            
-        print(f"📡 Scraping {len(links_to_scrape)} new articles...")
-        run_crawler(urls=links_to_scrape, folder=RAW_NEWS_DIR)
-        
+            return 0
     except Exception as e:
-        print(f"❌ Selection/Crawler Error: {e}")
-        return
+        print(f"❌ Selection Error: {e}")
+        return 0
 
-    # 2. Process Scraped Files and Upload
-    target_id = wp.get_category_id_by_slug(WP_CAT_SLUG)
-    scraped_files = [f for f in os.listdir(RAW_NEWS_DIR) if f.endswith('.txt')]
-    
-    print(f"🚀 Found {len(scraped_files)} files in storage. Starting upload pipeline...")
+    articles = article_stream(crawler, links_to_scrape, recovered, services)
+    print(f"🚀 Starting fan-out to: {', '.join(target.name for target in targets)}")
+    published = publish_to_targets(
+        articles, targets, registry, all_targets,
+        image_settings=image_settings(config),
+        media_workers=config["MEDIA_WORKERS"],
+        spool=services["spool"],
+        images=services["images"]
+    )
+    for name, count in published.items():
+        print(f"   📊 {name}: {count} published")
+    return sum(published.values())
 
-    for index, filename in enumerate(scraped_files):
-        file_path = os.path.join(RAW_NEWS_DIR, filename)
-        
-        with open(file_path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-            if len(lines) < 3:
-                continue
 
-            source_url = lines[0].replace("SOURCE URL: ", "").strip()
-            img_url = lines[1].replace("IMAGE URL: ", "").strip()
-            
-            if len(lines) > 2 and "TITLE: " in lines[2]:
-                post_title = lines[2].replace("TITLE: ", "").strip()
-            else:
-                post_title = os.path.splitext(filename)[0] 
+async def _select_and_publish_async(config, crawler, services, recovered):
+    """Async variant of the select -> crawl -> publish phase of a cycle."""
+    from utils.wordpress_async import AsyncWordPressAuth
+    from utils.publisher import publish_articles_async
+    registry = services["registry"]
+    mirror = services["mirror"]
+    async with AsyncWordPressAuth(
+        config["WP_URL"],
+        concurrency=config["WP_CONCURRENCY"],
+        timeout=config["HTTP_TIMEOUT"],
+        max_retries=config["HTTP_MAX_RETRIES"],
+        breaker_threshold=config["WP_BREAKER_THRESHOLD"],
+        breaker_timeout=config["WP_BREAKER_COOLDOWN"]
+    ) as wp:
+        if not await wp.login(config["WP_USER"], config["WP_PWD"]):
+            print("❌ WordPress Login Failed. Check your .env credentials.")
+            return 0
 
-            content = "".join(lines[4:]) 
+        try:
+            selection_started = time.perf_counter()
+            # First page, then the remaining pages concurrently
+            await mirror.sync_async(wp)
+            links_to_scrape = select_links(registry, mirror, config["MAX_LINKS"], recovered, services["scheduler"])
+            metrics.observe('pipeline_stage_seconds', time.perf_counter() - selection_started, stage='duplicate_check')
+            if not links_to_scrape and not recovered:
+                print("☕ No new articles found. Everything is up to date.")
+                return 0
+        except Exception as e:
+            print(f"❌ Selection Error: {e}")
+            return 0
 
-        # --- Process Image ---
-        feat_id = None
-        if img_url and img_url != 'None':
-            print(f"🖼️  Processing image for: {post_title[:40]}...")
-            temp_img_path = "data/temp_featured.jpg"
-            local_path = download_and_resize_image(img_url, IMG_W, IMG_H, temp_img_path)
-            
-            if local_path:
-                feat_id = wp.upload_local_image(local_path)
-                if os.path.exists(local_path):
-                    os.remove(local_path)
-
-        # --- Create WordPress Post ---
-        print(f"📤 Posting to WordPress: {post_title[:40]}...")
-        result = wp.create_post(
-            title=post_title, 
-            content=content, 
-            categories=[target_id] if target_id else [], 
-            featured_image_id=feat_id
+        target_id = await wp.get_category_id_by_slug(config["WP_CAT_SLUG"])
+        articles = article_stream(crawler, links_to_scrape, recovered, services)
+
+        print(f"🚀 Starting async upload pipeline ({config['WP_CONCURRENCY']} in flight)...")
+        return await publish_articles_async(
+            articles, wp, registry, mirror,
+            category_id=target_id,
+            image_settings=image_settings(config),
+            bucket=services["bucket"],
+            concurrency=config["WP_CONCURRENCY"],
+            spool=services["spool"],
+            media_cache=services["media_cache"],
+            images=services["images"]
         )
+
+
+def _run_cycle(config, wp, crawler, services, recovered=None):
+    """
+    Runs one poll -> select -> crawl -> upload pass using long-lived
+    WordPress session, crawler and services (registry, post mirror,
+    rate limiter, spool, media cache, near-duplicate index).
+    Scraped articles stream straight from the crawler into the upload stage.
+    Returns the number of published posts.
+    """
+    from utils.publisher import publish_articles, publish_articles_batch
+    registry = services["registry"]
+    mirror = services["mirror"]
+    bucket = services["bucket"]
+    spool = services["spool"]
+    media_cache = services["media_cache"]
+    WP_CAT_SLUG = config["WP_CAT_SLUG"]
+    MAX_LINKS = config["MAX_LINKS"]
+
+    if recovered is None:
+        recovered = discover(config, services)
+    if is_idle(services, recovered):
+        # Nothing pending: skip the mirror sync and every WordPress request
+        print("☕ No new articles found. Everything is up to date.")
+        return 0
+
+    if services["targets"]:
+        return _fan_out(config, crawler, services, recovered)
+
+    if config["WP_ASYNC"]:
+        # Selection and publishing on one event loop with the async client
+        return asyncio.run(_select_and_publish_async(config, crawler, services, recovered))
+
+    # 1. Find TRULY new items
+    try:
+        selection_started = time.perf_counter()
+        # One incremental request instead of one lookup per item
+        mirror.sync(wp)
+        links_to_scrape = select_links(registry, mirror, MAX_LINKS, recovered, services["scheduler"])
+        metrics.observe('pipeline_stage_seconds', time.perf_counter() - selection_started, stage='duplicate_check')
         
-        # --- Capture WP_ID and Update Registry (STRICT MATCH) ---
-        if isinstance(result, dict) and "id" in result:
-            
-            new_id = result["id"]
-            clean_source_url = unquote(source_url.strip())
-            source_id = extract_id(clean_source_url) # Get ID from scraped URL
-            print(f"source_id : {source_id}")
-            found_locally = False
-            
-            # Reload to prevent data loss
-            with open(DATA_JSON, "r", encoding="utf-8") as f:
-                registry = json.load(f)
+        if not links_to_scrape and not recovered:
+            print("☕ No new articles found. Everything is up to date.")
+            return 0
             
-            for item in registry:
-                registry_item_id = extract_id(unquote(item['link'].strip())) # Get ID from JSON link
-                if registry_item_id == source_id: # Compare IDs instead of full strings
-                    item['uploaded'] = True
-                    item['wp_id'] = new_id
-                    found_locally = True
+    except Exception as e:
+        print(f"❌ Selection Error: {e}")
+        return 0
+
+    # 2. Crawl and Upload: each article is posted as soon as it is scraped
+    target_id = wp.get_category_id_by_slug(WP_CAT_SLUG)
+    articles = article_stream(crawler, links_to_scrape, recovered, services)
+
+    print("🚀 Starting upload pipeline...")
+    if config["POST_BATCH_SIZE"] > 1:
+        published = publish_articles_batch(
+            articles, wp, registry, mirror,
+            category_id=target_id,
+            image_settings=image_settings(config),
+            bucket=bucket,
+            media_workers=config["MEDIA_WORKERS"],
+            batch_size=config["POST_BATCH_SIZE"],
+            spool=spool,
+            media_cache=media_cache,
+            images=services["images"]
+        )
+    else:
+        published = publish_articles(
+            articles, wp, registry, mirror,
+            category_id=target_id,
+            image_settings=image_settings(config),
+            bucket=bucket,
+            media_workers=config["MEDIA_WORKERS"],
+            spool=spool,
+            media_cache=media_cache,
+            images=services["images"]
+        )
+
+    return published
+
+
+def run_refresh(config, wp, crawler, services):
+    """One refresh pass over recently published articles (single-site mode only)."""
+    from utils.refresh import refresh_articles
+    if services["targets"]:
+        print("⚠️ Refresh mode is not available with WP_TARGETS.")
+        return None
+    return refresh_articles(
+        wp, crawler, services["registry"],
+        image_settings=image_settings(config),
+        max_age=config["REFRESH_MAX_AGE_HOURS"] * 3600,
+        limit=config["REFRESH_LIMIT"],
+        bucket=services["bucket"],
+        media_cache=services["media_cache"],
+        images=services["images"]
+    )
+
+
+def refresh():
+    """One-shot refresh: re-crawl recent posts and update the ones whose source changed."""
+    config = load_config()
+    wp = connect_wordpress(config)
+    if not wp:
+        return
+
+    services = open_services(config)
+    crawler = open_crawler(config)
+    try:
+        run_refresh(config, wp, crawler, services)
+    finally:
+        crawler.stop()
+        wp.logout()
+        close_services(services)
+    print("\n--- ✨ Refresh Finished ---")
+
+
+def main():
+    """
+    One-shot run: a single cycle, then exit (suitable for cron).
+    The feeds are polled first; when nothing is new the run ends before
+    logging in to WordPress or loading the crawler.
+    """
+    config = load_config()
+    services = open_services(config)
+    wp = None
+    crawler = None
+    try:
+        metrics.start_cycle()
+        recovered = discover(config, services)
+        if is_idle(services, recovered):
+            print("☕ No new articles found. Everything is up to date.")
+            return
+
+        # With WP_TARGETS each target logs in on its own (see _fan_out)
+        if not config["WP_TARGETS"]:
+            wp = connect_wordpress(config)
+            if not wp:
+                return
+
+        crawler = open_crawler(config)
+        run_cycle(config, wp, crawler, services, recovered)
+    finally:
+        if crawler:
+            crawler.stop()
+        if wp:
+            wp.logout()
+        close_services(services)
+    print("\n--- ✨ Pipeline Finished ---")
+
+
+def run_daemon():
+    """
+    Long-running mode: one crawler reactor, one WordPress session and the
+    services (registry, mirror, rate limiter, caches) are kept alive across
+    cycles, and the RSS feed is polled every POLL_INTERVAL seconds.
+    With REFRESH_INTERVAL set, recent posts are also re-checked for source edits.
+    """
+    config = load_config()
+    interval = config["POLL_INTERVAL"]
+    services = open_services(config)
+    crawler = open_crawler(config)
+    crawler.start()
+    wp = None
+    next_refresh = time.monotonic() + config["REFRESH_INTERVAL"]
+
+    print(f"🛰️ Daemon started. Polling every {interval}s (Ctrl+C to stop).")
+    next_run = time.monotonic()
+    try:
+        while True:
+            if wp is None and not services["targets"]:
+                wp = connect_wordpress(config)
+
+            if wp or services["targets"]:
+                try:
+                    run_cycle(config, wp, crawler, services)
+                    if wp and config["REFRESH_INTERVAL"] and time.monotonic() >= next_refresh:
+                        next_refresh = time.monotonic() + config["REFRESH_INTERVAL"]
+                        run_refresh(config, wp, crawler, services)
+                except Exception as e:
+                    # Drop the sessions so the next cycle logs in again
+                    print(f"❌ Cycle Error: {e}")
+                    if wp:
+                        wp.logout()
+                    wp = None
+                    for target in services["targets"]:
+                        target.disconnect()
+
+            # Fixed-rate schedule; skip missed ticks instead of bunching them up
+            next_run += interval
+            now = time.monotonic()
+            if next_run < now:
+                next_run = now
+            time.sleep(next_run - now)
+    except KeyboardInterrupt:
+        print("\n🛑 Daemon stopped.")
+    finally:
+        if wp:
+            wp.logout()
+        crawler.stop()
+        close_services(services)
+
+
+def run_worker(args):
+    """
+    Queue worker: runs some or all pipeline stages (WORKER_STAGES or
+    --stages) as leased jobs from the shared work queue in the registry
+    database. Start several on one host, or on hosts sharing the data
+    volume, to spread crawl, image and publish work; a job is only ever
+    handled by the worker holding its lease, so nothing is posted twice.
+    'discover' polls the feeds and queues new items (one worker at a time).
+    With --once the worker exits when a pass finds nothing to do.
+    """
+    import socket
+    from utils.work_queue import WorkQueue
+    from utils.worker import WORKER_STAGES, crawl_stage, media_stage, publish_stage
+    config = load_config()
+    if config["WP_TARGETS"]:
+        print("⚠️ Worker mode is not available with WP_TARGETS.")
+        return
+    stages = [stage.strip() for stage in (args.stages or config["WORKER_STAGES"]).split(",") if stage.strip()]
+    unknown = set(stages) - set(WORKER_STAGES) - {'discover'}
+    if unknown:
+        print(f"❌ Unknown worker stages: {', '.join(sorted(unknown))}")
+        return
+    owner = args.worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    lease = config["WORKER_LEASE_SECONDS"]
+    batch = config["WORKER_BATCH"]
+
+    ensure_data_dirs(['data'])
+    services = open_services(config)
+    queue = WorkQueue(config["REGISTRY_DB"], max_attempts=config["WORKER_MAX_ATTEMPTS"])
+    crawler = None
+    if 'crawl' in stages:
+        crawler = open_crawler(config)
+    wp = None
+    category_id = None
+    next_sync = 0
+
+    print(f"👷 Worker {owner} started: {', '.join(stages)} (Ctrl+C to stop).")
+    try:
+        while True:
+            handled = 0
+            # Per-pass samples only; a long-running worker would otherwise keep them all
+            metrics.start_cycle()
+            try:
+                if wp is None and ('media' in stages or 'publish' in stages):
+                    wp = connect_wordpress(config)
+                    if wp and 'publish' in stages:
+                        category_id = wp.get_category_id_by_slug(config["WP_CAT_SLUG"])
+                        next_sync = 0
+                if wp and 'publish' in stages and time.time() >= next_sync:
+                    # Picks up posts made by other processes, including ones that died before recording them
+                    services["mirror"].sync(wp)
+                    next_sync = time.time() + config["WORKER_MIRROR_SYNC"]
+
+                if 'discover' in stages and queue.hold('discover', owner, lease):
+                    poll(config, services)
+                    services["scheduler"].drop_stale(services["registry"].pending(), services["registry"])
+                    added = queue.enqueue_pending(services["scheduler"])
+                    if added:
+                        print(f"📥 Queued {added} new articles. Queue: {queue.counts()}")
+                if crawler:
+                    handled += crawl_stage(
+                        queue, owner, crawler, services["registry"], services["mirror"], batch, lease, services["dedup"]
+                    )
+                if wp and 'media' in stages:
+                    handled += media_stage(
+                        queue, owner, wp, image_settings(config), batch, lease,
+                        media_cache=services["media_cache"], images=services["images"],
+                        workers=config["MEDIA_WORKERS"]
+                    )
+                if wp and 'publish' in stages:
+                    handled += publish_stage(
+                        queue, owner, wp, services["registry"], services["mirror"],
+                        category_id, services["bucket"], batch, lease, services["media_cache"]
+                    )
+            except Exception as e:
+                # Leases of jobs in flight run out and other workers pick them up
+                print(f"❌ Worker Error: {e}")
+                if wp:
+                    wp.logout()
+                wp = None
+
+            if not handled:
+                if args.once:
                     break
-            
-            with open(DATA_JSON, "w", encoding="utf-8") as f:
-                json.dump(registry, f, ensure_ascii=False, indent=4)
-            
-            if found_locally:
-                print(f"✅ Success! (WP ID: {new_id}) - Match by ID: {source_id}")
-            else:
-                print(f"⚠️ Posted, but ID {source_id} not found in JSON.")
-        else:
-            print(f"❌ Failed to post: {source_url}")
-        
-        if index < len(scraped_files) - 1:
-            print(f"⏳ Waiting {POST_DELAY}s before next post...")
-            time.sleep(POST_DELAY)
-    
-    wp.logout()
-    print("\n--- ✨ Pipeline Finished ---")  
+                time.sleep(config["WORKER_IDLE_SLEEP"])
+    except KeyboardInterrupt:
+        print(f"\n🛑 Worker {owner} stopped.")
+    finally:
+        if wp:
+            wp.logout()
+        if crawler:
+            crawler.stop()
+        print(f"📋 Queue: {queue.counts()}")
+        queue.close()
+        close_services(services)
+
+
+def backfill(args):
+    """
+    Imports an archive: queues the URLs from --urls/--sitemap in a checkpoint
+    table and publishes everything still pending (a plain `backfill` resumes
+    an interrupted run). Bypasses the RSS registry and MAX_LINKS.
+    """
+    from utils.backfill import BackfillCheckpoint, read_sitemap, read_url_list, run_backfill
+    config = load_config()
+    ensure_data_dirs(['data'])
+    checkpoint = BackfillCheckpoint(config["REGISTRY_DB"])
+    try:
+        urls = []
+        if args.urls:
+            urls += read_url_list(args.urls)
+        for sitemap in args.sitemap or []:
+            print(f"🗺️ Reading sitemap {sitemap}...")
+            urls += read_sitemap(sitemap)
+        if urls:
+            print(f"📥 Queued {checkpoint.add(urls)} new URLs ({len(urls)} listed).")
+        retried = checkpoint.retry_failed(config["BACKFILL_MAX_ATTEMPTS"])
+        if retried:
+            print(f"🔁 Retrying {retried} previously failed URLs.")
+        print(f"📋 Backfill status: {checkpoint.counts()}")
+
+        wp = connect_wordpress(config)
+        if not wp:
+            return
+        mirror = PostMirror(config["REGISTRY_DB"])
+        media_cache = open_media_cache(config)
+        crawler = open_crawler(
+            config,
+            concurrency=config["BACKFILL_CONCURRENCY"],
+            per_domain=config["BACKFILL_CONCURRENCY"],
+            start_delay=0,
+            LOG_LEVEL='WARNING',
+        )
+        try:
+            mirror.sync(wp)
+            published, seconds = run_backfill(
+                wp, crawler, checkpoint, mirror,
+                category_id=wp.get_category_id_by_slug(config["WP_CAT_SLUG"]),
+                image_settings=image_settings(config),
+                chunk_size=config["BACKFILL_CHUNK"],
+                batch_size=config["BACKFILL_BATCH_SIZE"],
+                post_workers=config["BACKFILL_POST_WORKERS"],
+                image_workers=config["BACKFILL_IMAGE_WORKERS"],
+                status='draft' if args.draft else 'publish',
+                bucket=TokenBucket(config["BACKFILL_BATCHES_PER_MINUTE"]),
+                media_cache=media_cache,
+                limit=args.limit
+            )
+        finally:
+            crawler.stop()
+            wp.logout()
+            mirror.close()
+            if media_cache:
+                media_cache.close()
+
+        rate = published / seconds if seconds else 0
+        print(f"\n--- ✨ Backfill Finished: {published} published in {seconds:.0f}s ({rate:.1f} articles/s) ---")
+        print(f"📋 Backfill status: {checkpoint.counts()}")
+    finally:
+        checkpoint.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="RSS to WordPress news pipeline")
+    parser.add_argument(
+        "mode", nargs="?", default="run", choices=["run", "daemon", "backfill", "refresh", "worker"],
+        help="'run' processes one cycle and exits, 'daemon' keeps polling the feed, "
+             "'backfill' imports a list or sitemap of archived articles, "
+             "'refresh' updates recent posts whose source page changed, "
+             "'worker' runs pipeline stages from the shared work queue"
+    )
+    parser.add_argument("--urls", help="backfill: text file with one article URL per line")
+    parser.add_argument("--sitemap", action="append", help="backfill: sitemap or sitemap index (URL or file, repeatable)")
+    parser.add_argument("--draft", action="store_true", help="backfill: create posts as drafts")
+    parser.add_argument("--limit", type=int, help="backfill: stop after this many URLs")
+    parser.add_argument("--stages", help="worker: comma-separated subset of discover,crawl,media,publish")
+    parser.add_argument("--worker-id", help="worker: name used for leases (default host-pid)")
+    parser.add_argument("--once", action="store_true", help="worker: exit when there is nothing left to do")
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = parse_args(sys.argv[1:])
+    if args.mode == "daemon":
+        run_daemon()
+    elif args.mode == "backfill":
+        backfill(args)
+    elif args.mode == "refresh":
+        refresh()
+    elif args.mode == "worker":
+        run_worker(args)
+    else:
+        main()
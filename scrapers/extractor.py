@@ -0,0 +1,133 @@
+import re
+from urllib.parse import urlparse
+from lxml import etree
+from cssselect import GenericTranslator
+
+# Per-domain selector profiles. Add an entry keyed by domain (without "www.")
+# to override any of the default selectors for a single news site.
+EXTRACTION_PROFILES = {
+    'default': {
+        'title': 'title',
+        'image_meta': 'meta[property="og:image"]',
+        'image': 'article img, .entry-content img, img',
+        'content': (
+            '.primary_inf h1,.primary_inf h2,.primary_inf h3, '
+            '.primary_inf h4,.primary_inf h5,.primary_inf h6,.primary_inf p ,.primary_inf span ,.primary_inf li ,.primary_inf b,.primary_inf strong ,.primary_inf i ,.primary_inf em,'
+            'article h1, article p, .entry-content p,.right_newsinfo,'
+            'main *:not(a)'
+        ),
+    },
+}
+
+# Text inside these tags is never emitted
+SKIP_TAGS = {'script', 'style', 'noscript', 'template', 'svg', 'iframe'}
+
+# Inline tags don't start a new block when they sit inside a matched block;
+# their text is merged into the surrounding paragraph instead
+INLINE_TAGS = {
+    'a', 'abbr', 'b', 'bdi', 'bdo', 'br', 'cite', 'code', 'em', 'font', 'i', 'mark',
+    'q', 's', 'small', 'span', 'strong', 'sub', 'sup', 'time', 'u',
+}
+
+_WHITESPACE = re.compile(r'\s+')
+_compiled_profiles = {}
+
+
+def _compile(css):
+    return etree.XPath(GenericTranslator().css_to_xpath(css))
+
+
+def get_profile(url):
+    """Returns the compiled selectors for the URL's domain (compiled once per domain)."""
+    domain = urlparse(url).netloc.lower()
+    if domain.startswith('www.'):
+        domain = domain[4:]
+    if domain not in EXTRACTION_PROFILES:
+        domain = 'default'
+
+    if domain not in _compiled_profiles:
+        profile = dict(EXTRACTION_PROFILES['default'])
+        profile.update(EXTRACTION_PROFILES[domain])
+        _compiled_profiles[domain] = {key: _compile(css) for key, css in profile.items()}
+    return _compiled_profiles[domain]
+
+
+def extract_text_blocks(root, content_xpath):
+    """
+    Walks the document once and returns de-duplicated text blocks in document order.
+
+    Every element matched by content_xpath opens a block, except inline tags
+    nested in another block. Each text node is emitted exactly once, into the
+    nearest enclosing block, so nested matches never repeat the same text.
+    """
+    matched = set(content_xpath(root))
+    if not matched:
+        return []
+
+    blocks = []       # text parts per block, indexed in document order of block start
+    owners = []       # stack of block indexes (None = outside any block)
+
+    def add(text):
+        if text and owners and owners[-1] is not None:
+            blocks[owners[-1]].append(text)
+
+    walker = etree.iterwalk(root, events=('start', 'end', 'comment', 'pi'))
+    for event, el in walker:
+        if event in ('comment', 'pi'):
+            add(el.tail)
+            continue
+
+        if event == 'start':
+            tag = el.tag.lower() if isinstance(el.tag, str) else ''
+            if tag in SKIP_TAGS:
+                walker.skip_subtree()
+                # The 'end' event still fires, so keep the stack balanced
+                owners.append(None)
+                continue
+
+            current = owners[-1] if owners else None
+            is_block = el in matched and (current is None or tag not in INLINE_TAGS)
+            if is_block:
+                blocks.append([])
+                owners.append(len(blocks) - 1)
+            else:
+                owners.append(current)
+            add(el.text)
+        else:
+            owners.pop()
+            # The tail belongs to whatever encloses this element
+            add(el.tail)
+
+    seen = set()
+    clean_text = []
+    for parts in blocks:
+        text = _WHITESPACE.sub(' ', ''.join(parts)).strip()
+        if text and text not in seen:
+            seen.add(text)
+            clean_text.append(text)
+    return clean_text
+
+
+def extract_article(response):
+    """
+    Single-pass extraction for a Scrapy response.
+    Returns (title, image_url, list of text blocks).
+    """
+    root = response.selector.root
+    profile = get_profile(response.url)
+
+    titles = profile['title'](root)
+    page_title = (''.join(titles[0].itertext()) if titles else '') or "no_title"
+
+    image_url = None
+    for meta in profile['image_meta'](root):
+        image_url = meta.get('content')
+        if image_url:
+            break
+    if not image_url:
+        for img in profile['image'](root):
+            image_url = img.get('src')
+            if image_url:
+                break
+
+    return page_title.strip(), image_url, extract_text_blocks(root, profile['content'])
@@ -0,0 +1,69 @@
+import os
+import time
+import shutil
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.project import data_path
+
+
+def prune_cache(cache_dir, max_age=0, max_bytes=0):
+    """
+    Trims a Scrapy FilesystemCacheStorage directory: entries older than
+    max_age seconds are deleted, then the oldest ones until the cache is
+    under max_bytes (0 disables either limit). Returns (entries removed, bytes left).
+    """
+    entries = []
+    # Layout: <cache_dir>/<spider>/<fp[:2]>/<fp>/{pickled_meta, response_body, ...}
+    for root, dirs, files in os.walk(cache_dir):
+        if 'pickled_meta' not in files:
+            continue
+        dirs[:] = []
+        try:
+            stored_at = os.path.getmtime(os.path.join(root, 'pickled_meta'))
+            size = sum(os.path.getsize(os.path.join(root, name)) for name in files)
+        except OSError:
+            # Removed by another process meanwhile
+            continue
+        entries.append((stored_at, size, root))
+
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    cutoff = time.time() - max_age if max_age else 0
+    removed = 0
+    for stored_at, size, path in entries:
+        if stored_at >= cutoff and (not max_bytes or total <= max_bytes):
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        removed += 1
+    return removed, total
+
+
+class HttpCachePruner:
+    """
+    Extension that keeps the HTTP cache bounded: when a crawl ends, entries
+    past HTTPCACHE_EXPIRATION_SECS are deleted and the oldest ones go until
+    the cache fits in HTTPCACHE_MAX_BYTES. Runs in a thread pool, off the reactor.
+    """
+    def __init__(self, settings):
+        if not settings.getbool('HTTPCACHE_ENABLED'):
+            raise NotConfigured
+        self.cache_dir = data_path(settings['HTTPCACHE_DIR'])
+        self.max_age = settings.getint('HTTPCACHE_EXPIRATION_SECS')
+        self.max_bytes = settings.getint('HTTPCACHE_MAX_BYTES')
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        pruner = cls(crawler.settings)
+        crawler.signals.connect(pruner.spider_closed, signal=signals.spider_closed)
+        return pruner
+
+    async def spider_closed(self, spider):
+        from twisted.internet import threads
+        from scrapy.utils.defer import maybe_deferred_to_future
+        await maybe_deferred_to_future(threads.deferToThread(self._prune, spider))
+
+    def _prune(self, spider):
+        removed, size = prune_cache(self.cache_dir, self.max_age, self.max_bytes)
+        if removed:
+            spider.logger.info(f'🧹 HTTP cache: removed {removed} entries, {size / 1024 / 1024:.1f} MB left')
@@ -1,84 +1,229 @@
 import os
+import sys
+import queue
+import threading
 import scrapy
-from scrapy.crawler import CrawlerProcess
+from scrapy import signals
+from scrapy.crawler import CrawlerProcess, CrawlerRunner
+from scrapy.settings import Settings
+from scrapy.utils.log import configure_logging
+from scrapy.utils.reactor import install_reactor
 from urllib.parse import unquote
 import ssl
+from scrapers.extractor import extract_article
+from utils.metrics import metrics
 
 if hasattr(ssl, '_create_unverified_context'):
     ssl._create_default_https_context = ssl._create_unverified_context
 
+# Put on a crawl's item queue once the spider has closed
+CRAWL_DONE = object()
+
 class NewsSpider(scrapy.Spider):
     name = 'news_spider'
+    # Conditional re-crawls (refresh mode) answer 304; let those reach parse()
+    handle_httpstatus_list = [304]
     
-    def __init__(self, urls=None, folder='data/raw_news', *args, **kwargs):
+    def __init__(self, urls=None, headers=None, *args, **kwargs):
         super(NewsSpider, self).__init__(*args, **kwargs)
         self.start_urls = urls if urls else []
-        self.folder = folder
-        if not os.path.exists(self.folder):
-            os.makedirs(self.folder)
+        # {url: {header: value}}, e.g. If-None-Match / If-Modified-Since
+        self.request_headers = headers or {}
+
+    async def start(self):
+        # Scrapy >= 2.13
+        for request in self.start_requests():
+            yield request
+
+    def start_requests(self):
+        for url in self.start_urls:
+            # A re-check (any URL given headers, even none to send) must reach the site, not the HTTP cache
+            recheck = url in self.request_headers
+            yield scrapy.Request(
+                url, headers=self.request_headers.get(url) or None, dont_filter=True,
+                meta={'dont_cache': True} if recheck else None
+            )
 
     def parse(self, response):
+            if 'cached' in response.flags:
+                metrics.inc('crawl_cache_hits_total')
+            elif response.meta.get('download_latency') is not None:
+                # Time from sending the request to receiving the full response
+                metrics.observe('pipeline_stage_seconds', response.meta['download_latency'], stage='crawl_download')
+            link = response.meta.get('redirect_urls', [response.url])[0]
+            if response.status == 304:
+                metrics.inc('crawl_pages_total', result='not_modified')
+                yield {"link": link, "source_url": response.url, "not_modified": True}
+                return
             try:
-                # 1. Get the actual page title
-                page_title = response.css('title::text').get() or "no_title"
-                page_title = page_title.strip()
-
-                # 2. Filename cleanup (keep it for the file system)
-                forbidden_chars = r'\/:*?"<>|'
-                safe_filename = "".join([c for c in page_title if c not in forbidden_chars])
-                safe_filename = safe_filename[:150]
-                if not safe_filename.endswith(".txt"):
-                    safe_filename += ".txt"
-                
-                file_path = os.path.join(self.folder, safe_filename)
-
-                # 3. Extract Image
-                image_url = response.css('meta[property="og:image"]::attr(content)').get()
-                if not image_url:
-                    image_url = response.css('article img::attr(src), .entry-content img::attr(src), img::attr(src)').get()
-
-                # 4. Extract Content
-                content_selector = (
-                    '.primary_inf h1,.primary_inf h2,.primary_inf h3, '
-                    '.primary_inf h4,.primary_inf h5,.primary_inf h6,.primary_inf p ,.primary_inf span ,.primary_inf li ,.primary_inf b,.primary_inf strong ,.primary_inf i ,.primary_inf em,'
-                    'article h1, article p, .entry-content p,.right_newsinfo,'
-                    'main *:not(a)'
-                )
-                content_elements = response.css(content_selector).getall()
-                
-                clean_text = []
-                for html_snippet in content_elements:
-                    text = scrapy.Selector(text=html_snippet).xpath('//text()').get()
-                    if text and text.strip():
-                        clean_text.append(text.strip())
-
-                # 5. SAVE TO FILE (Added TITLE line)
+                # 1. Single pass over the parsed page: title, image and text blocks
+                with metrics.timed('extract'):
+                    page_title, image_url, clean_text = extract_article(response)
+
+                # 2. Hand the article to the upload stage (no files on disk)
                 if clean_text:
-                    with open(file_path, "w", encoding="utf-8") as f:
-                        f.write(f"SOURCE URL: {response.url}\n")
-                        f.write(f"IMAGE URL: {image_url if image_url else 'None'}\n")
-                        f.write(f"TITLE: {page_title}\n")  # <--- NEW LINE: Explicit Title
-                        f.write("=" * 50 + "\n\n")
-                        f.write("\n\n".join(clean_text))
-                    self.log(f'✅ Saved: {safe_filename}')
+                    yield {
+                        # URL we were asked to crawl (the registry link), before redirects
+                        "link": link,
+                        "source_url": response.url,
+                        "image_url": image_url,
+                        "title": page_title,
+                        "content": "\n\n".join(clean_text),
+                        # Validators for the next conditional request
+                        "etag": _header(response, b'ETag'),
+                        "last_modified": _header(response, b'Last-Modified'),
+                    }
+                    metrics.inc('crawl_pages_total', result='scraped')
+                    self.logger.info(f'✅ Scraped: {page_title[:60]}')
                 else:
-                    self.log(f'⚠️ No content: {response.url}')
+                    metrics.inc('crawl_pages_total', result='empty')
+                    self.logger.info(f'⚠️ No content: {response.url}')
 
             except Exception as e:
+                metrics.inc('crawl_pages_total', result='error')
                 self.logger.error(f"❌ Error: {e}")
 
-def run_crawler(urls, folder):
+def _header(response, name):
+    value = response.headers.get(name)
+    return value.decode('latin-1') if value else None
+
+
+CRAWLER_SETTINGS = {
+    'USER_AGENT': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36',
+    'LOG_LEVEL': 'INFO',
+    'ROBOTSTXT_OBEY': False, 
+    'DOWNLOAD_DELAY': 1,      
+    # Backs a domain off on 429/5xx/timeouts (only active with AUTOTHROTTLE_ENABLED)
+    'DOWNLOADER_MIDDLEWARES': {'scrapers.throttle.ErrorAwareThrottle': 560},
+    # Size/age limit for the HTTP cache (only active with HTTPCACHE_ENABLED)
+    'EXTENSIONS': {'scrapers.http_cache.HttpCachePruner': 500},
+}
+
+
+def crawler_settings(concurrency=16, per_domain=4, min_delay=0.0, start_delay=1.0, max_delay=30.0,
+                     target_concurrency=2.0, autothrottle=True, cache_dir=None, cache_ttl=86400,
+                     cache_max_bytes=0, **overrides):
+    """
+    CRAWLER_SETTINGS with adaptive throttling and the HTTP cache configured.
+
+    - autothrottle: each domain's delay follows its latency (AutoThrottle,
+      aiming at target_concurrency parallel requests per domain, between
+      min_delay and max_delay) and backs off on errors (ErrorAwareThrottle).
+      Without it, every request waits a fixed start_delay.
+    - cache_dir: successful pages are kept on disk for cache_ttl seconds,
+      so re-runs and retries do not download them again; the cache is
+      trimmed to cache_max_bytes after each crawl.
+    """
+    settings = dict(
+        CRAWLER_SETTINGS,
+        CONCURRENT_REQUESTS=concurrency,
+        CONCURRENT_REQUESTS_PER_DOMAIN=per_domain,
+        DOWNLOAD_DELAY=min_delay if autothrottle else start_delay,
+        AUTOTHROTTLE_ENABLED=autothrottle,
+        AUTOTHROTTLE_START_DELAY=start_delay,
+        AUTOTHROTTLE_MAX_DELAY=max_delay,
+        AUTOTHROTTLE_TARGET_CONCURRENCY=target_concurrency,
+    )
+    if cache_dir:
+        settings.update(
+            HTTPCACHE_ENABLED=True,
+            # Absolute, or Scrapy would put it under .scrapy/
+            HTTPCACHE_DIR=os.path.abspath(cache_dir),
+            HTTPCACHE_EXPIRATION_SECS=cache_ttl,
+            HTTPCACHE_MAX_BYTES=cache_max_bytes,
+            # Only successful pages; errors and 304s must be asked again
+            HTTPCACHE_IGNORE_HTTP_CODES=[304] + list(range(400, 600)),
+        )
+    settings.update(overrides)
+    return settings
+
+def run_crawler(urls):
+    """Standalone blocking crawl (starts and stops its own reactor). Returns the scraped items."""
     if not urls:
         print("⚠️ No URLs to crawl.")
-        return
-
-    settings = {
-        'USER_AGENT': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36',
-        'LOG_LEVEL': 'INFO',
-        'ROBOTSTXT_OBEY': False, 
-        'DOWNLOAD_DELAY': 1,      
-    }
-
-    process = CrawlerProcess(settings)
-    process.crawl(NewsSpider, urls=urls, folder=folder)
-    process.start()
\ No newline at end of file
+        return []
+
+    items = []
+    process = CrawlerProcess(CRAWLER_SETTINGS)
+    crawler = process.create_crawler(NewsSpider)
+    crawler.signals.connect(lambda item, **kwargs: items.append(dict(item)), signal=signals.item_scraped, weak=False)
+    process.crawl(crawler, urls=urls)
+    process.start()
+    return items
+
+
+class CrawlerService:
+    """
+    Keeps a single Twisted reactor and CrawlerRunner alive for the whole process.
+    The reactor cannot be restarted once stopped, so long-running callers
+    (daemon mode) must reuse this service instead of calling run_crawler() again.
+    """
+    def __init__(self, settings=None):
+        self.settings = settings or CRAWLER_SETTINGS
+        self.runner = None
+        self._thread = None
+
+    def start(self):
+        if self._thread:
+            return
+        # Install the reactor Scrapy expects before anything imports the default one
+        reactor_path = Settings(self.settings).get('TWISTED_REACTOR')
+        if reactor_path and 'twisted.internet.reactor' not in sys.modules:
+            install_reactor(reactor_path)
+        from twisted.internet import reactor
+
+        configure_logging(self.settings)
+        self.runner = CrawlerRunner(self.settings)
+        # Signal handlers can only be installed from the main thread
+        self._thread = threading.Thread(
+            target=reactor.run, kwargs={'installSignalHandlers': False},
+            name='crawler-reactor', daemon=True
+        )
+        self._thread.start()
+        print("🕸️ Crawler reactor started.")
+
+    def stream(self, urls, headers=None):
+        """
+        Starts a crawl on the shared reactor and yields article items as soon
+        as the spider produces them, so uploads can start before the crawl ends.
+        headers: optional {url: {header: value}} sent with each request.
+        Each item's `link` is the URL exactly as it was passed in `urls`.
+        """
+        if not urls:
+            print("⚠️ No URLs to crawl.")
+            return
+        self.start()
+        from twisted.internet import reactor
+
+        # Scrapy percent-encodes the URLs it requests; map them back to the caller's form
+        requested = {unquote(url): url for url in urls}
+        items = queue.Queue()
+        reactor.callFromThread(self._start_crawl, urls, items, headers)
+        while True:
+            item = items.get()
+            if item is CRAWL_DONE:
+                return
+            item['link'] = requested.get(unquote(item['link']), item['link'])
+            yield item
+
+    def crawl(self, urls):
+        """Runs one crawl and blocks until it finishes. Returns the scraped items."""
+        return list(self.stream(urls))
+
+    def _start_crawl(self, urls, items, headers=None):
+        # Runs in the reactor thread
+        crawler = self.runner.create_crawler(NewsSpider)
+        crawler.signals.connect(lambda item, **kwargs: items.put(dict(item)), signal=signals.item_scraped, weak=False)
+        d = self.runner.crawl(crawler, urls=urls, headers=headers)
+        d.addErrback(lambda failure: print(f"❌ Crawler Error: {failure.getErrorMessage()}"))
+        d.addBoth(lambda _: items.put(CRAWL_DONE))
+
+    def stop(self):
+        if not self._thread:
+            return
+        from twisted.internet import reactor, threads
+
+        threads.blockingCallFromThread(reactor, self.runner.join)
+        reactor.callFromThread(reactor.stop)
+        self._thread.join(timeout=10)
+        self._thread = None
@@ -0,0 +1,55 @@
+from scrapy.exceptions import NotConfigured
+from utils.metrics import metrics
+
+# Answers that mean "slow down" rather than "this page is broken"
+BACKOFF_CODES = {429, 500, 502, 503, 504, 522, 524}
+
+
+class ErrorAwareThrottle:
+    """
+    Downloader middleware that completes Scrapy's AutoThrottle: AutoThrottle
+    follows latency, this backs a domain off when it starts failing.
+    A BACKOFF_CODES answer or a network error multiplies the domain's delay
+    by ERROR_THROTTLE_FACTOR (at least AUTOTHROTTLE_START_DELAY, at most
+    AUTOTHROTTLE_MAX_DELAY, and never below a numeric Retry-After).
+    AutoThrottle brings the delay back down as successful pages arrive.
+    Runs before RetryMiddleware, so the retry already waits longer.
+    """
+    def __init__(self, crawler):
+        settings = crawler.settings
+        if not settings.getbool('AUTOTHROTTLE_ENABLED'):
+            raise NotConfigured
+        self.crawler = crawler
+        self.factor = settings.getfloat('ERROR_THROTTLE_FACTOR', 2.0)
+        self.start_delay = settings.getfloat('AUTOTHROTTLE_START_DELAY')
+        self.max_delay = settings.getfloat('AUTOTHROTTLE_MAX_DELAY')
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def process_response(self, request, response, spider=None):
+        if response.status in BACKOFF_CODES:
+            self._back_off(request, str(response.status), _retry_after(response))
+        return response
+
+    def process_exception(self, request, exception, spider=None):
+        self._back_off(request, type(exception).__name__)
+        return None
+
+    def _back_off(self, request, reason, retry_after=0):
+        slot = self.crawler.engine.downloader.slots.get(request.meta.get('download_slot'))
+        if slot is None:
+            return
+        delay = max(slot.delay * self.factor, self.start_delay, retry_after)
+        slot.delay = min(delay, self.max_delay)
+        metrics.inc('crawl_backoff_total', reason=reason)
+
+
+def _retry_after(response):
+    value = response.headers.get(b'Retry-After')
+    try:
+        return float(value) if value else 0
+    except ValueError:
+        # HTTP-date form: the doubled delay has to do
+        return 0
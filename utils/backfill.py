@@ -0,0 +1,255 @@
+import os
+import gzip
+import time
+import sqlite3
+import threading
+import xml.etree.ElementTree as ET
+from concurrent.futures import Future, ThreadPoolExecutor
+import requests
+from utils.image_service import ImageService
+from utils.publisher import _post_kwargs, _record_published, create_posts_batch
+from utils.registry import extract_id
+from utils.metrics import metrics
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS backfill (
+    url         TEXT PRIMARY KEY,
+    seq         INTEGER NOT NULL,
+    status      TEXT NOT NULL DEFAULT 'pending',
+    wp_id       INTEGER,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    updated_at  REAL
+);
+CREATE INDEX IF NOT EXISTS idx_backfill_status ON backfill(status, seq);
+"""
+
+
+def read_url_list(path):
+    """One article URL per line; blank lines and # comments are ignored."""
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+
+
+def read_sitemap(source, timeout=30, _seen=None):
+    """
+    Article URLs from a sitemap (URL or local file, plain or .gz).
+    Sitemap indexes are followed recursively. Order is kept as listed.
+    """
+    seen = _seen if _seen is not None else set()
+    if source in seen:
+        return []
+    seen.add(source)
+
+    if source.startswith(('http://', 'https://')):
+        response = requests.get(source, timeout=timeout)
+        response.raise_for_status()
+        data = response.content
+    else:
+        with open(source, 'rb') as f:
+            data = f.read()
+    if data[:2] == b'\x1f\x8b':
+        data = gzip.decompress(data)
+
+    root = ET.fromstring(data)
+    # Ignore the sitemaps.org namespace (and any other) when matching tags
+    locs = [el.text.strip() for el in root.iter() if el.tag.rsplit('}', 1)[-1] == 'loc' and el.text]
+    if root.tag.rsplit('}', 1)[-1] != 'sitemapindex':
+        return locs
+
+    urls = []
+    for child in locs:
+        try:
+            urls.extend(read_sitemap(child, timeout, seen))
+        except (requests.RequestException, OSError, ET.ParseError) as e:
+            print(f"⚠️ Skipping sitemap {child}: {e}")
+    return urls
+
+
+class BackfillCheckpoint:
+    """
+    Progress of a backfill, one row per URL (pending / done / duplicate / failed).
+    Kept in the registry database, so an interrupted backfill resumes where
+    it stopped; failed URLs are retried on the next run up to max_attempts.
+    """
+    def __init__(self, db_path="data/registry.db"):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Shares registry.db with the daemon and workers: wait for their write locks
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.lock = threading.RLock()
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(SCHEMA)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def add(self, urls):
+        """Queues new URLs (already known ones keep their state). Returns the number added."""
+        with self.lock, self.conn:
+            start = self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM backfill").fetchone()[0]
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO backfill (url, seq) VALUES (?, ?)",
+                ((url, start + offset) for offset, url in enumerate(urls, 1))
+            )
+            return self.conn.total_changes - before
+
+    def retry_failed(self, max_attempts):
+        with self.lock, self.conn:
+            return self.conn.execute(
+                "UPDATE backfill SET status = 'pending' WHERE status = 'failed' AND attempts < ?", (max_attempts,)
+            ).rowcount
+
+    def pending(self, limit):
+        with self.lock:
+            return [row[0] for row in self.conn.execute(
+                "SELECT url FROM backfill WHERE status = 'pending' ORDER BY seq LIMIT ?", (limit,)
+            )]
+
+    def mark(self, results):
+        """Applies several (url, status, wp_id) results in one transaction."""
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "UPDATE backfill SET status = ?, wp_id = ?, attempts = attempts + 1, updated_at = ? WHERE url = ?",
+                [(status, wp_id, now, url) for url, status, wp_id in results]
+            )
+
+    def counts(self):
+        with self.lock:
+            return dict(self.conn.execute("SELECT status, COUNT(*) FROM backfill GROUP BY status").fetchall())
+
+
+def _upload_media(wp, image_url, image_future, image_settings, media_cache):
+    """Waits for the resized image (from the ImageService) and uploads it. Returns the media ID or None."""
+    image = image_future.result()
+    if not image:
+        return None
+    content_keys = media_cache.content_keys(image) if media_cache else []
+    media_id = media_cache.get(*content_keys) if media_cache else None
+    if media_id:
+        metrics.inc('media_cache_hits_total', key='content')
+    else:
+        media_id = wp.upload_image(image)
+    if media_id and media_cache:
+        media_cache.put(media_id, media_cache.url_key(image_url, image_settings), *content_keys)
+    return media_id
+
+
+def _post_batch(wp, batch, checkpoint, mirror, category_id, status, batch_size, bucket, media_cache=None):
+    """Creates one batch of posts once their media is ready. Returns the number published."""
+    posts = []
+    for article, media in batch:
+        try:
+            feat_id = media.result() if media else None
+        except Exception as e:
+            print(f"⚠️ Media stage failed for {article['source_url']}: {e}")
+            feat_id = None
+        posts.append(_post_kwargs(article, category_id, feat_id, status))
+
+    if bucket:
+        bucket.acquire()
+    results = create_posts_batch(wp, posts, batch_size, media_cache)
+
+    published = 0
+    marks = []
+    for (article, _), post, result in zip(batch, posts, results):
+        if isinstance(result, dict) and "id" in result:
+            mirror.remember(post['meta']['article_id'], result["id"], result.get('modified'))
+            marks.append((article['link'], 'done', result["id"]))
+            _record_published(None)
+            published += 1
+        else:
+            metrics.inc('posts_failed_total')
+            print(f"❌ Failed to post: {article['source_url']} ({(result or {}).get('error')})")
+            marks.append((article['link'], 'failed', None))
+    checkpoint.mark(marks)
+    return published
+
+
+def run_backfill(wp, crawler, checkpoint, mirror, category_id, image_settings, chunk_size=500,
+                 batch_size=25, post_workers=4, image_workers=None, status='publish', bucket=None,
+                 media_cache=None, limit=None):
+    """
+    Publishes every pending checkpoint URL, chunk_size URLs at a time:
+    URLs already on WordPress (per the mirror) are skipped, the rest are
+    crawled, their images are downloaded and resized on an ImageService
+    (one process per core by default), uploaded from a thread pool, and the
+    posts go out in /batch/v1 requests of batch_size from post_workers
+    threads. Each stage starts as soon as the previous one yields, and
+    progress is checkpointed after every batch.
+    Returns (published, seconds).
+    """
+    started = time.perf_counter()
+    published = 0
+    handled = 0
+    with ImageService(image_workers) as images, \
+            ThreadPoolExecutor(max_workers=max(1, post_workers), thread_name_prefix="backfill-media") as uploads, \
+            ThreadPoolExecutor(max_workers=max(1, post_workers), thread_name_prefix="backfill-post") as posting:
+        while limit is None or handled < limit:
+            urls = checkpoint.pending(min(chunk_size, limit - handled) if limit else chunk_size)
+            if not urls:
+                break
+            handled += len(urls)
+            chunk_started = time.perf_counter()
+
+            to_crawl = []
+            duplicates = []
+            for url in urls:
+                existing_id = mirror.lookup(extract_id(url))
+                if existing_id:
+                    duplicates.append((url, 'duplicate', existing_id))
+                else:
+                    to_crawl.append(url)
+            if duplicates:
+                metrics.inc('duplicates_skipped_total', len(duplicates), kind='wordpress')
+                checkpoint.mark(duplicates)
+
+            crawled = set()
+            batches = []
+            batch = []
+            for article in crawler.stream(to_crawl):
+                crawled.add(article['link'])
+                image_url = article.get('image_url')
+                media = None
+                if image_url and image_url != 'None':
+                    media_id = media_cache.get(media_cache.url_key(image_url, image_settings)) if media_cache else None
+                    if media_id:
+                        metrics.inc('media_cache_hits_total', key='url')
+                        media = Future()
+                        media.set_result(media_id)
+                    else:
+                        image_future = images.submit(image_url, **image_settings)
+                        media = uploads.submit(_upload_media, wp, image_url, image_future, image_settings, media_cache)
+                batch.append((article, media))
+                if len(batch) >= batch_size:
+                    batches.append((batch, posting.submit(
+                        _post_batch, wp, batch, checkpoint, mirror, category_id, status, batch_size, bucket, media_cache
+                    )))
+                    batch = []
+            if batch:
+                batches.append((batch, posting.submit(
+                    _post_batch, wp, batch, checkpoint, mirror, category_id, status, batch_size, bucket, media_cache
+                )))
+
+            chunk_published = 0
+            for batch, future in batches:
+                try:
+                    chunk_published += future.result()
+                except Exception as e:
+                    print(f"❌ Backfill batch failed: {e}")
+                    checkpoint.mark([(article['link'], 'failed', None) for article, _ in batch])
+            # Pages that failed or had no article text
+            checkpoint.mark([(url, 'failed', None) for url in to_crawl if url not in crawled])
+
+            published += chunk_published
+            chunk_seconds = time.perf_counter() - chunk_started
+            total_seconds = time.perf_counter() - started
+            print(f"📊 Chunk: {chunk_published}/{len(urls)} published in {chunk_seconds:.1f}s "
+                  f"({chunk_published / chunk_seconds:.1f} articles/s). "
+                  f"Total: {published} in {total_seconds:.0f}s ({published / total_seconds:.1f} articles/s)")
+
+    return published, time.perf_counter() - started
@@ -0,0 +1,199 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from utils.readrss import clean_persian
+from utils.metrics import metrics
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS simhashes (
+    id        INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind      TEXT NOT NULL,
+    hash      INTEGER NOT NULL,
+    ref       TEXT NOT NULL,
+    added_at  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS simhash_bands (
+    kind      TEXT NOT NULL,
+    band      INTEGER NOT NULL,
+    value     INTEGER NOT NULL,
+    sig_id    INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_simhash_bands ON simhash_bands(kind, band, value);
+CREATE INDEX IF NOT EXISTS idx_simhashes_ref ON simhashes(kind, ref);
+CREATE INDEX IF NOT EXISTS idx_simhash_bands_sig ON simhash_bands(sig_id);
+CREATE INDEX IF NOT EXISTS idx_simhashes_added ON simhashes(added_at);
+"""
+
+# Arabic diacritics (harakat, tanwin, superscript alef) and tatweel
+_DIACRITICS = re.compile('[ً-ٰٟـ]')
+_NON_WORD = re.compile(r'[^\w]+')
+# Persian and Arabic-Indic digits -> ASCII
+_DIGITS = str.maketrans('۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩',
+                        '01234567890123456789')
+
+
+def normalize_text(text):
+    """Persian-aware normalization used before hashing titles and bodies."""
+    text = clean_persian(text or '')
+    # ZWNJ -> space, and fold Arabic letter variants onto the Persian ones
+    text = text.replace('\u200c', ' ').replace('ة', 'ه').replace('أ', 'ا').replace('إ', 'ا').replace('آ', 'ا')
+    text = _DIACRITICS.sub('', text).translate(_DIGITS)
+    return _NON_WORD.sub(' ', text).strip().lower()
+
+
+def _shingles(text, kind):
+    if kind == 'title':
+        # Character 3-grams survive small wording and spelling changes in short titles
+        compact = text.replace(' ', '_')
+        return [compact[i:i + 3] for i in range(max(1, len(compact) - 2))]
+    words = text.split()
+    return [' '.join(words[i:i + 2]) for i in range(max(1, len(words) - 1))]
+
+
+def simhash(text, kind='title'):
+    """64-bit SimHash of the normalized text."""
+    normalized = normalize_text(text)
+    if not normalized:
+        return None
+    weights = [0] * 64
+    for shingle in _shingles(normalized, kind):
+        value = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+def _to_signed(value):
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+class NearDuplicateIndex:
+    """
+    Persistent SimHash index over normalized titles and article bodies.
+
+    Lookups use banding: the 64-bit hash is split into (max_distance + 1)
+    bands, so any hash within max_distance bits shares at least one band
+    with the query (pigeonhole). Only rows sharing a band are compared,
+    which keeps lookups sublinear in the number of indexed stories.
+    Entries older than max_age seconds (0 = never) are ignored and pruned,
+    so a recurring headline is only matched against recent stories.
+    """
+    def __init__(self, db_path="data/registry.db", title_distance=3, body_distance=3, max_age=72 * 3600):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.distances = {'title': title_distance, 'body': body_distance}
+        self.max_age = max_age
+        self._writes = 0
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.lock = threading.RLock()
+        with self.lock, self.conn:
+            self.conn.executescript(SCHEMA)
+        self.prune()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def prune(self):
+        """Deletes entries older than max_age. Returns the number removed."""
+        if not self.max_age:
+            return 0
+        cutoff = time.time() - self.max_age
+        with self.lock, self.conn:
+            self.conn.execute(
+                "DELETE FROM simhash_bands WHERE sig_id IN (SELECT id FROM simhashes WHERE added_at < ?)", (cutoff,)
+            )
+            return self.conn.execute("DELETE FROM simhashes WHERE added_at < ?", (cutoff,)).rowcount
+
+    def _bands(self, value, kind):
+        count = self.distances[kind] + 1
+        width = 64 // count
+        mask = (1 << width) - 1
+        # The last band takes any leftover bits
+        bands = [(value >> (i * width)) & mask for i in range(count - 1)]
+        bands.append(value >> ((count - 1) * width))
+        return [_to_signed(band) for band in bands]
+
+    def find(self, text, kind='title', exclude_ref=None):
+        """Returns the ref (article link) of a near-duplicate, or None."""
+        value = simhash(text, kind)
+        if value is None:
+            return None
+        limit = self.distances[kind]
+        bands = self._bands(value, kind)
+        clauses = " OR ".join("(b.band = ? AND b.value = ?)" for _ in bands)
+        params = [kind]
+        for band, band_value in enumerate(bands):
+            params += [band, band_value]
+        params.append(time.time() - self.max_age if self.max_age else 0)
+
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT DISTINCT s.hash, s.ref FROM simhash_bands b JOIN simhashes s ON s.id = b.sig_id "
+                f"WHERE b.kind = ? AND ({clauses}) AND s.added_at >= ?", params
+            ).fetchall()
+        for stored, ref in rows:
+            if ref != exclude_ref and bin(_to_unsigned(stored) ^ value).count('1') <= limit:
+                return ref
+        return None
+
+    def add(self, text, ref, kind='title'):
+        value = simhash(text, kind)
+        if value is None:
+            return
+        with self.lock, self.conn:
+            exists = self.conn.execute(
+                "SELECT 1 FROM simhashes WHERE kind = ? AND ref = ?", (kind, ref)
+            ).fetchone()
+            if exists:
+                return
+            cursor = self.conn.execute(
+                "INSERT INTO simhashes (kind, hash, ref, added_at) VALUES (?, ?, ?, ?)",
+                (kind, _to_signed(value), ref, time.time())
+            )
+            self.conn.executemany(
+                "INSERT INTO simhash_bands (kind, band, value, sig_id) VALUES (?, ?, ?, ?)",
+                [(kind, band, band_value, cursor.lastrowid) for band, band_value in enumerate(self._bands(value, kind))]
+            )
+            self._writes += 1
+        if self._writes % 100 == 0:
+            self.prune()
+
+    def check_and_add(self, text, ref, kind='title'):
+        """Returns the matching ref if `text` is a near-duplicate; otherwise indexes it and returns None."""
+        with self.lock:
+            match = self.find(text, kind, exclude_ref=ref)
+            if not match:
+                self.add(text, ref, kind)
+            return match
+
+
+def drop_near_duplicate_bodies(articles, dedup, registry, spool=None):
+    """
+    Passes scraped articles through, dropping those whose body is a
+    near-duplicate of an earlier story, before any image or WordPress work.
+    Dropped items are taken out of the registry's pending queue.
+    """
+    for article in articles:
+        link = article.get('link') or article.get('source_url')
+        match = dedup.check_and_add(article.get('content'), link, 'body')
+        if not match:
+            yield article
+            continue
+
+        metrics.inc('duplicates_skipped_total', kind='body')
+        print(f"🧬 Near-duplicate body skipped: {article.get('title', '')[:60]} (same story as {match})")
+        item = registry.find_by_url(link)
+        if item:
+            registry.mark_skipped(item['id'])
+        if spool:
+            spool.mark_done(link)
@@ -0,0 +1,157 @@
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+import requests
+from requests.adapters import HTTPAdapter
+from utils.metrics import metrics
+
+# Methods that can be sent again without side effects
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+# Worth retrying: throttled, or the server/proxy is temporarily unavailable
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Statuses that prove a POST was rejected before anything was created
+SAFE_POST_RETRY_STATUSES = {429}
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised instead of sending a request while the circuit breaker is open."""
+    pass
+
+
+class CircuitBreaker:
+    """
+    Stops calling a host after `failure_threshold` consecutive failures.
+    After `reset_timeout` seconds one trial request is let through
+    (half-open): success closes the circuit, failure opens it again.
+    """
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout or self._trial:
+                return False
+            # Half-open: let exactly one request probe the host
+            self._trial = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self._trial or (self.opened_at is None and self.failures >= self.failure_threshold):
+                print(f"🔌 Circuit breaker open: pausing requests for {self.reset_timeout}s.")
+                metrics.inc('circuit_breaker_open_total')
+                self.opened_at = time.monotonic()
+                self._trial = False
+
+
+def retry_after_seconds(response):
+    """Parses a Retry-After header (seconds or HTTP date). Returns None if absent or invalid."""
+    value = response.headers.get('Retry-After') if response is not None else None
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class ResilientSession(requests.Session):
+    """
+    requests.Session with a sized keep-alive pool, a default timeout on every
+    call, retries with jittered exponential backoff (honoring Retry-After)
+    and a circuit breaker.
+
+    Only idempotent requests are retried after a timeout or a 5xx. A POST is
+    retried only when it provably never reached the application (connect
+    failure) or was explicitly throttled (429), so a slow 5xx can never turn
+    into a duplicate post.
+    """
+    def __init__(self, pool_size=10, timeout=15, max_retries=3, backoff=0.5, max_backoff=30,
+                 breaker=None):
+        super().__init__()
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = breaker or CircuitBreaker()
+        # urllib3 retries are off: retrying is decided here, per method
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+
+    def _delay(self, attempt, response=None):
+        # Full jitter: spreads retries from parallel workers apart
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        retry_after = retry_after_seconds(response)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return min(delay, self.max_backoff)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"Circuit open, not sending {method} {url}")
+
+            response = None
+            try:
+                response = super().request(method, url, **kwargs)
+            except requests.ConnectionError as e:
+                # A connect failure means nothing was sent; anything else may have reached the server
+                retryable = idempotent or isinstance(e, requests.ConnectTimeout) or _never_sent(e)
+                error = e
+            except requests.Timeout as e:
+                retryable = idempotent
+                error = e
+            else:
+                error = None
+                if response.status_code not in RETRY_STATUSES:
+                    self.breaker.record_success()
+                    return response
+                retryable = idempotent or response.status_code in SAFE_POST_RETRY_STATUSES
+
+            # 429 is the server pacing us, not the server failing
+            if response is not None and response.status_code == 429:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+
+            if not retryable or attempt >= self.max_retries:
+                if error is not None:
+                    raise error
+                return response
+
+            delay = self._delay(attempt, response)
+            reason = type(error).__name__ if error is not None else f"HTTP {response.status_code}"
+            metrics.inc('http_retries_total', reason=reason)
+            print(f"🔁 {method} {url} failed ({reason}); retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+            if response is not None:
+                response.close()
+            time.sleep(delay)
+            attempt += 1
+
+
+def _never_sent(error):
+    # urllib3 wraps "connection refused"/DNS failures in NewConnectionError
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return type(reason).__name__ in ('NewConnectionError', 'NameResolutionError')
@@ -1,26 +1,164 @@
 import requests
-from PIL import Image
+from PIL import Image, ImageOps
 from io import BytesIO
+from collections import namedtuple
 import os
+import hashlib
+from utils.metrics import metrics
 
-def download_and_resize_image(url, width, height, output_path="data/temp_image.jpg"):
-    try:
-        response = requests.get(url, timeout=10)
+# Encoded output ready to POST to /wp/v2/media, plus hashes for the media cache.
+# `variants` holds ((size name, EncodedImage), ...) rendered from the same decode.
+EncodedImage = namedtuple('EncodedImage', 'data content_type filename width height sha256 dhash variants', defaults=((),))
+
+FIT_MODES = ('stretch', 'fit', 'crop')
+# Pillow format name, MIME type and file extension per output format
+FORMATS = {
+    'jpeg': ('JPEG', 'image/jpeg', 'jpg'),
+    'webp': ('WEBP', 'image/webp', 'webp'),
+}
+DEFAULT_MAX_BYTES = 15 * 1024 * 1024
+
+
+class ImageTooLarge(Exception):
+    pass
+
+
+def fetch_image_bytes(url, max_bytes=DEFAULT_MAX_BYTES, timeout=10):
+    """
+    Streams the image download in chunks and aborts as soon as it exceeds
+    max_bytes, so a huge or endless response never lands in memory.
+    """
+    with requests.get(url, timeout=timeout, stream=True) as response:
         response.raise_for_status()
-        
-        # Open image from bytes
-        img = Image.open(BytesIO(response.content))
-        
-        # Convert to RGB if necessary (e.g., converting PNG/WebP to JPEG)
-        if img.mode in ("RGBA", "P"):
-            img = img.convert("RGB")
-        
-        # Resize using Lanczos filter for high quality
-        resized_img = img.resize((width, height), Image.Resampling.LANCZOS)
-        
-        # Save locally
-        resized_img.save(output_path, "JPEG", quality=85)
-        return output_path
+
+        declared = response.headers.get('Content-Length')
+        if declared and declared.isdigit() and int(declared) > max_bytes:
+            raise ImageTooLarge(f"{declared} bytes > limit of {max_bytes}")
+
+        buffer = BytesIO()
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            buffer.write(chunk)
+            if buffer.tell() > max_bytes:
+                raise ImageTooLarge(f"more than {max_bytes} bytes")
+        return buffer.getvalue()
+
+
+def _target_box(src_size, width, height, mode):
+    """Returns (output size, source crop box) for the requested fit mode."""
+    src_w, src_h = src_size
+    if mode == 'fit':
+        # Whole image visible, may be smaller than width x height on one side
+        scale = min(width / src_w, height / src_h)
+        return (max(1, round(src_w * scale)), max(1, round(src_h * scale))), None
+    if mode == 'crop':
+        # Fill width x height exactly, trimming the overflowing side around the center
+        scale = max(width / src_w, height / src_h)
+        box_w, box_h = width / scale, height / scale
+        left, top = (src_w - box_w) / 2, (src_h - box_h) / 2
+        return (width, height), (left, top, left + box_w, top + box_h)
+    # 'stretch': the original behavior, ignores the aspect ratio
+    return (width, height), None
+
+
+def dhash(img, hash_size=8):
+    """
+    64-bit difference hash: stays the same when the same picture is re-encoded
+    or slightly recompressed, so reused lead photos match across URLs.
+    """
+    small = img.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+    pixels = list(small.getdata())
+    bits = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return f"{bits:016x}"
+
+
+def _render(img, width, height, mode, output_format, quality, with_dhash=True):
+    """Resizes an already decoded RGB image and encodes it as one EncodedImage."""
+    if mode not in FIT_MODES:
+        mode = 'stretch'
+    pil_format, content_type, extension = FORMATS.get(output_format, FORMATS['jpeg'])
+    size, box = _target_box(img.size, width, height, mode)
+    # Resize using Lanczos filter for high quality; reducing_gap shrinks big sources cheaply first
+    resized_img = img.resize(size, Image.Resampling.LANCZOS, box=box, reducing_gap=3.0)
+
+    output = BytesIO()
+    resized_img.save(output, pil_format, quality=quality)
+    data = output.getvalue()
+    return EncodedImage(
+        data, content_type, f'featured.{extension}', size[0], size[1],
+        hashlib.sha256(data).hexdigest(), dhash(resized_img) if with_dhash else None
+    )
+
+
+def encode_image(data, width, height, mode='stretch', quality=85, variants=(), variant_format='webp'):
+    """
+    Decodes, resizes and JPEG-encodes an image held in memory.
+    JPEG sources much larger than the target are decoded at a reduced scale
+    (draft mode), which cuts decode time and memory for 4K photos.
+
+    variants: ((size name, width, height, mode), ...) extra sizes rendered
+    from the same decode in `variant_format` (e.g. WebP next to the JPEG).
+    """
+    img = Image.open(BytesIO(data))
+    # Only JPEG supports draft; it picks the smallest 1/2, 1/4, 1/8 scale still >= every requested size
+    img.draft('RGB', (max([width] + [v[1] for v in variants]), max([height] + [v[2] for v in variants])))
+    img = ImageOps.exif_transpose(img)
+
+    # Convert to RGB if necessary (e.g., converting PNG/WebP to JPEG)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+
+    image = _render(img, width, height, mode, 'jpeg', quality)
+    if variants:
+        image = image._replace(variants=tuple(
+            (name, _render(img, v_width, v_height, v_mode, variant_format, quality, with_dhash=False))
+            for name, v_width, v_height, v_mode in variants
+        ))
+    return image
+
+
+def image_filename(url, extension="jpg"):
+    """Upload filename derived from the source URL."""
+    name = os.path.splitext(url.split("/")[-1].split("?")[0])[0] or "featured"
+    return f"{name}.{extension}"
+
+
+def name_image(image, url):
+    """Sets upload filenames from the source URL (variants get WordPress-style -WxH suffixes)."""
+    base = os.path.splitext(image_filename(url))[0]
+    return image._replace(
+        filename=image_filename(url, image.filename.rsplit('.', 1)[-1]),
+        variants=tuple(
+            (name, variant._replace(filename=f"{base}-{variant.width}x{variant.height}.{variant.filename.rsplit('.', 1)[-1]}"))
+            for name, variant in image.variants
+        )
+    )
+
+
+def fetch_and_encode_image(url, width, height, mode='stretch', max_bytes=DEFAULT_MAX_BYTES, quality=85,
+                           variants=(), variant_format='webp'):
+    """Download + resize entirely in memory. Returns an EncodedImage or None."""
+    try:
+        with metrics.timed('image_download'):
+            data = fetch_image_bytes(url, max_bytes)
+        with metrics.timed('image_resize'):
+            image = encode_image(data, width, height, mode, quality, variants, variant_format)
+        return name_image(image, url)
     except Exception as e:
+        metrics.inc('images_failed_total')
         print(f"⚠️ Image processing error: {e}")
-        return None
\ No newline at end of file
+        return None
+
+
+def download_and_resize_image(url, width, height, output_path="data/temp_image.jpg"):
+    """Legacy helper: same as fetch_and_encode_image, but saves the JPEG to output_path."""
+    image = fetch_and_encode_image(url, width, height)
+    if not image:
+        return None
+    with open(output_path, "wb") as f:
+        f.write(image.data)
+    return output_path
@@ -0,0 +1,87 @@
+import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from utils.image_processor import fetch_image_bytes, encode_image, name_image, DEFAULT_MAX_BYTES
+from utils.metrics import metrics
+
+
+def process_image(url, width, height, mode='stretch', max_bytes=DEFAULT_MAX_BYTES, quality=85,
+                  variants=(), variant_format='webp'):
+    """
+    Worker-process job: download + decode + resize + encode one image
+    (and its variants).
+    Returns (EncodedImage or None, {stage: seconds}, error message or None);
+    timings travel back because metrics recorded in a worker would be lost.
+    """
+    timings = {}
+    try:
+        start = time.perf_counter()
+        data = fetch_image_bytes(url, max_bytes)
+        timings['image_download'] = time.perf_counter() - start
+        start = time.perf_counter()
+        image = encode_image(data, width, height, mode, quality, variants, variant_format)
+        timings['image_resize'] = time.perf_counter() - start
+        return name_image(image, url), timings, None
+    except Exception as e:
+        return None, timings, str(e)
+
+
+class ImageService:
+    """
+    Image processing on a pool of worker processes, so Pillow decode,
+    LANCZOS resize and JPEG encode use every core instead of competing with
+    network I/O for one interpreter. Results come back as in-memory
+    EncodedImage objects (no shared temp files).
+
+    At most `max_pending` jobs are queued or running; submit() blocks past
+    that, which pushes back on whatever stage produces image URLs.
+    Workers are spawned (not forked) because the crawler reactor and upload
+    threads are already running, and started lazily on the first job.
+    """
+    def __init__(self, workers=None, max_pending=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 4
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def submit(self, url, **image_settings):
+        """Queues one image. Returns a Future resolving to an EncodedImage or None."""
+        self._slots.acquire()
+        try:
+            job = self._pool.submit(process_image, url, **image_settings)
+        except Exception:
+            self._slots.release()
+            raise
+        result = Future()
+
+        def done(job):
+            self._slots.release()
+            try:
+                image, timings, error = job.result()
+            except Exception as e:
+                # The worker died (e.g. killed by the OS) or the pool is shutting down
+                image, timings, error = None, {}, f"worker failed: {e}"
+            for stage, seconds in timings.items():
+                metrics.observe('pipeline_stage_seconds', seconds, stage=stage)
+            if error:
+                metrics.inc('images_failed_total')
+                print(f"⚠️ Image processing error: {error}")
+            result.set_result(image)
+
+        job.add_done_callback(done)
+        return result
+
+    def fetch_and_encode(self, url, **image_settings):
+        """Blocking counterpart of image_processor.fetch_and_encode_image, run in the pool."""
+        return self.submit(url, **image_settings).result()
+
+    def close(self):
+        self._pool.shutdown(wait=True, cancel_futures=True)
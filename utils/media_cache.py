@@ -0,0 +1,136 @@
+import os
+import time
+import sqlite3
+import contextlib
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS media_cache (
+    key        TEXT PRIMARY KEY,
+    media_id   INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_media_cache_last_used ON media_cache(last_used);
+CREATE INDEX IF NOT EXISTS idx_media_cache_media_id ON media_cache(media_id);
+"""
+
+
+def settings_key(image_settings):
+    """The same source URL resized differently is a different upload."""
+    key = f"{image_settings.get('width')}x{image_settings.get('height')}:{image_settings.get('mode', 'stretch')}"
+    if image_settings.get('variants'):
+        # Uploads with sideloaded sizes differ from ones WordPress resized itself
+        key += ":" + ",".join(f"{name}={w}x{h}" for name, w, h, _ in image_settings['variants'])
+        key += ":" + image_settings.get('variant_format', 'webp')
+    return key
+
+
+class MediaCache:
+    """
+    Persistent map from image identity to an existing WordPress media ID.
+
+    Two kinds of keys point at the same upload:
+    - url:<settings>:<source url>  -> skips download, resize and upload
+    - sha:<sha256> / dhash:<hash>  -> same pixels from a different URL, skips the upload
+    Entries are evicted by age (last use) and by total count (least recently used first).
+    Media IDs only exist on one WordPress site, so each target uses its own
+    `namespace` (a key prefix) in the shared database.
+    """
+    def __init__(self, db_path="data/media_cache.db", max_entries=5000, max_age_days=90, namespace=None):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 86400 if max_age_days else None
+        self.prefix = f"{namespace}|" if namespace else ""
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.lock = threading.RLock()
+        self._inflight = {}
+        self._writes = 0
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(SCHEMA)
+        self.evict()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def url_key(self, url, image_settings):
+        return f"{self.prefix}url:{settings_key(image_settings)}:{url}"
+
+    def content_keys(self, image):
+        keys = [f"{self.prefix}sha:{image.sha256}"]
+        # Flat images (blank placeholders) all hash the same; only trust byte equality for them
+        if image.dhash and image.dhash not in ('0' * 16, 'f' * 16):
+            keys.append(f"{self.prefix}dhash:{image.dhash}")
+        return keys
+
+    def get(self, *keys):
+        """Returns the media ID of the first key found (and refreshes its last use)."""
+        now = time.time()
+        with self.lock, self.conn:
+            for key in keys:
+                row = self.conn.execute("SELECT media_id FROM media_cache WHERE key = ?", (key,)).fetchone()
+                if row:
+                    self.conn.execute("UPDATE media_cache SET last_used = ? WHERE key = ?", (now, key))
+                    return row[0]
+        return None
+
+    def put(self, media_id, *keys):
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO media_cache (key, media_id, created_at, last_used) VALUES (?, ?, ?, ?)",
+                [(key, media_id, now, now) for key in keys]
+            )
+            self._writes += 1
+        if self._writes % 100 == 0:
+            self.evict()
+
+    def _scope(self):
+        """SQL condition (and its params) limiting a statement to this cache's namespace."""
+        if self.prefix:
+            return "substr(key, 1, ?) = ?", (len(self.prefix), self.prefix)
+        # Keys without a namespace start with their kind; namespaced ones with "<name>|"
+        return "substr(key, 1, instr(key, ':')) IN ('url:', 'sha:', 'dhash:')", ()
+
+    def forget_media(self, media_id):
+        """Drops every key pointing at a media item that no longer exists on WordPress."""
+        scope, params = self._scope()
+        with self.lock, self.conn:
+            self.conn.execute(f"DELETE FROM media_cache WHERE media_id = ? AND {scope}", (media_id,) + params)
+
+    def evict(self):
+        # Limits apply per namespace
+        scope, params = self._scope()
+        with self.lock, self.conn:
+            if self.max_age:
+                self.conn.execute(
+                    f"DELETE FROM media_cache WHERE last_used < ? AND {scope}", (time.time() - self.max_age,) + params
+                )
+            if self.max_entries:
+                self.conn.execute(
+                    f"DELETE FROM media_cache WHERE {scope} AND key NOT IN "
+                    f"(SELECT key FROM media_cache WHERE {scope} ORDER BY last_used DESC LIMIT ?)",
+                    params + params + (self.max_entries,)
+                )
+
+    @contextlib.contextmanager
+    def key_lock(self, key):
+        """
+        Per-key lock so two workers don't upload the same image at the same time.
+        Locks are reference-counted: one is dropped only when no thread holds or waits for it.
+        """
+        with self.lock:
+            entry = self._inflight.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self.lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._inflight[key]
@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Histogram upper bounds in seconds
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LATENCY_BUCKETS = (30, 60, 120, 300, 600, 900, 1800, 3600, 7200, 21600, 86400)
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        k + '="' + str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for k, v in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class Metrics:
+    """
+    In-process counters and histograms, safe to use from any thread.
+    Totals live for the whole process (exported in Prometheus text format);
+    raw samples of the current cycle are kept for the per-cycle JSON report.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.buckets = {}
+        self.start_cycle()
+
+    def start_cycle(self):
+        with self.lock:
+            self.cycle_started = time.time()
+            self.cycle_counters = {}
+            self.cycle_samples = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+            self.cycle_counters[key] = self.cycle_counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=STAGE_BUCKETS, **labels):
+        if value is None:
+            return
+        key = (name, _label_key(labels))
+        with self.lock:
+            bounds = self.buckets.setdefault(name, buckets)
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = {'buckets': [0] * len(bounds), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(bounds):
+                if value <= bound:
+                    hist['buckets'][i] += 1
+            hist['sum'] += value
+            hist['count'] += 1
+            self.cycle_samples.setdefault(key, []).append(value)
+
+    @contextmanager
+    def timed(self, stage):
+        """Records the duration of the block in pipeline_stage_seconds{stage=...}."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('pipeline_stage_seconds', time.perf_counter() - start, stage=stage)
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((key, dict(hist, buckets=list(hist['buckets']))) for key, hist in self.histograms.items())
+            bounds = dict(self.buckets)
+
+        lines = []
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        for (name, labels), hist in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            for bound, n in zip(bounds[name], hist['buckets']):
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {n}")
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {hist['count']}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {hist['sum']}")
+            lines.append(f"{name}_count{_format_labels(labels)} {hist['count']}")
+        return "\n".join(lines) + "\n"
+
+    def cycle_report(self):
+        """Counters and latency percentiles of the current cycle, as a JSON-friendly dict."""
+        with self.lock:
+            counters = dict(self.cycle_counters)
+            samples = {key: list(values) for key, values in self.cycle_samples.items()}
+            started = self.cycle_started
+
+        def label(name, labels):
+            return name + _format_labels(labels)
+
+        return {
+            'started_at': started,
+            'duration': round(time.time() - started, 3),
+            'counters': {label(*key): value for key, value in sorted(counters.items())},
+            'histograms': {
+                label(*key): {
+                    'count': len(values),
+                    'sum': round(sum(values), 4),
+                    'p50': round(_percentile(values, 50), 4),
+                    'p95': round(_percentile(values, 95), 4),
+                    'max': round(max(values), 4),
+                }
+                for key, values in sorted(samples.items())
+            },
+        }
+
+    def dump_cycle(self, directory):
+        """Writes the current cycle's report to <directory>/cycle-<timestamp>.json."""
+        os.makedirs(directory, exist_ok=True)
+        report = self.cycle_report()
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(report['started_at']))
+        path = os.path.join(directory, f"cycle-{stamp}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        return path
+
+    def serve(self, port, host='127.0.0.1'):
+        """Serves /metrics from a background thread. Returns the server (call shutdown() to stop)."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+        print(f"📈 Metrics on http://{host}:{server.server_address[1]}/metrics")
+        return server
+
+
+# Process-wide instance used by every stage
+metrics = Metrics()
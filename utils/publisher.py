@@ -0,0 +1,512 @@
+import time
+import queue
+import asyncio
+import threading
+from collections import deque
+from urllib.parse import unquote
+from concurrent.futures import ThreadPoolExecutor
+from utils.image_processor import fetch_and_encode_image
+from utils.registry import extract_id
+from utils.metrics import metrics, LATENCY_BUCKETS
+
+
+def encode(img_url, image_settings, images=None):
+    """Download + resize, on the ImageService process pool when one is given."""
+    if images:
+        return images.fetch_and_encode(img_url, **image_settings)
+    return fetch_and_encode_image(img_url, **image_settings)
+
+
+def _cached_by_url(media_cache, url_key, img_url):
+    """Media ID already uploaded for this image URL (and settings), or None."""
+    media_id = media_cache.get(url_key)
+    if media_id:
+        metrics.inc('media_cache_hits_total', key='url')
+        print(f"♻️ Reusing media {media_id} for {img_url}")
+    return media_id
+
+
+def _cached_by_content(media_cache, url_key, image):
+    """
+    Looks a freshly encoded image up by its pixels. A hit is also stored
+    under url_key. Returns (media ID or None, content keys for the upload).
+    """
+    content_keys = media_cache.content_keys(image)
+    media_id = media_cache.get(*content_keys)
+    if media_id:
+        metrics.inc('media_cache_hits_total', key='content')
+        print(f"♻️ Same image already uploaded as media {media_id}")
+        media_cache.put(media_id, url_key)
+    return media_id, content_keys
+
+
+def prepare_media(wp, img_url, image_settings, media_cache=None, images=None):
+    """
+    Stage 1: download + resize + upload the featured image, all in memory.
+    image_settings: {width, height, mode, max_bytes, quality}.
+    With a MediaCache, images already on WordPress (same URL, or same
+    pixels under another URL) are reused instead of uploaded again.
+    Returns the WordPress media ID or None.
+    """
+    if not img_url or img_url == 'None':
+        return None
+
+    if not media_cache:
+        image = encode(img_url, image_settings, images)
+        return wp.upload_image(image) if image else None
+
+    url_key = media_cache.url_key(img_url, image_settings)
+    with media_cache.key_lock(url_key):
+        media_id = _cached_by_url(media_cache, url_key, img_url)
+        if media_id:
+            return media_id
+
+        image = encode(img_url, image_settings, images)
+        if not image:
+            return None
+        media_id, content_keys = _cached_by_content(media_cache, url_key, image)
+        if media_id:
+            return media_id
+
+        media_id = wp.upload_image(image)
+        if media_id:
+            media_cache.put(media_id, url_key, *content_keys)
+        return media_id
+
+
+def _media_gone(result, post, media_cache=None, label=''):
+    """
+    True if WordPress rejected `post` because its featured image no longer
+    exists (e.g. cached media deleted on the site). The media is dropped
+    from the cache and from `post`, so the caller can send it again.
+    """
+    feat_id = post.get('featured_image_id')
+    if not feat_id or not isinstance(result, dict) or result.get('code') != 'rest_invalid_featured_media':
+        return False
+    print(f"⚠️ {label}Media {feat_id} no longer exists. Posting without it.")
+    if media_cache:
+        media_cache.forget_media(feat_id)
+    post['featured_image_id'] = None
+    return True
+
+
+def create_post(wp, post, media_cache=None, label=''):
+    """wp.create_post(**post), sent again without the image if its featured media is gone."""
+    result = wp.create_post(**post)
+    if _media_gone(result, post, media_cache, label):
+        result = wp.create_post(**post)
+    return result
+
+
+def create_posts_batch(wp, posts, batch_size=25, media_cache=None):
+    """wp.create_posts_batch, resending the posts whose featured media is gone without it."""
+    results = wp.create_posts_batch(posts, batch_size=batch_size)
+    retry = [index for index, (post, result) in enumerate(zip(posts, results)) if _media_gone(result, post, media_cache)]
+    if retry:
+        for index, result in zip(retry, wp.create_posts_batch([posts[index] for index in retry], batch_size=batch_size)):
+            results[index] = result
+    return results
+
+
+def _post_kwargs(article, category_id, feat_id, status='publish'):
+    source_id = extract_id(unquote(article['source_url'].strip())) # Get ID from scraped URL
+    return {
+        'title': article['title'],
+        'content': article['content'],
+        'status': status,
+        'categories': [category_id] if category_id else [],
+        'featured_image_id': feat_id,
+        'meta': {'article_id': source_id},
+    }
+
+
+def _record_published(item):
+    """Counts a published post and its feed-publish -> live-on-WordPress latency."""
+    metrics.inc('posts_published_total')
+    if item:
+        # Entries without a feed date fall back to when we first saw them
+        since = item.get('published_at') or item.get('added_at')
+        if since:
+            metrics.observe('article_publish_latency_seconds', time.time() - since, buckets=LATENCY_BUCKETS)
+
+
+def _stage_media(articles, pool, staged, wp, image_settings, media_cache, images):
+    """Feeder thread: pulls articles (possibly from a live crawl) and starts their media jobs."""
+    try:
+        for article in articles:
+            if article.get('image_url') and article['image_url'] != 'None':
+                print(f"🖼️  Processing image for: {article['title'][:40]}...")
+            # Blocks when the post stage falls behind (bounded lookahead)
+            staged.put((article, pool.submit(prepare_media, wp, article.get('image_url'), image_settings, media_cache, images)))
+    except Exception as e:
+        print(f"❌ Article stream failed: {e}")
+    finally:
+        staged.put(None)
+
+
+def publish_articles(articles, wp, registry, mirror, category_id, image_settings, bucket,
+                     media_workers=2, spool=None, media_cache=None, images=None):
+    """
+    Staged upload pipeline. Image fetch/resize and media upload for upcoming
+    articles run on a small thread pool while the current post is created;
+    post creation is paced by a TokenBucket instead of a fixed sleep.
+
+    articles: iterable of {link, source_url, image_url, title, content} dicts.
+    It may be a live crawl stream; posting starts with the first article.
+    With an ImageService, resizing runs in its worker processes.
+    Returns the number of published posts.
+    """
+    published = 0
+    # Only keep a few images in flight ahead of the post stage
+    staged = queue.Queue(maxsize=max(1, media_workers) * 2)
+
+    with ThreadPoolExecutor(max_workers=max(1, media_workers), thread_name_prefix="media") as pool:
+        feeder = threading.Thread(
+            target=_stage_media, args=(articles, pool, staged, wp, image_settings, media_cache, images),
+            name="media-feeder", daemon=True
+        )
+        feeder.start()
+
+        while True:
+            entry = staged.get()
+            if entry is None:
+                break
+            article, future = entry
+            source_url = article['source_url']
+            post_title = article['title']
+
+            try:
+                feat_id = future.result()
+            except Exception as e:
+                print(f"⚠️ Media stage failed for {source_url}: {e}")
+                feat_id = None
+
+            # --- Create WordPress Post ---
+            post = _post_kwargs(article, category_id, feat_id)
+            source_id = post['meta']['article_id']
+            waited = bucket.acquire()
+            if waited >= 1:
+                print(f"⏳ Rate limit: waited {waited:.0f}s before posting.")
+            print(f"📤 Posting to WordPress: {post_title[:40]}...")
+            result = create_post(wp, post, media_cache)
+
+            # --- Capture WP_ID and Update Registry (STRICT MATCH) ---
+            if isinstance(result, dict) and "id" in result:
+                new_id = result["id"]
+                print(f"source_id : {source_id}")
+                mirror.remember(source_id, new_id, result.get('modified'))
+
+                # Match the crawled URL back to its registry row
+                item = registry.find_by_url(article.get('link') or source_url)
+                published += 1
+                _record_published(item)
+                if item:
+                    registry.mark_uploaded(item['id'], new_id)
+                    print(f"✅ Success! (WP ID: {new_id}) - Match by ID: {source_id}")
+                else:
+                    print(f"⚠️ Posted, but ID {source_id} not found in registry.")
+            else:
+                metrics.inc('posts_failed_total')
+                print(f"❌ Failed to post: {source_url}")
+
+            # Failed posts stay pending in the registry and are re-crawled next cycle
+            if spool:
+                spool.mark_done(article.get('link') or source_url)
+
+        feeder.join()
+
+    return published
+
+
+def publish_articles_batch(articles, wp, registry, mirror, category_id, image_settings, bucket,
+                           media_workers=2, batch_size=25, status='publish', spool=None, media_cache=None,
+                           images=None):
+    """
+    High-volume variant of publish_articles for backfills and bursts.
+    All featured images are prepared first, then posts go out through
+    WordPressAuth.create_posts_batch (one /batch/v1 request per batch_size
+    posts) and each batch's registry updates are written in one transaction.
+    The token bucket paces batch requests, not individual posts.
+    """
+    articles = list(articles)
+    with ThreadPoolExecutor(max_workers=max(1, media_workers), thread_name_prefix="media") as pool:
+        media_ids = list(pool.map(
+            lambda article: prepare_media(wp, article.get('image_url'), image_settings, media_cache, images), articles
+        ))
+
+    published = 0
+    for start in range(0, len(articles), batch_size):
+        chunk = articles[start:start + batch_size]
+        posts = [
+            _post_kwargs(article, category_id, media_ids[start + offset], status)
+            for offset, article in enumerate(chunk)
+        ]
+        bucket.acquire()
+        print(f"📤 Posting batch of {len(posts)} articles to WordPress...")
+        results = create_posts_batch(wp, posts, batch_size, media_cache)
+
+        updates = []
+        for article, post, result in zip(chunk, posts, results):
+            if isinstance(result, dict) and "id" in result:
+                source_id = post['meta']['article_id']
+                mirror.remember(source_id, result["id"], result.get('modified'))
+                item = registry.find_by_url(article.get('link') or article['source_url'])
+                if item:
+                    updates.append((item['id'], result["id"]))
+                published += 1
+                _record_published(item)
+            else:
+                metrics.inc('posts_failed_total')
+                print(f"❌ Failed to post: {article['source_url']} ({(result or {}).get('error')})")
+        registry.mark_uploaded_many(updates)
+        if spool:
+            for article in chunk:
+                spool.mark_done(article.get('link') or article['source_url'])
+        print(f"✅ Batch done: {len(updates)} registry rows updated.")
+
+    return published
+
+
+async def prepare_media_async(wp, img_url, image_settings, media_cache=None, locks=None, images=None):
+    """
+    prepare_media for AsyncWordPressAuth: fetch + resize run in a worker
+    thread (or the ImageService pool), the upload goes through the async
+    client. `locks` is a dict shared by one publish run so the same image
+    is only uploaded once.
+    """
+    if not img_url or img_url == 'None':
+        return None
+
+    if not media_cache:
+        image = await asyncio.to_thread(encode, img_url, image_settings, images)
+        return await wp.upload_image(image) if image else None
+
+    url_key = media_cache.url_key(img_url, image_settings)
+    lock = (locks if locks is not None else {}).setdefault(url_key, asyncio.Lock())
+    async with lock:
+        media_id = _cached_by_url(media_cache, url_key, img_url)
+        if media_id:
+            return media_id
+
+        image = await asyncio.to_thread(encode, img_url, image_settings, images)
+        if not image:
+            return None
+        media_id, content_keys = _cached_by_content(media_cache, url_key, image)
+        if media_id:
+            return media_id
+
+        media_id = await wp.upload_image(image)
+        if media_id:
+            media_cache.put(media_id, url_key, *content_keys)
+        return media_id
+
+
+async def create_post_async(wp, post, media_cache=None):
+    """create_post for AsyncWordPressAuth."""
+    result = await wp.create_post(**post)
+    if _media_gone(result, post, media_cache):
+        result = await wp.create_post(**post)
+    return result
+
+
+async def publish_articles_async(articles, wp, registry, mirror, category_id, image_settings, bucket,
+                                 concurrency=8, spool=None, media_cache=None, images=None):
+    """
+    publish_articles on an event loop with an AsyncWordPressAuth: up to
+    `concurrency` articles have their image and post in flight at once,
+    still paced by the token bucket. Posts may go live out of crawl order.
+    articles may be a blocking iterable (e.g. a live crawl stream); it is
+    read from a worker thread. Returns the number of published posts.
+    """
+    published = 0
+    slots = asyncio.Semaphore(max(1, concurrency))
+    locks = {}
+    iterator = iter(articles)
+
+    async def handle(article):
+        nonlocal published
+        source_url = article['source_url']
+        try:
+            try:
+                feat_id = await prepare_media_async(wp, article.get('image_url'), image_settings, media_cache, locks, images)
+            except Exception as e:
+                print(f"⚠️ Media stage failed for {source_url}: {e}")
+                feat_id = None
+
+            post = _post_kwargs(article, category_id, feat_id)
+            source_id = post['meta']['article_id']
+            await bucket.acquire_async()
+            print(f"📤 Posting to WordPress: {article['title'][:40]}...")
+            result = await create_post_async(wp, post, media_cache)
+
+            if isinstance(result, dict) and "id" in result:
+                mirror.remember(source_id, result["id"], result.get('modified'))
+                item = registry.find_by_url(article.get('link') or source_url)
+                published += 1
+                _record_published(item)
+                if item:
+                    registry.mark_uploaded(item['id'], result["id"])
+                    print(f"✅ Success! (WP ID: {result['id']}) - Match by ID: {source_id}")
+                else:
+                    print(f"⚠️ Posted, but ID {source_id} not found in registry.")
+            else:
+                metrics.inc('posts_failed_total')
+                print(f"❌ Failed to post: {source_url}")
+
+            if spool:
+                spool.mark_done(article.get('link') or source_url)
+        finally:
+            slots.release()
+
+    tasks = []
+    while True:
+        # Bounded lookahead: don't pull the next article until a slot is free
+        await slots.acquire()
+        article = await asyncio.to_thread(next, iterator, None)
+        if article is None:
+            slots.release()
+            break
+        tasks.append(asyncio.create_task(handle(article)))
+
+    for outcome in await asyncio.gather(*tasks, return_exceptions=True):
+        if isinstance(outcome, Exception):
+            print(f"❌ Publish task failed: {outcome}")
+    return published
+
+
+def _shared_media(img_url, targets, image_settings, images=None):
+    """
+    Fan-out media stage: looks the image up in each target's media cache and
+    downloads + resizes it once for all targets that still need an upload.
+    Returns ({target name: cached media ID}, EncodedImage or None).
+    """
+    if not img_url or img_url == 'None':
+        return {}, None
+    cached = {}
+    for target in targets:
+        if target.media_cache:
+            media_id = target.media_cache.get(target.media_cache.url_key(img_url, image_settings))
+            if media_id:
+                metrics.inc('media_cache_hits_total', key='url')
+                cached[target.name] = media_id
+    image = None
+    if any(target.name not in cached for target in targets):
+        image = encode(img_url, image_settings, images)
+    return cached, image
+
+
+def _publish_to_target(target, registry, article, item, feat_id, image, image_settings):
+    """Runs on the target's own worker thread. Returns True if the post was created."""
+    wp = target.wp
+    if not feat_id and image:
+        cache = target.media_cache
+        content_keys = cache.content_keys(image) if cache else []
+        feat_id = cache.get(*content_keys) if cache else None
+        if feat_id:
+            metrics.inc('media_cache_hits_total', key='content')
+            cache.put(feat_id, cache.url_key(article['image_url'], image_settings))
+        else:
+            feat_id = wp.upload_image(image)
+            if feat_id and cache:
+                cache.put(feat_id, cache.url_key(article['image_url'], image_settings), *content_keys)
+
+    post = _post_kwargs(article, target.category_id, feat_id)
+    source_id = post['meta']['article_id']
+    waited = target.bucket.acquire()
+    if waited >= 1:
+        print(f"⏳ [{target.name}] Rate limit: waited {waited:.0f}s before posting.")
+    result = create_post(wp, post, target.media_cache, f"[{target.name}] ")
+
+    if isinstance(result, dict) and "id" in result:
+        target.mirror.remember(source_id, result["id"], result.get('modified'))
+        if item:
+            registry.mark_published(item['id'], target.name, result["id"])
+        _record_published(item)
+        print(f"✅ [{target.name}] Posted (WP ID: {result['id']}): {article['title'][:40]}")
+        return True
+    metrics.inc('posts_failed_total')
+    print(f"❌ [{target.name}] Failed to post: {article['source_url']}")
+    return False
+
+
+def publish_to_targets(articles, targets, registry, all_targets, image_settings, media_workers=2, spool=None,
+                       images=None):
+    """
+    Multi-site fan-out. Each article is crawled once and its image fetched
+    and resized once; then it is posted to every target that doesn't have
+    it yet, in parallel across targets (one worker thread per target, each
+    paced by that target's own token bucket). Per-target results go to the
+    registry's publications table; an item is marked uploaded once all of
+    `all_targets` (names, including targets offline this cycle) have it.
+    Returns {target name: number of published posts}.
+    """
+    published = {target.name: 0 for target in targets}
+    staged = queue.Queue(maxsize=max(1, media_workers) * 2)
+    # Articles whose posts are still in flight; bounds memory held by encoded images
+    in_flight = deque()
+    window = max(1, media_workers) * 2
+
+    def stage(articles, pool):
+        try:
+            for article in articles:
+                item = registry.find_by_url(article.get('link') or article['source_url'])
+                done = registry.published_targets(item['id']) if item else set()
+                needing = [target for target in targets if target.name not in done]
+                staged.put((article, item, needing, pool.submit(_shared_media, article.get('image_url'), needing, image_settings, images)))
+        except Exception as e:
+            print(f"❌ Article stream failed: {e}")
+        finally:
+            staged.put(None)
+
+    def finish(article, item, futures):
+        for name, future in futures.items():
+            try:
+                if future.result():
+                    published[name] += 1
+            except Exception as e:
+                print(f"❌ [{name}] Publish failed for {article['source_url']}: {e}")
+        if item:
+            registry.complete_if_published(item['id'], all_targets)
+        if spool:
+            spool.mark_done(article.get('link') or article['source_url'])
+
+    workers = {
+        target.name: ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"wp-{target.name}")
+        for target in targets
+    }
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, media_workers), thread_name_prefix="media") as pool:
+            feeder = threading.Thread(target=stage, args=(articles, pool), name="media-feeder", daemon=True)
+            feeder.start()
+
+            while True:
+                entry = staged.get()
+                if entry is None:
+                    break
+                article, item, needing, future = entry
+                try:
+                    cached, image = future.result()
+                except Exception as e:
+                    print(f"⚠️ Media stage failed for {article['source_url']}: {e}")
+                    cached, image = {}, None
+
+                print(f"📤 Fanning out to {len(needing)} site(s): {article['title'][:40]}...")
+                futures = {
+                    target.name: workers[target.name].submit(
+                        _publish_to_target, target, registry, article, item,
+                        cached.get(target.name), image, image_settings
+                    )
+                    for target in needing
+                }
+                in_flight.append((article, item, futures))
+                while len(in_flight) > window:
+                    finish(*in_flight.popleft())
+
+            feeder.join()
+            while in_flight:
+                finish(*in_flight.popleft())
+    finally:
+        for worker in workers.values():
+            worker.shutdown(wait=True)
+
+    return published
@@ -0,0 +1,76 @@
+import time
+import asyncio
+import threading
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket used to pace WordPress posts.
+    `rate_per_minute` tokens are added per minute, up to `burst` stored tokens.
+    A rate of 0/None disables limiting.
+    """
+    def __init__(self, rate_per_minute, burst=1):
+        self.rate = (rate_per_minute or 0) / 60.0  # tokens per second
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self):
+        """Takes a token if one is available right now."""
+        if not self.rate:
+            return True
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def _take_or_wait(self):
+        """Takes a token (returns 0) or returns the seconds until one is due."""
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """Blocks until a token is available. Returns the seconds spent waiting."""
+        if not self.rate:
+            return 0.0
+        waited = 0.0
+        while True:
+            wait = self._take_or_wait()
+            if not wait:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    async def acquire_async(self):
+        """acquire() for asyncio code: waits without blocking the event loop."""
+        if not self.rate:
+            return 0.0
+        waited = 0.0
+        while True:
+            wait = self._take_or_wait()
+            if not wait:
+                return waited
+            await asyncio.sleep(wait)
+            waited += wait
+
+
+def bucket_from_env(posts_per_minute, burst, post_delay):
+    """
+    Builds the post limiter from .env values. When POSTS_PER_MINUTE is not set
+    the old POST_DELAY (seconds between posts) is translated into a rate.
+    """
+    if posts_per_minute is None:
+        posts_per_minute = 60.0 / post_delay if post_delay else 0
+    return TokenBucket(float(posts_per_minute), int(burst))
@@ -1,8 +1,11 @@
 import json
-import feedparser
+import time
 import os
 import re
+import calendar
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from utils.metrics import metrics
 
 def clean_persian(text):
     """
@@ -16,6 +19,176 @@ def clean_persian(text):
     # Arabic Keheh \u0643 -> Persian Keheh \u06a9
     return text.replace('ي', 'ی').replace('ك', 'ک').strip()
 
+def parse_feed_entries(feed):
+    """Turns parsed feed entries into {article_id, title, link, uploaded, published} dicts, oldest first."""
+    entries = []
+    # Process entries (reversed to keep chronological order)
+    for entry in reversed(feed.entries):
+        new_link = entry.get('link', '').strip()
+        if not new_link:
+            continue
+
+        # --- NEW EDIT: EXTRACT ID ---
+        # Look for the numeric ID (6 or more digits) in the RSS link
+        match = re.search(r'(\d{6,})', new_link)
+        article_id = match.group(1) if match else None
+        # Publish time from the feed (UTC struct_time) as a Unix timestamp
+        published = entry.get('published_parsed') or entry.get('updated_parsed')
+
+        entries.append({
+            "article_id": article_id,  # <--- Saved here for main.py to use
+            "title": entry.get('title', '').strip(), 
+            "link": new_link, 
+            "uploaded": False,
+            "published": calendar.timegm(published) if published else None
+        })
+    return entries
+
+def fetch_feed(url, etag=None, modified=None, timeout=15):
+    """
+    Conditional GET for one feed. Sends If-None-Match / If-Modified-Since from
+    the previous poll; a 304 answer is returned without parsing anything.
+    Returns {status, etag, modified, entries} (entries is None on 304/failure).
+    """
+    headers = {'User-Agent': 'Mozilla/5.0 (compatible; SpiderPress RSS reader)'}
+    if etag:
+        headers['If-None-Match'] = etag
+    if modified:
+        headers['If-Modified-Since'] = modified
+
+    result = {"status": None, "etag": etag, "modified": modified, "entries": None}
+    with metrics.timed('rss_fetch'):
+        _fetch_feed(url, headers, timeout, result)
+    metrics.inc('feed_polls_total', status=result["status"] or 'error')
+    return result
+
+def _fetch_feed(url, headers, timeout, result):
+    # Imported on first use: runs where no feed is due never load them
+    import requests
+    import feedparser
+    try:
+        response = requests.get(url, headers=headers, timeout=timeout)
+    except requests.RequestException as e:
+        print(f"❌ Error fetching RSS feed {url}: {e}")
+        return result
+
+    result["status"] = response.status_code
+    if response.status_code == 304:
+        return result
+    if response.status_code != 200:
+        print(f"❌ RSS feed {url} answered HTTP {response.status_code}")
+        return result
+
+    result["etag"] = response.headers.get('ETag')
+    result["modified"] = response.headers.get('Last-Modified')
+    try:
+        feed = feedparser.parse(response.content)
+    except Exception as e:
+        print(f"❌ Error parsing RSS feed: {e}")
+        return result
+    result["entries"] = parse_feed_entries(feed)
+    return result
+
+def fetch_rss_entries(url):
+    """
+    Parses the RSS feed and returns its entries oldest-first as
+    {article_id, title, link, uploaded} dicts. Returns None on failure.
+    """
+    print(f"📡 Fetching RSS feed from: {url}")
+    entries = fetch_feed(url)["entries"]
+    
+    if not entries:
+        print("⚠️ No entries found in the RSS feed. Check the URL or connection.")
+        return None
+    return entries
+
+def flag_near_duplicate_titles(entries, registry, dedup):
+    """
+    Indexes new entries' titles and reports the ones close to a story seen
+    from any feed. Titles alone are not proof (recurring headlines differ
+    by a word), so nothing is dropped here: the crawled body decides.
+    """
+    for entry in entries:
+        # Known links were checked when they first appeared
+        if registry.get_by_link(entry['link']):
+            continue
+        match = dedup.check_and_add(entry['title'], entry['link'], 'title')
+        if match:
+            metrics.inc('duplicates_suspected_total', kind='title')
+            print(f"   🧬 Possible duplicate, checking its text after the crawl: {entry['title'][:60]} (like {match})")
+    return entries
+
+def poll_feeds(urls, registry, max_size=0, workers=8, min_interval=60, max_interval=900, dedup=None):
+    """
+    Polls every due feed concurrently with conditional GETs and merges new
+    entries into the registry. Per-feed ETag/Last-Modified and poll interval
+    are kept in the registry: a feed that changed is polled more often
+    (interval halves, down to min_interval), an unchanged one backs off
+    (x1.5, up to max_interval). With a NearDuplicateIndex as `dedup`, new
+    titles are indexed and look-alikes reported. Returns the number of new registry items.
+    """
+    now = time.time()
+    states = {url: registry.get_feed_state(url) for url in urls}
+    due = [url for url in urls if not states[url] or states[url]['next_check'] <= now]
+    if not due:
+        print("💤 No feeds due for polling.")
+        return 0
+
+    print(f"📡 Polling {len(due)}/{len(urls)} feeds...")
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(due)))) as pool:
+        futures = {
+            url: pool.submit(
+                fetch_feed, url,
+                (states[url] or {}).get('etag'), (states[url] or {}).get('modified')
+            )
+            for url in due
+        }
+        results = {url: future.result() for url, future in futures.items()}
+
+    # Registry writes stay on this thread
+    added_total = 0
+    for url in due:
+        result = results[url]
+        state = states[url] or {'interval': min_interval, 'last_changed': None}
+        entries = result["entries"]
+        for entry in entries or []:
+            entry['feed'] = url
+        if entries and dedup:
+            flag_near_duplicate_titles(entries, registry, dedup)
+        added = registry.add_entries(entries) if entries else 0
+        added_total += added
+        metrics.inc('articles_discovered_total', added)
+
+        interval = state['interval'] or min_interval
+        if added:
+            interval = max(min_interval, interval / 2)
+            state['last_changed'] = now
+        else:
+            interval = min(max_interval, interval * 1.5)
+
+        if result["status"] == 304:
+            print(f"   ↺ {url}: not modified (next poll in {interval:.0f}s)")
+        elif result["entries"] is None:
+            print(f"   ⚠️ {url}: fetch failed (next poll in {interval:.0f}s)")
+        else:
+            print(f"   ✅ {url}: {added} new (next poll in {interval:.0f}s)")
+
+        registry.save_feed_state(
+            url,
+            etag=result["etag"],
+            modified=result["modified"],
+            interval=interval,
+            next_check=now + interval,
+            last_checked=now,
+            last_changed=state['last_changed'],
+        )
+
+    trimmed = registry.trim(max_size)
+    if trimmed:
+        print(f"🧹 Registry trimmed to latest {max_size} items.")
+    print(f"✅ RSS Updated. Added {added_total} items. Total: {registry.count()}")
+    return added_total
+
 def save_rss_as_json(url, filename="data/data.json"):
     """
     Parses the RSS feed, extracts numeric IDs, adds an 'uploaded' flag, 
@@ -25,15 +198,8 @@ def save_rss_as_json(url, filename="data/data.json"):
     os.makedirs(os.path.dirname(filename), exist_ok=True)
 
     # 2. Parse the RSS feed
-    print(f"📡 Fetching RSS feed from: {url}")
-    try:
-        feed = feedparser.parse(url)
-    except Exception as e:
-        print(f"❌ Error parsing RSS feed: {e}")
-        return
-    
-    if not feed.entries:
-        print("⚠️ No entries found in the RSS feed. Check the URL or connection.")
+    entries = fetch_rss_entries(url)
+    if entries is None:
         return
 
     # 3. Load existing data if file exists
@@ -53,27 +219,14 @@ def save_rss_as_json(url, filename="data/data.json"):
     existing_links = {item['link'].strip() for item in existing_data}
     existing_titles = {clean_persian(item['title']) for item in existing_data}
 
-    # Process entries (reversed to keep chronological order)
-    for entry in reversed(feed.entries):
-        new_title = entry.title.strip()
-        new_link = entry.link.strip()
-        cleaned_new_title = clean_persian(new_title)
-
-        # --- NEW EDIT: EXTRACT ID ---
-        # Look for the numeric ID (6 or more digits) in the RSS link
-        match = re.search(r'(\d{6,})', new_link)
-        article_id = match.group(1) if match else None
+    for entry in entries:
+        cleaned_new_title = clean_persian(entry['title'])
 
         # Check if this item is truly new
-        if new_link not in existing_links and cleaned_new_title not in existing_titles:
-            existing_data.append({
-                "article_id": article_id,  # <--- Saved here for main.py to use
-                "title": new_title, 
-                "link": new_link, 
-                "uploaded": False 
-            })
+        if entry['link'] not in existing_links and cleaned_new_title not in existing_titles:
+            existing_data.append(entry)
             # Update lookup sets
-            existing_links.add(new_link)
+            existing_links.add(entry['link'])
             existing_titles.add(cleaned_new_title)
             added_count += 1
 
@@ -0,0 +1,127 @@
+import hashlib
+from utils.publisher import prepare_media
+from utils.metrics import metrics
+
+
+def content_hash(article):
+    """Hash of everything we publish from a page: title, text and image URL."""
+    digest = hashlib.sha256()
+    for part in (article.get('title'), article.get('content'), article.get('image_url')):
+        digest.update((part or '').encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def record_content(articles, registry):
+    """Passes crawled articles through, storing each one's content hash and HTTP validators."""
+    for article in articles:
+        item = registry.find_by_url(article.get('link') or article['source_url'])
+        if item:
+            registry.save_content_state(
+                item['id'], content_hash(article), article.get('image_url'),
+                article.get('etag'), article.get('last_modified')
+            )
+        yield article
+
+
+def conditional_headers(item):
+    headers = {}
+    if item.get('etag'):
+        headers['If-None-Match'] = item['etag']
+    if item.get('last_modified'):
+        headers['If-Modified-Since'] = item['last_modified']
+    return headers
+
+
+def refresh_articles(wp, crawler, registry, image_settings, max_age, limit, bucket=None,
+                     media_cache=None, images=None):
+    """
+    Re-crawls recently published articles with conditional requests and
+    updates the existing WordPress post in place when the source changed.
+
+    - 304 Not Modified: nothing else happens.
+    - Same content hash: only the stored validators are refreshed.
+    - Changed text/title: one PUT to /wp/v2/posts/<wp_id>.
+    - Changed image: the new image is uploaded first (media cache applies).
+    Articles published before hashes were stored get a baseline, not an update.
+    Returns {result: count}.
+    """
+    candidates = registry.refresh_candidates(max_age, limit)
+    stats = {'not_modified': 0, 'unchanged': 0, 'updated': 0, 'baseline': 0, 'failed': 0}
+    if not candidates:
+        print("☕ No recent articles to refresh.")
+        return stats
+
+    print(f"🔎 Checking {len(candidates)} published articles for source changes...")
+    by_link = {item['link']: item for item in candidates}
+    headers = {item['link']: conditional_headers(item) for item in candidates}
+    answered = set()
+
+    for article in crawler.stream([item['link'] for item in candidates], headers):
+        item = by_link.get(article['link']) or registry.find_by_url(article['link'])
+        if not item:
+            continue
+        answered.add(item['id'])
+
+        if article.get('not_modified'):
+            result = 'not_modified'
+            registry.mark_refreshed(item['id'])
+        else:
+            result = _apply_change(wp, registry, item, article, image_settings, bucket, media_cache, images)
+        stats[result] += 1
+        metrics.inc('posts_refreshed_total', result=result)
+
+    for item in candidates:
+        if item['id'] not in answered:
+            # Page gone or unreachable: move it to the back of the queue
+            stats['failed'] += 1
+            metrics.inc('posts_refreshed_total', result='failed')
+            registry.mark_refreshed(item['id'])
+
+    print("✅ Refresh done: " + ", ".join(f"{name}={count}" for name, count in stats.items()))
+    return stats
+
+
+def _apply_change(wp, registry, item, article, image_settings, bucket, media_cache, images):
+    new_hash = content_hash(article)
+    image_url = article.get('image_url')
+
+    def remember():
+        registry.save_content_state(item['id'], new_hash, image_url, article.get('etag'), article.get('last_modified'))
+
+    if not item.get('content_hash'):
+        remember()
+        return 'baseline'
+    if new_hash == item['content_hash']:
+        remember()
+        return 'unchanged'
+
+    fields = {'title': article['title'], 'content': article['content']}
+    image_pending = False
+    if image_url != item.get('image_url'):
+        if not image_url or image_url == 'None':
+            # The source dropped its image: 0 removes the featured image
+            fields['featured_image_id'] = 0
+        else:
+            media_id = prepare_media(wp, image_url, image_settings, media_cache, images)
+            if media_id:
+                fields['featured_image_id'] = media_id
+            else:
+                # Keep the current image; the old hash makes the next pass try again
+                image_pending = True
+
+    if bucket:
+        bucket.acquire()
+    print(f"✏️ Source changed, updating WP ID {item['wp_id']}: {article['title'][:40]}...")
+    result = wp.update_post(item['wp_id'], **fields)
+    if isinstance(result, dict) and "id" in result:
+        if image_pending:
+            print(f"⚠️ New image for WP ID {item['wp_id']} failed. Retrying on the next refresh.")
+            registry.mark_refreshed(item['id'])
+        else:
+            remember()
+        return 'updated'
+    print(f"❌ Failed to update WP ID {item['wp_id']}: {(result or {}).get('error') or (result or {}).get('message')}")
+    # Keep the old hash so the next refresh tries again
+    registry.mark_refreshed(item['id'])
+    return 'failed'
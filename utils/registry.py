@@ -0,0 +1,306 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+from urllib.parse import unquote
+from utils.readrss import clean_persian
+from utils.metrics import metrics
+
+
+def extract_id(url):
+    """
+    Extracts the numeric ID (5+ digits) from URLs.
+    Handles:
+    - /12345-slug-text (Mid-URL ID)
+    - /12345 (End-URL ID)
+    """
+    # 1. Clean the URL (remove trailing slashes and spaces)
+    clean_url = url.strip('/ ')
+
+    # 2. Look for 5 or more digits immediately after a slash
+    # This is the most reliable for site: bartarinha.ir
+    match = re.search(r'/(\d{5,})', clean_url)
+    if match:
+        return match.group(1)
+
+    # 3. Fallback: Just find the last sequence of digits in the URL
+    match_fallback = re.findall(r'(\d+)', clean_url)
+    return match_fallback[-1] if match_fallback else url
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    article_id  TEXT,
+    title       TEXT NOT NULL,
+    norm_title  TEXT NOT NULL,
+    link        TEXT NOT NULL UNIQUE,
+    uploaded    INTEGER NOT NULL DEFAULT 0,
+    wp_id       INTEGER,
+    added_at    REAL NOT NULL,
+    published_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_articles_article_id ON articles(article_id);
+CREATE INDEX IF NOT EXISTS idx_articles_norm_title ON articles(norm_title);
+CREATE INDEX IF NOT EXISTS idx_articles_pending ON articles(uploaded, id);
+CREATE TABLE IF NOT EXISTS feeds (
+    url           TEXT PRIMARY KEY,
+    etag          TEXT,
+    modified      TEXT,
+    interval      REAL,
+    next_check    REAL NOT NULL DEFAULT 0,
+    last_checked  REAL,
+    last_changed  REAL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS publications (
+    article_row   INTEGER NOT NULL,
+    target        TEXT NOT NULL,
+    wp_id         INTEGER,
+    published_at  REAL NOT NULL,
+    PRIMARY KEY (article_row, target)
+);
+"""
+
+# Columns added after the first release: (table, column, definition)
+MIGRATIONS = [
+    ('articles', 'published_at', 'REAL'),
+    # Last crawled version of the source page, for refresh mode
+    ('articles', 'content_hash', 'TEXT'),
+    ('articles', 'image_url', 'TEXT'),
+    ('articles', 'etag', 'TEXT'),
+    ('articles', 'last_modified', 'TEXT'),
+    ('articles', 'refreshed_at', 'REAL'),
+    # Feed the item came from, for per-source scheduling weights
+    ('articles', 'feed', 'TEXT'),
+]
+
+
+class Registry:
+    """
+    SQLite-backed article registry (replaces rewriting data/data.json).
+    Lookups by article_id, link and normalized title are indexed, and
+    status changes are single-row transactions. A title only blocks new
+    entries for `title_window` seconds after it was added (0 = forever),
+    so recurring headlines ("today's front pages") can be posted again.
+    """
+    def __init__(self, db_path="data/registry.db", title_window=12 * 3600):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db_path = db_path
+        self.title_window = title_window
+        # The daemon and upload workers share one connection, guarded by a lock
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.lock = threading.RLock()
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.executescript(SCHEMA)
+            for table, column, definition in MIGRATIONS:
+                self._ensure_column(table, column, definition)
+            self.conn.commit()
+
+    def _ensure_column(self, table, column, definition):
+        columns = {row['name'] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+        if column not in columns:
+            self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    # --- Lookups ---
+
+    def _one(self, query, params):
+        with self.lock:
+            row = self.conn.execute(query, params).fetchone()
+        return dict(row) if row else None
+
+    def get_by_article_id(self, article_id):
+        return self._one("SELECT * FROM articles WHERE article_id = ? LIMIT 1", (article_id,))
+
+    def get_by_link(self, link):
+        return self._one("SELECT * FROM articles WHERE link = ?", (link.strip(),))
+
+    def get_by_title(self, title):
+        return self._one("SELECT * FROM articles WHERE norm_title = ? LIMIT 1", (clean_persian(title),))
+
+    def find_by_url(self, url):
+        """Matches a crawled URL back to its registry row (exact link first, then numeric ID)."""
+        url = url.strip()
+        item = self.get_by_link(url) or self.get_by_link(unquote(url))
+        if item:
+            return item
+        return self.get_by_article_id(extract_id(unquote(url)))
+
+    def pending(self, limit=None):
+        """Items not uploaded yet, oldest first."""
+        query = "SELECT * FROM articles WHERE uploaded = 0 ORDER BY id"
+        params = ()
+        if limit:
+            query += " LIMIT ?"
+            params = (limit,)
+        with self.lock:
+            return [dict(row) for row in self.conn.execute(query, params)]
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+
+    # --- Writes ---
+
+    def add_entries(self, entries):
+        """
+        Inserts new feed entries ({article_id, title, link, published, feed}) in one transaction.
+        Entries whose link is already known, or whose normalized title was
+        added within title_window, are skipped. Returns the number of rows added.
+        """
+        added = 0
+        now = time.time()
+        title_since = now - self.title_window if self.title_window else 0
+        with metrics.timed('registry_write'), self.lock, self.conn:
+            for entry in entries:
+                link = entry['link'].strip()
+                title = entry['title'].strip()
+                norm_title = clean_persian(title)
+                exists = self.conn.execute(
+                    "SELECT 1 FROM articles WHERE link = ? OR (norm_title = ? AND added_at >= ?) LIMIT 1",
+                    (link, norm_title, title_since)
+                ).fetchone()
+                if exists:
+                    continue
+                self.conn.execute(
+                    "INSERT INTO articles (article_id, title, norm_title, link, uploaded, wp_id, added_at, published_at, feed) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (entry.get('article_id'), title, norm_title, link,
+                     1 if entry.get('uploaded') else 0, entry.get('wp_id'), now, entry.get('published'), entry.get('feed'))
+                )
+                added += 1
+        return added
+
+    def mark_uploaded(self, row_id, wp_id):
+        with metrics.timed('registry_write'), self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE articles SET uploaded = 1, wp_id = ? WHERE id = ?", (wp_id, row_id)
+            )
+
+    def mark_skipped(self, row_id):
+        """Takes an item out of the pending queue without a WordPress post (e.g. a near-duplicate)."""
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE articles SET uploaded = 1, wp_id = NULL WHERE id = ?", (row_id,))
+
+    def mark_uploaded_many(self, updates):
+        """Applies several (row_id, wp_id) updates in one transaction."""
+        with metrics.timed('registry_write'), self.lock, self.conn:
+            self.conn.executemany(
+                "UPDATE articles SET uploaded = 1, wp_id = ? WHERE id = ?",
+                [(wp_id, row_id) for row_id, wp_id in updates]
+            )
+
+    def trim(self, max_size):
+        """Keeps only the newest max_size rows (0 disables the rolling window)."""
+        if not max_size:
+            return 0
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "DELETE FROM articles WHERE id NOT IN "
+                "(SELECT id FROM articles ORDER BY id DESC LIMIT ?)", (max_size,)
+            )
+            self.conn.execute("DELETE FROM publications WHERE article_row NOT IN (SELECT id FROM articles)")
+        return cursor.rowcount
+
+    # --- Per-target state (multi-site fan-out) ---
+
+    def published_targets(self, row_id):
+        """Names of the targets an item has already been handled for."""
+        with self.lock:
+            return {row[0] for row in self.conn.execute(
+                "SELECT target FROM publications WHERE article_row = ?", (row_id,)
+            )}
+
+    def mark_published(self, row_id, target, wp_id):
+        with metrics.timed('registry_write'), self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO publications (article_row, target, wp_id, published_at) VALUES (?, ?, ?, ?)",
+                (row_id, target, wp_id, time.time())
+            )
+
+    def complete_if_published(self, row_id, targets):
+        """Marks the item uploaded once every target in `targets` has it. Returns True if done."""
+        if not set(targets) <= self.published_targets(row_id):
+            return False
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE articles SET uploaded = 1 WHERE id = ?", (row_id,))
+        return True
+
+    # --- Source change tracking (refresh mode) ---
+
+    def save_content_state(self, row_id, content_hash, image_url, etag=None, last_modified=None):
+        """Remembers the crawled version of an article (hash of its text and image, validators)."""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE articles SET content_hash = ?, image_url = ?, etag = ?, last_modified = ?, refreshed_at = ? "
+                "WHERE id = ?",
+                (content_hash, image_url, etag, last_modified, time.time(), row_id)
+            )
+
+    def mark_refreshed(self, row_id):
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE articles SET refreshed_at = ? WHERE id = ?", (time.time(), row_id))
+
+    def refresh_candidates(self, max_age, limit):
+        """Published articles added in the last max_age seconds, least recently checked first."""
+        with self.lock:
+            return [dict(row) for row in self.conn.execute(
+                "SELECT * FROM articles WHERE uploaded = 1 AND wp_id IS NOT NULL AND added_at >= ? "
+                "ORDER BY COALESCE(refreshed_at, 0), id LIMIT ?",
+                (time.time() - max_age, limit)
+            )]
+
+    # --- Feed polling state ---
+
+    def get_feed_state(self, url):
+        return self._one("SELECT * FROM feeds WHERE url = ?", (url,))
+
+    def save_feed_state(self, url, **state):
+        columns = ['url'] + list(state)
+        with self.lock, self.conn:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO feeds ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' for _ in columns)})",
+                [url] + list(state.values())
+            )
+
+    # --- Migration ---
+
+    def import_json(self, json_path="data/data.json"):
+        """
+        One-shot importer from the legacy JSON registry. Runs only once per
+        database; the JSON file itself is left untouched.
+        """
+        with self.lock:
+            done = self.conn.execute("SELECT value FROM meta WHERE key = 'json_imported'").fetchone()
+        if done or not os.path.exists(json_path):
+            return 0
+
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                items = json.load(f)
+        except (json.JSONDecodeError, ValueError, OSError) as e:
+            print(f"⚠️ Could not import {json_path}: {e}")
+            return 0
+
+        added = self.add_entries(items)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('json_imported', ?)", (json_path,)
+            )
+        print(f"📦 Imported {added} items from {json_path} into {self.db_path}")
+        return added
@@ -0,0 +1,81 @@
+import time
+import heapq
+from urllib.parse import urlparse
+from utils.metrics import metrics
+
+
+def parse_feed_weights(value):
+    """"https://a.com/rss=2,b.com=0.5" -> {"https://a.com/rss": 2.0, "b.com": 0.5} (feed URL or host)."""
+    weights = {}
+    for spec in (value or "").split(","):
+        if "=" not in spec:
+            continue
+        # Feed URLs may carry their own "=" in the query string
+        key, weight = spec.strip().rsplit("=", 1)
+        weights[key.strip()] = float(weight)
+    return weights
+
+
+class FreshnessScheduler:
+    """
+    Orders pending registry items so fresh stories are published within
+    `target_latency` seconds of their feed publish time, whatever the
+    size of the backlog.
+
+    Each item gets a deadline: feed publish time (or when we first saw it)
+    plus target_latency divided by its feed's weight, so a weight-2 source
+    gets half the time. Items that can still make their deadline go first,
+    earliest deadline first; items that already missed it come after,
+    most recent first. A breaking story therefore preempts any backlog.
+    Items older than `stale_after` seconds (0 = never) are dropped.
+    """
+    def __init__(self, target_latency=900, stale_after=0, weights=None):
+        self.target_latency = target_latency
+        self.stale_after = stale_after
+        self.weights = weights or {}
+
+    def weight(self, item):
+        feed = item.get('feed')
+        if not feed:
+            return 1.0
+        return self.weights.get(feed) or self.weights.get(urlparse(feed).hostname) or 1.0
+
+    def deadline(self, item):
+        since = item.get('published_at') or item.get('added_at') or 0
+        return since + self.target_latency / self.weight(item)
+
+    def priority(self, item, now):
+        """Heap key: (0, deadline) while the deadline can be met, then (1, -deadline)."""
+        deadline = self.deadline(item)
+        return (0, deadline) if deadline >= now else (1, -deadline)
+
+    def is_stale(self, item, now):
+        since = item.get('published_at') or item.get('added_at')
+        return bool(self.stale_after and since and now - since > self.stale_after)
+
+    def drop_stale(self, items, registry, now=None):
+        """Marks stale items as skipped in the registry. Returns the rest."""
+        now = now or time.time()
+        fresh = []
+        stale = 0
+        for item in items:
+            if self.is_stale(item, now):
+                registry.mark_skipped(item['id'])
+                stale += 1
+            else:
+                fresh.append(item)
+        if stale:
+            metrics.inc('articles_stale_total', stale)
+            print(f"🗑️ Dropped {stale} stale articles (older than {self.stale_after / 3600:g}h).")
+        return fresh
+
+    def order(self, items, registry, now=None):
+        """
+        Yields pending items most urgent first (stale ones are dropped first).
+        A heap, so a caller that stops after MAX_LINKS items only pays for those.
+        """
+        now = now or time.time()
+        heap = [(self.priority(item, now), item['id'], item) for item in self.drop_stale(items, registry, now)]
+        heapq.heapify(heap)
+        while heap:
+            yield heapq.heappop(heap)[2]
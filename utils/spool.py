@@ -0,0 +1,71 @@
+import os
+import json
+import threading
+
+
+class ArticleSpool:
+    """
+    Optional append-only JSONL log of scraped articles, for crash recovery.
+    Each scraped article is appended as it arrives and a {"done": link} line
+    is appended once it has been handled. On restart, articles without a
+    "done" line are handed to the upload stage again instead of re-crawling.
+    """
+    def __init__(self, path="data/spool.jsonl"):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+
+    def _append(self, record):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+
+    def append(self, article):
+        self._append(article)
+
+    def mark_done(self, link):
+        self._append({"done": link})
+
+    def pending(self):
+        """Articles that were spooled but never marked done (oldest first)."""
+        if not os.path.exists(self.path):
+            return []
+
+        articles = {}
+        with self.lock:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A torn last line from a crash; everything before it is intact
+                        continue
+                    if "done" in record:
+                        articles.pop(record["done"], None)
+                    elif record.get("link"):
+                        articles[record["link"]] = record
+        return list(articles.values())
+
+    def compact(self):
+        """Rewrites the spool with only the pending articles."""
+        pending = self.pending()
+        with self.lock:
+            if not pending:
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+                return
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                for article in pending:
+                    f.write(json.dumps(article, ensure_ascii=False) + "\n")
+            os.replace(temp_path, self.path)
+
+    def tee(self, articles):
+        """Spools every article of an iterable while passing it through."""
+        for article in articles:
+            self.append(article)
+            yield article
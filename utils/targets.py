@@ -0,0 +1,87 @@
+import os
+import re
+from utils.rate_limiter import bucket_from_env
+
+
+def load_targets(defaults):
+    """
+    Reads the WordPress targets for multi-site fan-out from the environment.
+
+        WP_TARGETS=news,sport
+        WP_NEWS_URL=https://news.example.com
+        WP_NEWS_USERNAME=...
+        WP_NEWS_PASSWORD=...
+        WP_NEWS_CATEGORY_SLUG=politics
+        WP_NEWS_POSTS_PER_MINUTE=2      (optional, falls back to POSTS_PER_MINUTE)
+
+    `defaults` is the global config, used for any per-target value left out.
+    Returns a list of dicts; empty when WP_TARGETS is not set.
+    """
+    names = [name.strip() for name in (os.getenv("WP_TARGETS") or "").split(",") if name.strip()]
+    targets = []
+    for name in names:
+        if not re.fullmatch(r'[A-Za-z0-9_]+', name):
+            raise ValueError(f"Invalid WP_TARGETS name '{name}' (letters, digits and _ only)")
+        key = name.upper()
+
+        def get(field, default=None):
+            value = os.getenv(f"WP_{key}_{field}")
+            return value if value not in (None, "") else default
+
+        ppm = get("POSTS_PER_MINUTE")
+        targets.append({
+            "name": name.lower(),
+            "url": get("URL"),
+            "user": get("USERNAME"),
+            "pwd": get("PASSWORD"),
+            "category_slug": get("CATEGORY_SLUG", defaults["WP_CAT_SLUG"]),
+            "posts_per_minute": float(ppm) if ppm else defaults["POSTS_PER_MINUTE"],
+            "post_burst": int(get("POST_BURST", defaults["POST_BURST"])),
+            "post_delay": int(get("POST_DELAY", defaults["POST_DELAY"])),
+        })
+        if not targets[-1]["url"]:
+            raise ValueError(f"WP_{key}_URL is not set for target '{name}'")
+    return targets
+
+
+class Target:
+    """
+    One WordPress site in a fan-out run, with its own session, category,
+    post rate limit, post mirror and media cache namespace.
+    Per-article state lives in the registry's publications table.
+    """
+    def __init__(self, settings, mirror, media_cache=None, http_options=None):
+        self.name = settings["name"]
+        self.settings = settings
+        self.mirror = mirror
+        self.media_cache = media_cache
+        self.http_options = http_options or {}
+        # Shared across cycles so each site's post rate holds over the whole run
+        self.bucket = bucket_from_env(settings["posts_per_minute"], settings["post_burst"], settings["post_delay"])
+        self.wp = None
+        self.category_id = None
+
+    def connect(self):
+        """Logs in (once) and resolves the category. Returns False if the site is unreachable."""
+        if self.wp:
+            return True
+        from utils.wordpress_api import WordPressAuth
+        wp = WordPressAuth(self.settings["url"], **self.http_options)
+        if not wp.login(self.settings["user"], self.settings["pwd"]):
+            print(f"❌ [{self.name}] WordPress Login Failed. Check WP_{self.name.upper()}_* in .env.")
+            wp.logout()
+            return False
+        self.wp = wp
+        self.category_id = wp.get_category_id_by_slug(self.settings["category_slug"])
+        return True
+
+    def disconnect(self):
+        if self.wp:
+            self.wp.logout()
+        self.wp = None
+
+    def close(self):
+        self.disconnect()
+        self.mirror.close()
+        if self.media_cache:
+            self.media_cache.close()
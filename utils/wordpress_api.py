@@ -1,20 +1,45 @@
 import requests
 from requests.auth import HTTPBasicAuth
 import os
+from utils.metrics import metrics
+from utils.http_client import ResilientSession, CircuitBreaker
+
+def post_payload(title, content, status='publish', categories=None, featured_image_id=None, meta=None):
+    """JSON body for /wp/v2/posts (shared with the async client)."""
+    post_data = {
+        'title': title,
+        'content': content,
+        'status': status,
+    }
+    if categories: post_data['categories'] = categories
+    if featured_image_id: post_data['featured_media'] = featured_image_id
+    # e.g. {'article_id': '123456'} so post_exists_by_id and the mirror can find it
+    if meta: post_data['meta'] = meta
+    return post_data
 
 class WordPressAuth:
-    def __init__(self, base_url):
+    def __init__(self, base_url, pool_size=10, timeout=15, max_retries=3,
+                 breaker_threshold=5, breaker_timeout=30):
         self.base_url = base_url.rstrip('/')
         self.api_url = f"{self.base_url}/wp-json/wp/v2"
-        self.session = requests.Session()
+        # Pooled keep-alive connections, default timeout, retries and a circuit breaker
+        self.session = ResilientSession(
+            pool_size=pool_size, timeout=timeout, max_retries=max_retries,
+            breaker=CircuitBreaker(breaker_threshold, breaker_timeout)
+        )
         self.auth = None
+        # None = unknown until the first /batch/v1 call
+        self.batch_supported = None
+        # None = unknown until the first /media/<id>/sideload call
+        self.sideload_supported = None
 
     def login(self, username, password):
         try:
             self.auth = HTTPBasicAuth(username, password)
             response = self.session.get(f"{self.api_url}/users/me", auth=self.auth, timeout=10)
             return True if response.status_code == 200 else False
-        except:
+        except requests.RequestException as e:
+            print(f"❌ WordPress login request failed: {e}")
             return False
 
     def get_category_id_by_slug(self, slug):
@@ -24,7 +49,8 @@ class WordPressAuth:
             if response.status_code == 200 and len(response.json()) > 0:
                 return response.json()[0]['id']
             return None
-        except:
+        except (requests.RequestException, ValueError, KeyError) as e:
+            print(f"⚠️ Category lookup failed: {e}")
             return None
 
     def upload_local_image(self, file_path):
@@ -33,28 +59,34 @@ class WordPressAuth:
             print(f"❌ File not found: {file_path}")
             return None
         
-        try:
-            filename = os.path.basename(file_path)
-            # Detect content type (basic check)
-            content_type = 'image/jpeg'
-            if filename.lower().endswith('.png'): content_type = 'image/png'
-            elif filename.lower().endswith('.webp'): content_type = 'image/webp'
+        filename = os.path.basename(file_path)
+        # Detect content type (basic check)
+        content_type = 'image/jpeg'
+        if filename.lower().endswith('.png'): content_type = 'image/png'
+        elif filename.lower().endswith('.webp'): content_type = 'image/webp'
+
+        with open(file_path, 'rb') as img_file:
+            binary_data = img_file.read()
+        return self.upload_image_bytes(binary_data, filename, content_type)
 
+    def upload_image_bytes(self, binary_data, filename, content_type='image/jpeg', generate_sub_sizes=True):
+        """Uploads an in-memory encoded image to the WordPress Media library."""
+        try:
             headers = {
                 'Content-Disposition': f'attachment; filename={filename}',
                 'Content-Type': content_type,
             }
 
-            with open(file_path, 'rb') as img_file:
-                binary_data = img_file.read()
-
-            response = self.session.post(
-                f"{self.api_url}/media",
-                headers=headers,
-                data=binary_data,
-                auth=self.auth,
-                timeout=30
-            )
+            with metrics.timed('media_upload'):
+                response = self.session.post(
+                    f"{self.api_url}/media",
+                    headers=headers,
+                    data=binary_data,
+                    auth=self.auth,
+                    # Sizes we render ourselves are sideloaded instead
+                    params=None if generate_sub_sizes else {'generate_sub_sizes': 'false'},
+                    timeout=30
+                )
             
             if response.status_code == 201:
                 return response.json().get('id')
@@ -62,8 +94,64 @@ class WordPressAuth:
                 print(f"❌ Upload Failed: {response.text}")
                 return None
         except Exception as e:
-            print(f"❌ Error during local upload: {e}")
+            print(f"❌ Error during upload: {e}")
+            return None
+
+    def upload_image(self, image):
+        """
+        Uploads an EncodedImage. When it carries pre-rendered variants, the
+        server is told not to generate sub-sizes and each variant is
+        sideloaded as the registered size of the same name. Sites without
+        the sideload endpoint fall back to server-side generation.
+        Returns the media ID or None.
+        """
+        if not image.variants or self.sideload_supported is False:
+            return self.upload_image_bytes(image.data, image.filename, image.content_type)
+
+        media_id = self.upload_image_bytes(image.data, image.filename, image.content_type, generate_sub_sizes=False)
+        if not media_id:
             return None
+        for size_name, variant in image.variants:
+            if not self._sideload(media_id, size_name, variant):
+                break
+        return media_id
+
+    def _sideload(self, media_id, size_name, variant):
+        """Attaches one pre-rendered size to an attachment. Returns False once sideloading is unavailable."""
+        headers = {
+            'Content-Disposition': f'attachment; filename={variant.filename}',
+            'Content-Type': variant.content_type,
+        }
+        try:
+            with metrics.timed('media_sideload'):
+                response = self.session.post(
+                    f"{self.api_url}/media/{media_id}/sideload",
+                    headers=headers, data=variant.data, params={'image_size': size_name},
+                    auth=self.auth, timeout=30
+                )
+        except requests.RequestException as e:
+            print(f"⚠️ Sideload of size '{size_name}' failed: {e}")
+            return True
+        if response.status_code in (200, 201):
+            self.sideload_supported = True
+            return True
+        if response.status_code == 404 and self.sideload_supported is None:
+            print("⚠️ Media sideload endpoint not available. WordPress will generate image sizes.")
+            self.sideload_supported = False
+            self._generate_sub_sizes(media_id)
+            return False
+        print(f"⚠️ Sideload of size '{size_name}' failed: HTTP {response.status_code}")
+        return True
+
+    def _generate_sub_sizes(self, media_id):
+        """Asks WordPress to create the sub-sizes skipped at upload (fallback)."""
+        try:
+            self.session.post(
+                f"{self.api_url}/media/{media_id}/post-process",
+                json={'action': 'create-image-subsizes'}, auth=self.auth, timeout=60
+            )
+        except requests.RequestException as e:
+            print(f"⚠️ Could not generate image sizes for media {media_id}: {e}")
 
     def upload_image_from_url(self, image_url):
         """Original method: Downloads from URL and uploads directly (no resizing)"""
@@ -87,26 +175,148 @@ class WordPressAuth:
                 timeout=20
             )
             return response.json().get('id') if response.status_code == 201 else None
-        except:
+        except (requests.RequestException, ValueError) as e:
+            print(f"⚠️ Image upload from URL failed: {e}")
             return None
 
-    def create_post(self, title, content, status='publish', categories=None, featured_image_id=None):
+    def _post_data(self, title, content, status='publish', categories=None, featured_image_id=None, meta=None):
+        return post_payload(title, content, status, categories, featured_image_id, meta)
+
+    def create_post(self, title, content, status='publish', categories=None, featured_image_id=None, meta=None):
         if not self.auth: return {"error": "Not authenticated"}
 
-        post_data = {
-            'title': title,
-            'content': content,
-            'status': status,
-        }
-        if categories: post_data['categories'] = categories
-        if featured_image_id: post_data['featured_media'] = featured_image_id
+        post_data = self._post_data(title, content, status, categories, featured_image_id, meta)
 
         try:
-            response = self.session.post(f"{self.api_url}/posts", auth=self.auth, json=post_data, timeout=15)
+            with metrics.timed('post_create'):
+                response = self.session.post(f"{self.api_url}/posts", auth=self.auth, json=post_data, timeout=15)
             return response.json()
         except Exception as e:
             return {"error": str(e)}
 
+    def update_post(self, post_id, title=None, content=None, featured_image_id=None):
+        """
+        Updates an existing post in place. Only the given fields are sent
+        (featured_image_id=0 removes the image). PUT is idempotent, so it is
+        safely retried after timeouts.
+        """
+        if not self.auth: return {"error": "Not authenticated"}
+
+        post_data = {}
+        if title is not None: post_data['title'] = title
+        if content is not None: post_data['content'] = content
+        if featured_image_id is not None: post_data['featured_media'] = featured_image_id
+
+        try:
+            with metrics.timed('post_update'):
+                response = self.session.put(f"{self.api_url}/posts/{post_id}", auth=self.auth, json=post_data, timeout=15)
+            return response.json()
+        except (requests.RequestException, ValueError) as e:
+            return {"error": str(e)}
+
+    def create_posts_batch(self, posts, batch_size=25):
+        """
+        Creates many posts through the REST batch endpoint (/batch/v1, WP 5.6+).
+        `posts` is a list of create_post keyword dicts. Returns one result per
+        post, in order, shaped like create_post's return value.
+        Falls back to one create_post call per item when the server has no batch support.
+        """
+        if not self.auth: return [{"error": "Not authenticated"} for _ in posts]
+
+        # WordPress rejects batches larger than 25 requests by default
+        batch_size = max(1, min(batch_size, 25))
+        results = []
+        for start in range(0, len(posts), batch_size):
+            chunk = posts[start:start + batch_size]
+            if self.batch_supported is not False:
+                chunk_results = self._send_batch(chunk)
+                if chunk_results is not None:
+                    # None = valid item skipped because another one failed validation
+                    results.extend(
+                        self.create_post(**post) if result is None else result
+                        for post, result in zip(chunk, chunk_results)
+                    )
+                    continue
+            results.extend(self.create_post(**post) for post in chunk)
+        return results
+
+    def _send_batch(self, chunk):
+        """Returns per-item results, or None if the batch endpoint is unavailable."""
+        payload = {
+            'validation': 'normal',
+            'requests': [
+                {'method': 'POST', 'path': '/wp/v2/posts', 'body': self._post_data(**post)}
+                for post in chunk
+            ],
+        }
+        try:
+            with metrics.timed('post_batch'):
+                response = self.session.post(
+                    f"{self.base_url}/wp-json/batch/v1", auth=self.auth, json=payload, timeout=60
+                )
+        except Exception as e:
+            return [{"error": str(e)} for _ in chunk]
+
+        if response.status_code in (404, 405, 501):
+            print("⚠️ REST batch endpoint not available. Falling back to single requests.")
+            self.batch_supported = False
+            return None
+
+        try:
+            data = response.json()
+        except ValueError:
+            return [{"error": f"Batch failed with HTTP {response.status_code}"} for _ in chunk]
+
+        responses = data.get('responses') if isinstance(data, dict) else None
+        if not isinstance(responses, list) or len(responses) != len(chunk):
+            return [{"error": f"Unexpected batch response (HTTP {response.status_code})"} for _ in chunk]
+
+        self.batch_supported = True
+        results = []
+        for item in responses:
+            if item is None:
+                results.append(None)
+                continue
+            body = item.get('body') or {}
+            if 200 <= item.get('status', 0) < 300:
+                results.append(body)
+            else:
+                results.append({"error": body.get('message', 'Batch item failed'), "code": body.get('code')})
+        return results
+
+    def iter_posts(self, modified_after=None, per_page=100):
+        """
+        Yields every post (id, meta, modified only), oldest change first.
+        modified_after is a 'modified' value from a previous page (site time).
+        Raises on HTTP errors so callers can tell a failed sync from an empty one.
+        """
+        params = {
+            'per_page': per_page,
+            'status': 'any',
+            'context': 'edit',
+            '_fields': 'id,meta,modified',
+            'orderby': 'modified',
+            'order': 'asc',
+        }
+        if modified_after:
+            params['modified_after'] = modified_after
+
+        page = 1
+        while True:
+            params['page'] = page
+            response = self.session.get(f"{self.api_url}/posts", auth=self.auth, params=params, timeout=30)
+            # WordPress answers 400 for a page past the end
+            if response.status_code == 400 and page > 1:
+                return
+            response.raise_for_status()
+            posts = response.json()
+            yield from posts
+
+            total_pages = int(response.headers.get('X-WP-TotalPages', 1))
+            if page >= total_pages or not posts:
+                return
+            page += 1
+
     def logout(self):
         self.session.close()
         return True
@@ -117,7 +327,7 @@ class WordPressAuth:
             url = f"{self.base_url}/wp-json/wp/v2/posts?search={title}&status=publish,draft,future,pending,private"
             
             try:
-                response = self.session.get(url)
+                response = self.session.get(url, auth=self.auth, timeout=15)
                 if response.status_code == 200:
                     posts = response.json()
                     for p in posts:
@@ -132,9 +342,10 @@ class WordPressAuth:
         """Check if a post with this numeric ID exists in WordPress (stored in meta field)."""
         url = f"{self.base_url}/wp-json/wp/v2/posts?meta_key=article_id&meta_value={article_id}&status=any"
         try:
-            response = self.session.get(url)
+            response = self.session.get(url, auth=self.auth, timeout=15)
             if response.status_code == 200 and len(response.json()) > 0:
                 return response.json()[0]['id']
             return None
-        except:
+        except (requests.RequestException, ValueError, KeyError) as e:
+            print(f"⚠️ Error checking duplicate ID: {e}")
             return None        
\ No newline at end of file
@@ -0,0 +1,277 @@
+import os
+import random
+import asyncio
+import aiohttp
+from utils.metrics import metrics
+from utils.wordpress_api import post_payload
+from utils.http_client import (
+    CircuitBreaker, CircuitOpenError, IDEMPOTENT_METHODS, RETRY_STATUSES,
+    SAFE_POST_RETRY_STATUSES, retry_after_seconds,
+)
+
+
+class AsyncWordPressAuth:
+    """
+    asyncio counterpart of WordPressAuth (same operations and return values).
+    Up to `concurrency` requests are in flight at once over one aiohttp
+    session; retries and the circuit breaker follow the same rules as
+    ResilientSession, so a POST is never resent after it may have arrived.
+
+        async with AsyncWordPressAuth(url, concurrency=8) as wp:
+            if await wp.login(user, pwd): ...
+    """
+    def __init__(self, base_url, concurrency=8, timeout=15, max_retries=3, backoff=0.5, max_backoff=30,
+                 breaker_threshold=5, breaker_timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.api_url = f"{self.base_url}/wp-json/wp/v2"
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_timeout)
+        self.auth = None
+        self.session = None
+        self._slots = None
+        self.sideload_supported = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.logout()
+
+    async def _request(self, method, url, timeout=None, **kwargs):
+        """Returns (status, headers, parsed JSON or None)."""
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.concurrency),
+                raise_for_status=False,
+            )
+            self._slots = asyncio.Semaphore(self.concurrency)
+
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        client_timeout = aiohttp.ClientTimeout(total=timeout or self.timeout)
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"Circuit open, not sending {method} {url}")
+
+            status, headers, data, error = None, None, None, None
+            try:
+                async with self._slots:
+                    async with self.session.request(method, url, auth=self.auth, timeout=client_timeout, **kwargs) as response:
+                        status, headers = response.status, response.headers
+                        try:
+                            data = await response.json(content_type=None)
+                        except ValueError:
+                            data = None
+                if status not in RETRY_STATUSES:
+                    self.breaker.record_success()
+                    return status, headers, data
+                retryable = idempotent or status in SAFE_POST_RETRY_STATUSES
+            except aiohttp.ClientConnectorError as e:
+                # Could not connect: nothing was sent
+                retryable, error = True, e
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                retryable, error = idempotent, e
+
+            if status == 429:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+
+            if not retryable or attempt >= self.max_retries:
+                if error is not None:
+                    raise error
+                return status, headers, data
+
+            delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+            retry_after = retry_after_seconds(_Headers(headers)) if headers is not None else None
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+            delay = min(delay, self.max_backoff)
+            reason = type(error).__name__ if error is not None else f"HTTP {status}"
+            metrics.inc('http_retries_total', reason=reason)
+            print(f"🔁 {method} {url} failed ({reason}); retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def login(self, username, password):
+        self.auth = aiohttp.BasicAuth(username, password)
+        try:
+            status, _, _ = await self._request('GET', f"{self.api_url}/users/me", timeout=10)
+            return status == 200
+        except (aiohttp.ClientError, asyncio.TimeoutError, CircuitOpenError) as e:
+            print(f"❌ WordPress login request failed: {e}")
+            return False
+
+    async def get_category_id_by_slug(self, slug):
+        if not slug: return None
+        try:
+            status, _, data = await self._request('GET', f"{self.api_url}/categories", params={'slug': slug}, timeout=10)
+            if status == 200 and data:
+                return data[0]['id']
+            return None
+        except (aiohttp.ClientError, asyncio.TimeoutError, CircuitOpenError, KeyError) as e:
+            print(f"⚠️ Category lookup failed: {e}")
+            return None
+
+    async def upload_local_image(self, file_path):
+        """Uploads a locally stored image file to WordPress Media library."""
+        if not os.path.exists(file_path):
+            print(f"❌ File not found: {file_path}")
+            return None
+
+        filename = os.path.basename(file_path)
+        content_type = 'image/jpeg'
+        if filename.lower().endswith('.png'): content_type = 'image/png'
+        elif filename.lower().endswith('.webp'): content_type = 'image/webp'
+
+        binary_data = await asyncio.to_thread(_read_file, file_path)
+        return await self.upload_image_bytes(binary_data, filename, content_type)
+
+    async def upload_image_bytes(self, binary_data, filename, content_type='image/jpeg', generate_sub_sizes=True):
+        """Uploads an in-memory encoded image to the WordPress Media library."""
+        headers = {
+            'Content-Disposition': f'attachment; filename={filename}',
+            'Content-Type': content_type,
+        }
+        params = None if generate_sub_sizes else {'generate_sub_sizes': 'false'}
+        try:
+            with metrics.timed('media_upload'):
+                status, _, data = await self._request(
+                    'POST', f"{self.api_url}/media", headers=headers, data=binary_data, params=params, timeout=30
+                )
+        except (aiohttp.ClientError, asyncio.TimeoutError, CircuitOpenError) as e:
+            print(f"❌ Error during upload: {e}")
+            return None
+        if status == 201 and isinstance(data, dict):
+            return data.get('id')
+        print(f"❌ Upload Failed: HTTP {status} {data}")
+        return None
+
+    async def upload_image(self, image):
+        """WordPressAuth.upload_image: variants are sideloaded concurrently."""
+        if not image.variants or self.sideload_supported is False:
+            return await self.upload_image_bytes(image.data, image.filename, image.content_type)
+
+        media_id = await self.upload_image_bytes(image.data, image.filename, image.content_type, generate_sub_sizes=False)
+        if not media_id:
+            return None
+        if self.sideload_supported is None:
+            # Probe with the first size before sending the rest
+            first, rest = image.variants[0], image.variants[1:]
+            if not await self._sideload(media_id, *first):
+                return media_id
+        else:
+            rest = image.variants
+        await asyncio.gather(*(self._sideload(media_id, size_name, variant) for size_name, variant in rest))
+        return media_id
+
+    async def _sideload(self, media_id, size_name, variant):
+        headers = {
+            'Content-Disposition': f'attachment; filename={variant.filename}',
+            'Content-Type': variant.content_type,
+        }
+        try:
+            with metrics.timed('media_sideload'):
+                status, _, _ = await self._request(
+                    'POST', f"{self.api_url}/media/{media_id}/sideload",
+                    headers=headers, data=variant.data, params={'image_size': size_name}, timeout=30
+                )
+        except (aiohttp.ClientError, asyncio.TimeoutError, CircuitOpenError) as e:
+            print(f"⚠️ Sideload of size '{size_name}' failed: {e}")
+            return True
+        if status in (200, 201):
+            self.sideload_supported = True
+            return True
+        if status == 404 and self.sideload_supported is None:
+            print("⚠️ Media sideload endpoint not available. WordPress will generate image sizes.")
+            self.sideload_supported = False
+            try:
+                await self._request(
+                    'POST', f"{self.api_url}/media/{media_id}/post-process",
+                    json={'action': 'create-image-subsizes'}, timeout=60
+                )
+            except (aiohttp.ClientError, asyncio.TimeoutError, CircuitOpenError) as e:
+                print(f"⚠️ Could not generate image sizes for media {media_id}: {e}")
+            return False
+        print(f"⚠️ Sideload of size '{size_name}' failed: HTTP {status}")
+        return True
+
+    async def create_post(self, title, content, status='publish', categories=None, featured_image_id=None, meta=None):
+        if not self.auth: return {"error": "Not authenticated"}
+
+        post_data = post_payload(title, content, status, categories, featured_image_id, meta)
+        try:
+            with metrics.timed('post_create'):
+                _, _, data = await self._request('POST', f"{self.api_url}/posts", json=post_data)
+        except (aiohttp.ClientError, asyncio.TimeoutError, CircuitOpenError) as e:
+            return {"error": str(e)}
+        return data if isinstance(data, dict) else {"error": "Invalid response from WordPress"}
+
+    async def post_exists_by_id(self, article_id):
+        """Check if a post with this numeric ID exists in WordPress (stored in meta field)."""
+        params = {'meta_key': 'article_id', 'meta_value': str(article_id), 'status': 'any'}
+        try:
+            status, _, data = await self._request('GET', f"{self.api_url}/posts", params=params)
+            if status == 200 and data:
+                return data[0]['id']
+            return None
+        except (aiohttp.ClientError, asyncio.TimeoutError, CircuitOpenError, KeyError) as e:
+            print(f"⚠️ Error checking duplicate ID: {e}")
+            return None
+
+    async def posts_exist_by_id(self, article_ids):
+        """post_exists_by_id for many IDs at once. Returns {article_id: wp_id or None}."""
+        results = await asyncio.gather(*(self.post_exists_by_id(article_id) for article_id in article_ids))
+        return dict(zip(article_ids, results))
+
+    async def fetch_posts(self, modified_after=None, per_page=100):
+        """
+        Same posts as WordPressAuth.iter_posts, but after the first page
+        the remaining pages are requested concurrently. Returns a list,
+        oldest change first. Raises on HTTP errors.
+        """
+        params = {
+            'per_page': per_page,
+            'status': 'any',
+            'context': 'edit',
+            '_fields': 'id,meta,modified',
+            'orderby': 'modified',
+            'order': 'asc',
+        }
+        if modified_after:
+            params['modified_after'] = modified_after
+
+        async def page(number):
+            status, headers, data = await self._request(
+                'GET', f"{self.api_url}/posts", params=dict(params, page=number), timeout=30
+            )
+            if status != 200:
+                raise RuntimeError(f"GET /posts page {number} answered HTTP {status}")
+            return headers, data or []
+
+        headers, posts = await page(1)
+        total_pages = int(headers.get('X-WP-TotalPages', 1))
+        for _, rest in await asyncio.gather(*(page(n) for n in range(2, total_pages + 1))):
+            posts.extend(rest)
+        return posts
+
+    async def logout(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+        return True
+
+
+class _Headers:
+    """Lets retry_after_seconds read aiohttp headers like a requests response."""
+    def __init__(self, headers):
+        self.headers = headers
+
+
+def _read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+
+# A job moves discovered -> crawled -> media_ready -> published (or failed)
+STAGES = ('discovered', 'crawled', 'media_ready', 'published', 'failed')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    article_row    INTEGER PRIMARY KEY,
+    link           TEXT NOT NULL,
+    stage          TEXT NOT NULL DEFAULT 'discovered',
+    payload        TEXT,
+    wp_id          INTEGER,
+    lease_owner    TEXT,
+    lease_token    TEXT,
+    lease_expires  REAL,
+    attempts       INTEGER NOT NULL DEFAULT 0,
+    error          TEXT,
+    updated_at     REAL,
+    deadline       REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_stage ON jobs(stage, article_row);
+CREATE TABLE IF NOT EXISTS worker_locks (
+    name     TEXT PRIMARY KEY,
+    owner    TEXT,
+    expires  REAL NOT NULL DEFAULT 0
+);
+"""
+
+
+class WorkQueue:
+    """
+    Shared work queue in the registry database, so several `main.py worker`
+    processes (on one host or on hosts sharing the data volume) can split
+    the pipeline without posting an article twice.
+
+    Every pending registry item becomes one job that moves through STAGES.
+    A worker claims jobs of one stage with a time-limited lease; only the
+    lease holder can advance or fail the job, and a lease that runs out
+    (worker crashed or hung) makes the job claimable again. Each claim
+    counts as an attempt; a job that used up max_attempts in one stage is
+    moved to 'failed'.
+    """
+    def __init__(self, db_path="data/registry.db", max_attempts=3):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_attempts = max_attempts
+        # Other processes write the same file: wait for their locks instead of failing
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.lock = threading.RLock()
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(SCHEMA)
+            # Queues created before jobs had a publish deadline
+            columns = {row['name'] for row in self.conn.execute("PRAGMA table_info(jobs)")}
+            if 'deadline' not in columns:
+                self.conn.execute("ALTER TABLE jobs ADD COLUMN deadline REAL")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def enqueue_pending(self, scheduler=None):
+        """
+        Adds a job for every registry item not uploaded yet. With a
+        FreshnessScheduler each job carries its publish deadline, and jobs
+        are claimed in the scheduler's order. Returns the number added.
+        """
+        now = time.time()
+        with self.lock, self.conn:
+            new = self.conn.execute(
+                "SELECT * FROM articles WHERE uploaded = 0 "
+                "AND id NOT IN (SELECT article_row FROM jobs)"
+            ).fetchall()
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO jobs (article_row, link, updated_at, deadline) VALUES (?, ?, ?, ?)",
+                [(row['id'], row['link'], now, scheduler.deadline(dict(row)) if scheduler else None) for row in new]
+            )
+            # Rows trimmed from the registry take their jobs with them, and items
+            # dropped or posted elsewhere (stale, one-shot run) are not crawled
+            self.conn.execute(
+                "DELETE FROM jobs WHERE article_row NOT IN (SELECT id FROM articles) "
+                "OR (stage = 'discovered' AND lease_token IS NULL "
+                "AND article_row IN (SELECT id FROM articles WHERE uploaded = 1))"
+            )
+        return len(new)
+
+    def claim(self, stage, owner, limit, lease_seconds):
+        """
+        Leases up to `limit` jobs in `stage` to `owner`: jobs that can still
+        meet their deadline first (earliest first), then late ones (most
+        recent deadline first), then jobs without one (oldest first).
+        Returns them as dicts (the payload decoded); pass them back to
+        extend / advance / fail.
+        """
+        now = time.time()
+        token = uuid.uuid4().hex
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET stage = 'failed', lease_owner = NULL, lease_token = NULL, lease_expires = NULL, "
+                "updated_at = ? WHERE stage = ? AND attempts >= ? AND COALESCE(lease_expires, 0) < ?",
+                (now, stage, self.max_attempts, now)
+            )
+            # One UPDATE statement: SQLite holds the write lock for it, so two workers never get the same row
+            self.conn.execute(
+                "UPDATE jobs SET lease_owner = ?, lease_token = ?, lease_expires = ?, attempts = attempts + 1, "
+                "updated_at = ? WHERE article_row IN ("
+                "SELECT article_row FROM jobs WHERE stage = ? AND COALESCE(lease_expires, 0) < ? "
+                "ORDER BY deadline IS NULL, deadline < ?, CASE WHEN deadline < ? THEN -deadline ELSE deadline END, "
+                "article_row LIMIT ?)",
+                (owner, token, now + lease_seconds, now, stage, now, now, now, limit)
+            )
+            rows = self.conn.execute(
+                "SELECT * FROM jobs WHERE lease_token = ? ORDER BY article_row", (token,)
+            ).fetchall()
+        jobs = []
+        for row in rows:
+            job = dict(row)
+            job['payload'] = json.loads(job['payload']) if job['payload'] else None
+            jobs.append(job)
+        return jobs
+
+    def _update_leased(self, job, assignments, params):
+        """Applies an update only while `job`'s lease is still held. Returns True if it was."""
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                f"UPDATE jobs SET {assignments}, updated_at = ? "
+                "WHERE article_row = ? AND lease_token = ? AND lease_expires >= ?",
+                list(params) + [time.time(), job['article_row'], job['lease_token'], time.time()]
+            )
+        return cursor.rowcount == 1
+
+    def extend(self, job, lease_seconds):
+        """Renews the lease; False means it expired and another worker may own the job now."""
+        expires = time.time() + lease_seconds
+        if not self._update_leased(job, "lease_expires = ?", (expires,)):
+            return False
+        job['lease_expires'] = expires
+        return True
+
+    def advance(self, job, stage, payload=None, wp_id=None):
+        """Moves the job to `stage` and releases it (attempts start over for the next stage)."""
+        return self._update_leased(
+            job,
+            "stage = ?, payload = ?, wp_id = COALESCE(?, wp_id), lease_owner = NULL, lease_token = NULL, "
+            "lease_expires = NULL, attempts = 0, error = NULL",
+            (stage, json.dumps(payload, ensure_ascii=False) if payload is not None else None, wp_id)
+        )
+
+    def fail(self, job, error):
+        """Releases the job for a retry (or 'failed' once max_attempts is reached)."""
+        return self._update_leased(
+            job, "lease_owner = NULL, lease_token = NULL, lease_expires = NULL, error = ?", (str(error)[:500],)
+        )
+
+    def remove(self, job):
+        """Deletes a leased job that needs no more work (e.g. a near-duplicate taken out of the registry)."""
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "DELETE FROM jobs WHERE article_row = ? AND lease_token = ? AND lease_expires >= ?",
+                (job['article_row'], job['lease_token'], time.time())
+            )
+        return cursor.rowcount == 1
+
+    def hold(self, name, owner, seconds):
+        """
+        Named lock shared by all workers (e.g. only one polls the feeds at a time).
+        Returns True if `owner` holds it for the next `seconds`.
+        """
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO worker_locks (name) VALUES (?)", (name,))
+            cursor = self.conn.execute(
+                "UPDATE worker_locks SET owner = ?, expires = ? WHERE name = ? AND (owner = ? OR expires < ?)",
+                (owner, now + seconds, name, owner, now)
+            )
+        return cursor.rowcount == 1
+
+    def counts(self):
+        with self.lock:
+            return dict(self.conn.execute("SELECT stage, COUNT(*) FROM jobs GROUP BY stage").fetchall())
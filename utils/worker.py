@@ -0,0 +1,124 @@
+from concurrent.futures import ThreadPoolExecutor
+from utils.publisher import prepare_media, create_post, _post_kwargs, _record_published
+from utils.refresh import record_content
+from utils.dedup import drop_near_duplicate_bodies
+from utils.registry import extract_id
+from utils.metrics import metrics
+
+# Stage name on the command line -> queue stage its jobs are claimed from
+WORKER_STAGES = {'crawl': 'discovered', 'media': 'crawled', 'publish': 'media_ready'}
+
+
+def crawl_stage(queue, owner, crawler, registry, mirror, limit, lease_seconds, dedup=None):
+    """
+    discovered -> crawled: scrapes a batch of claimed links. With a
+    NearDuplicateIndex, near-duplicate bodies are dropped from the queue.
+    Returns the number of jobs handled.
+    """
+    jobs = queue.claim('discovered', owner, limit, lease_seconds)
+    if not jobs:
+        return 0
+
+    to_crawl = {}
+    for job in jobs:
+        existing_id = mirror.lookup(extract_id(job['link']), fresh=True)
+        if existing_id:
+            metrics.inc('duplicates_skipped_total', kind='wordpress')
+            registry.mark_uploaded(job['article_row'], existing_id)
+            queue.advance(job, 'published', wp_id=existing_id)
+        else:
+            to_crawl[job['link']] = job
+
+    print(f"📡 [{owner}] Scraping {len(to_crawl)} articles...")
+    articles = record_content(crawler.stream([job['link'] for job in to_crawl.values()]), registry)
+    if dedup:
+        articles = drop_near_duplicate_bodies(articles, dedup, registry)
+    for article in articles:
+        job = to_crawl.pop(article['link'], None)
+        if job:
+            queue.advance(job, 'crawled', payload=article)
+
+    for job in to_crawl.values():
+        item = registry.find_by_url(job['link'])
+        if item and item['uploaded']:
+            # Skipped as a near-duplicate
+            queue.remove(job)
+        else:
+            # Page failed or had no article text
+            queue.fail(job, 'crawl returned no article')
+    return len(jobs)
+
+
+def media_stage(queue, owner, wp, image_settings, limit, lease_seconds, media_cache=None, images=None, workers=2):
+    """crawled -> media_ready: resizes and uploads the featured images. Returns the number of jobs handled."""
+    jobs = queue.claim('crawled', owner, limit, lease_seconds)
+    if not jobs:
+        return 0
+
+    def upload(job):
+        article = job['payload']
+        # No image or a failed image: the post goes out without one, as in a normal cycle
+        article['featured_media'] = prepare_media(wp, article.get('image_url'), image_settings, media_cache, images)
+        queue.advance(job, 'media_ready', payload=article)
+
+    print(f"🖼️ [{owner}] Preparing media for {len(jobs)} articles...")
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="worker-media") as pool:
+        for job, future in [(job, pool.submit(upload, job)) for job in jobs]:
+            try:
+                future.result()
+            except Exception as e:
+                print(f"⚠️ Media stage failed for {job['link']}: {e}")
+                queue.fail(job, e)
+    return len(jobs)
+
+
+def publish_stage(queue, owner, wp, registry, mirror, category_id, bucket, limit, lease_seconds, media_cache=None):
+    """
+    media_ready -> published: creates the posts. Before a job claimed for
+    the second time is posted, the mirror is synced, so a post created by a
+    worker that crashed before recording it is found instead of duplicated.
+    Returns the number of jobs handled.
+    """
+    jobs = queue.claim('media_ready', owner, limit, lease_seconds)
+    retried = any(job['attempts'] > 1 for job in jobs)
+    synced = not retried or mirror.sync(wp) is not None
+    for job in jobs:
+        if job['attempts'] > 1 and not synced:
+            # An earlier owner may have posted and died before recording it: don't guess
+            queue.fail(job, 'mirror sync failed')
+            continue
+        article = job['payload']
+        post = _post_kwargs(article, category_id, article.get('featured_media'))
+        source_id = post['meta']['article_id']
+
+        # Posted meanwhile by another process (e.g. a one-shot run)?
+        item = registry.find_by_url(job['link'])
+        if item and item['uploaded']:
+            queue.advance(job, 'published', wp_id=item['wp_id'])
+            continue
+        existing_id = mirror.lookup(source_id, fresh=True)
+        if existing_id:
+            metrics.inc('duplicates_skipped_total', kind='wordpress')
+            registry.mark_uploaded(job['article_row'], existing_id)
+            queue.advance(job, 'published', wp_id=existing_id)
+            continue
+
+        bucket.acquire()
+        # The rate limit may have held us past the lease: never post on a job we no longer own
+        if not queue.extend(job, lease_seconds):
+            print(f"⚠️ [{owner}] Lease expired for {job['link']}. Leaving it to its new owner.")
+            continue
+
+        print(f"📤 [{owner}] Posting to WordPress: {article['title'][:40]}...")
+        result = create_post(wp, post, media_cache)
+        if isinstance(result, dict) and "id" in result:
+            mirror.remember(source_id, result["id"], result.get('modified'))
+            registry.mark_uploaded(job['article_row'], result["id"])
+            queue.advance(job, 'published', wp_id=result["id"])
+            _record_published(item)
+            print(f"✅ Success! (WP ID: {result['id']})")
+        else:
+            metrics.inc('posts_failed_total')
+            print(f"❌ Failed to post: {article['source_url']}")
+            queue.fail(job, (result or {}).get('error') or (result or {}).get('message') or 'create_post failed')
+    return len(jobs)
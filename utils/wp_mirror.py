@@ -0,0 +1,134 @@
+import os
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS {posts} (
+    article_id    TEXT PRIMARY KEY,
+    wp_id         INTEGER NOT NULL,
+    modified      TEXT
+);
+CREATE TABLE IF NOT EXISTS {state} (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class PostMirror:
+    """
+    Local copy of the article_id -> wp_id mapping of posts already on WordPress.
+    Seeded once by paging through /wp/v2/posts, then refreshed with
+    modified_after, so duplicate checks are in-memory lookups.
+    With several WordPress targets, each one gets its own tables (`site`).
+    """
+    def __init__(self, db_path="data/registry.db", site=None):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        suffix = f"_{site}" if site else ""
+        self.posts_table = f"wp_posts{suffix}"
+        self.state_table = f"wp_mirror_state{suffix}"
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.lock = threading.RLock()
+        with self.lock, self.conn:
+            self.conn.executescript(SCHEMA.format(posts=self.posts_table, state=self.state_table))
+        self.index = {
+            article_id: wp_id
+            for article_id, wp_id in self.conn.execute(f"SELECT article_id, wp_id FROM {self.posts_table}")
+        }
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def lookup(self, article_id, fresh=False):
+        """wp_id of the post for article_id, or None. fresh=True reads the table, which other worker processes write too."""
+        if not article_id:
+            return None
+        if not fresh:
+            return self.index.get(str(article_id))
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT wp_id FROM {self.posts_table} WHERE article_id = ?", (str(article_id),)
+            ).fetchone()
+        return row[0] if row else None
+
+    def remember(self, article_id, wp_id, modified=None):
+        """Records a known post (e.g. straight from a create_post result)."""
+        if not article_id or not wp_id:
+            return
+        article_id = str(article_id)
+        with self.lock, self.conn:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO {self.posts_table} (article_id, wp_id, modified) VALUES (?, ?, ?)",
+                (article_id, wp_id, modified)
+            )
+            self.index[article_id] = wp_id
+
+    def _get_state(self, key):
+        with self.lock:
+            row = self.conn.execute(f"SELECT value FROM {self.state_table} WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, key, value):
+        with self.lock, self.conn:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO {self.state_table} (key, value) VALUES (?, ?)", (key, value)
+            )
+
+    def _start_sync(self):
+        last_sync = self._get_state('last_modified')
+        if last_sync:
+            print(f"🔄 Refreshing WordPress mirror (modified after {last_sync})...")
+        else:
+            print("🔄 Seeding WordPress mirror from /wp/v2/posts (first run)...")
+        return last_sync
+
+    def _ingest(self, posts, last_sync):
+        newest = last_sync
+        seen = 0
+        for post in posts:
+            seen += 1
+            meta = post.get('meta') or {}
+            article_id = meta.get('article_id') if isinstance(meta, dict) else None
+            # Unregistered-as-single meta comes back as a list
+            if isinstance(article_id, list):
+                article_id = article_id[0] if article_id else None
+            modified = post.get('modified')
+            if article_id:
+                self.remember(article_id, post['id'], modified)
+            if modified and (not newest or modified > newest):
+                newest = modified
+        return seen, newest
+
+    def _finish_sync(self, seen, newest, last_sync):
+        if newest and newest != last_sync:
+            self._set_state('last_modified', newest)
+        print(f"✅ Mirror synced. {seen} posts checked, {len(self.index)} known.")
+        return seen
+
+    def sync(self, wp):
+        """
+        Pulls new/changed posts from WordPress. The first call pages through
+        every post; later calls only ask for posts modified since the last sync.
+        Returns the number of posts seen, or None if the sync failed.
+        """
+        last_sync = self._start_sync()
+        try:
+            seen, newest = self._ingest(wp.iter_posts(modified_after=last_sync), last_sync)
+        except Exception as e:
+            print(f"⚠️ WordPress mirror sync failed, using local index: {e}")
+            return None
+        return self._finish_sync(seen, newest, last_sync)
+
+    async def sync_async(self, wp):
+        """sync() with an AsyncWordPressAuth: pages are fetched concurrently."""
+        last_sync = self._start_sync()
+        try:
+            posts = await wp.fetch_posts(modified_after=last_sync)
+            seen, newest = self._ingest(posts, last_sync)
+        except Exception as e:
+            print(f"⚠️ WordPress mirror sync failed, using local index: {e}")
+            return None
+        return self._finish_sync(seen, newest, last_sync)